@@ -1,145 +1,497 @@
+import base64
+import hashlib
+import importlib
 import math
 import json
+import os
+import re
+import threading
+import time
+import weakref
+import zlib
+from collections import deque
+from fractions import Fraction
+from functools import lru_cache
 from LambdaParser import parser
+from LambdaLexer import number, bounded, NUMBER_DIGITS
 
-counter = 0
+class Node:
+  # Immutable term node. Nodes are hash-consed by node(), so a structure
+  # that is still alive is never built twice and two terms are equal
+  # exactly when they are the same object.
+  #   name:   value is the name           num: value is the number
+  #   lambda: value is the variable, left is the body
+  #   apply:  left and right              op:  value is the operator, left and right
+  # Node ids and beta flags depend on where a node sits, so they are not
+  # stored here; tree2dict derives them.
+  __slots__ = ('kind','value','left','right','fv','size','__weakref__')
 
-def free_variables(tree):
-  if tree[0] == "name":
-    return {tree[1]}
-  elif tree[0] == "num":
-    return set()
-  elif tree[0] == "lambda":
-    t = free_variables(tree[2])
-    t.discard(tree[1])
-    return t
-  else:  # must be  "op" or "apply"
-    return free_variables(tree[1]).union(free_variables(tree[2]))
-
-def alpha_replace(tree,oldvar,newvar):
-  if tree[0] == "name":
-    if tree[1] == oldvar:
-      return ["name",newvar]
-    else:
-      return ["name",tree[1]]
-  elif tree[0] == "num":
-    return ["num",tree[1]]
-  elif tree[0] == "lambda":
-    if tree[1] == oldvar:
-      return ["lambda",oldvar,tree[2]]
+  def __setattr__(self,attr,value):
+    raise AttributeError("Node is immutable")
+
+  def __delattr__(self,attr):
+    raise AttributeError("Node is immutable")
+
+  def __reduce__(self):
+    # unpickled nodes are interned again
+    return (node,(self.kind,self.value,self.left,self.right))
+
+  def __repr__(self):
+    return to_string(self)
+
+NO_FV = frozenset()
+name_fvs = {}
+nodes = weakref.WeakValueDictionary()
+building = threading.Lock()
+allocated = 0
+# running totals for monitoring; the nameless and graph engines add theirs.
+# Threads may lose the odd increment, which is fine for monitoring.
+stats = {"beta_steps": 0, "delta_steps": 0, "math_steps": 0, "substitutions": 0, "alpha_conversions": 0,
+         "graph_steps": 0, "nbe_steps": 0}
+init = object.__setattr__
+
+def node(kind,value=None,left=None,right=None):
+  global allocated
+  if kind == "num":
+    # by value, which keeps 1 and 1.0 apart without writing out the digits,
+    # and floats by their text, which keeps 0.0 and -0.0 apart and finds nan
+    key = (kind,type(value),repr(value) if type(value) is float else value,None)
+  else:
+    key = (kind,value,left,right)
+  tree = nodes.get(key)
+  if tree is not None:
+    return tree
+  # checked again under the lock: two threads building the same term must
+  # end up with the same node
+  with building:
+    tree = nodes.get(key)
+    if tree is None:
+      tree = object.__new__(Node)
+      init(tree,'kind',kind)
+      init(tree,'value',value)
+      init(tree,'left',left)
+      init(tree,'right',right)
+      if kind == "name":
+        init(tree,'fv',name_fv(value))
+        init(tree,'size',1)
+      elif kind == "num":
+        init(tree,'fv',NO_FV)
+        init(tree,'size',1)
+      elif kind == "lambda":
+        init(tree,'fv',bind_fv(left.fv,value))
+        init(tree,'size',1+left.size)
+      else:  # must be "op" or "apply"
+        init(tree,'fv',union_fv(left.fv,right.fv))
+        init(tree,'size',1+left.size+right.size)
+      nodes[key] = tree
+      allocated += 1
+  return tree
+
+def walk(item,expand):
+  # Explicit-stack stand-in for recursion so that deep terms never hit the
+  # interpreter's recursion limit. expand(item) returns (None,result) when
+  # item is finished, or (children,combine): the children are walked left to
+  # right and combine is called with their results.
+  results = []
+  stack = [(None,item)]
+  while stack:
+    (combine,item) = stack.pop()
+    if combine is None:
+      (children,r) = expand(item)
+      if children is None:
+        results.append(r)
+      elif len(children) == 1:
+        stack.append((r,1))
+        stack.append((None,children[0]))
+      else:
+        stack.append((r,2))
+        stack.append((None,children[1]))
+        stack.append((None,children[0]))
+    elif item == 1:
+      results.append(combine(results.pop()))
     else:
-      return ["lambda",tree[1],alpha_replace(tree[2],oldvar,newvar)]
-  else:  # must be  "op" or "apply"
-    return [tree[0],alpha_replace(tree[1],oldvar,newvar),alpha_replace(tree[2],oldvar,newvar)]
+      right = results.pop()
+      results.append(combine(results.pop(),right))
+  return results[0]
+
+def walk_shared(tree,expand):
+  # walk() for functions of a node alone: a subterm that occurs several
+  # times is one shared node, and it is only expanded once
+  done = {}
+  def remember(t,combine):
+    def combine_once(*results):
+      r = done[t] = combine(*results)
+      return r
+    return combine_once
+  def expand_once(t):
+    r = done.get(t)
+    if r is not None:
+      return (None,r)
+    (children,r) = expand(t)
+    if children is None:
+      done[t] = r
+      return (None,r)
+    return (children,remember(t,r))
+  return walk(tree,expand_once)
+
+def name_fv(name):
+  fv = name_fvs.get(name)
+  if fv is None:
+    fv = name_fvs[name] = frozenset([name])
+  return fv
+
+def bind_fv(fv,var):
+  if var in fv:
+    return fv - {var}
+  return fv
+
+def union_fv(fv1,fv2):
+  if fv2 <= fv1:
+    return fv1
+  elif fv1 <= fv2:
+    return fv2
+  return fv1 | fv2
+
+def free_variables(tree):
+  return tree.fv
+
+def alpha_key(tree):
+  # digest of tree's nameless form without the binder names, so that trees
+  # that differ only in the names of bound variables have the same key
+  tokens = []
+  depths = {}  # name -> depths of the binders of that name in scope
+  depth = 0
+  stack = [tree]
+  while stack:
+    t = stack.pop()
+    if type(t) is str:  # leaving the binder of t
+      depths[t].pop()
+      depth -= 1
+    elif t.kind == "name":
+      bound = depths.get(t.value)
+      tokens.append("b"+str(depth-1-bound[-1]) if bound else "n"+t.value)
+    elif t.kind == "num":
+      tokens.append("#"+repr(t.value))
+    elif t.kind == "lambda":
+      tokens.append("\\")
+      depths.setdefault(t.value,[]).append(depth)
+      depth += 1
+      stack += [t.value,t.left]
+    else:  # must be "op" or "apply"
+      tokens.append("@" if t.kind == "apply" else t.value)
+      stack += [t.right,t.left]
+  return hashlib.blake2b(" ".join(tokens).encode(),digest_size=16).hexdigest()
+
+def fresh_var(fv1,fv2):
+  # the first of '_0', '_1', ... that is in neither set; it depends only on
+  # the term, so replaying a reduction gives the same names
+  i = 0
+  while '_'+str(i) in fv1 or '_'+str(i) in fv2:
+    i += 1
+  return '_'+str(i)
 
 def alpha_convert(tree,var):
-  if tree[0] == 'lambda':
-    return ['lambda',var,alpha_replace(tree[2],tree[1],var)]
+  if tree.kind == 'lambda':
+    stats["alpha_conversions"] += 1
+    return node('lambda',var,substitute(tree.left,tree.value,node('name',var)))
   else:
     return tree
 
 def substitute(tree,var,val):
-  if tree[0] == "name":
-    if tree[1] == var:
-      return val
+  # subtrees without a free occurrence of var are shared, not copied
+  stats["substitutions"] += 1
+  val_fv = val.fv
+  def expand(t):
+    if var not in t.fv:
+      return (None,t)
+    elif t.kind == "name":
+      return (None,val)
+    elif t.kind == "lambda":
+      if t.value not in val_fv:
+        return ([t.left],lambda body: node('lambda',t.value,body))
+      else:
+        newvar = fresh_var(val_fv,t.left.fv)
+        return ([alpha_convert(t,newvar).left],lambda body: node('lambda',newvar,body))
+    else:  # must be  "op" or "apply"
+      return ([t.left,t.right],lambda left,right: node(t.kind,t.value,left,right))
+  return walk_shared(tree,expand)
+
+def to_string(tree,limit=None):
+  # pieces are emitted left to right; strings on the stack are literal text.
+  # With a limit, a longer text is cut to limit characters and " ..."
+  s = []
+  length = 0
+  stack = [tree]
+  while stack:
+    if limit is not None and length > limit:
+      return "".join(s)[:limit]+" ..."
+    tree = stack.pop()
+    if type(tree) is str:
+      s.append(tree)
+    elif tree.kind == "name":
+      s.append(tree.value)
+    elif tree.kind == "num":
+      s.append(num_text(tree.value))
+    elif tree.kind == "lambda":
+      s.append("(LAMBDA "+tree.value+" ")
+      stack += [")",tree.left]
+    elif tree.kind == "apply":
+      s.append("(")
+      stack += [")",tree.right," ",tree.left]
+    else: # must be  "op"
+      s.append("("+tree.value+" ")
+      stack += [")",tree.right," ",tree.left]
+    if limit is not None:
+      length += len(s[-1])
+  return "".join(s)
+
+def list2tree(tree):
+  # the parser's nested lists: ['name',X], ['num',v], ['lambda',X,body],
+  # ['apply',l,r,beta] and [op,l,r]
+  def expand(t):
+    if t[0] in ["name","num"]:
+      return (None,node(t[0],t[1]))
+    elif t[0] == "lambda":
+      return ([t[2]],lambda body: node("lambda",t[1],body))
+    elif t[0] == "apply":
+      return ([t[1],t[2]],lambda left,right: node("apply",None,left,right))
+    else: # must be op
+      return ([t[1],t[2]],lambda left,right: node("op",t[0],left,right))
+  return walk(tree,expand)
+
+def json2tree(jtree):
+  def expand(j):
+    if j["type"] == "num":
+      return (None,node("num",number(j["value"])))
+    elif j["type"] == "name":
+      return (None,node("name",j["value"]))
+    elif j["type"] == "lambda":
+      return (j["children"],lambda body: node("lambda",j["var"],body))
+    elif j["type"] == "apply":
+      return (j["children"],lambda left,right: node("apply",None,left,right))
+    else: # must be op
+      return (j["children"],lambda left,right: node("op",j["value"],left,right))
+  return walk(jtree,expand)
+
+def node2dict(t,nodeid='R',shadowed=NO_FV):
+  # tree2dict's dict for t with no children yet, and the shadowed set for
+  # its children
+  if t.kind == "name":
+    return ({"nodeid": nodeid, "type": "name", "value": t.value, "children": []},shadowed)
+  elif t.kind == "num":
+    return ({"nodeid": nodeid, "type": "num", "value": num_text(t.value), "children": []},shadowed)
+  elif t.kind == "lambda":
+    if t.value in definitions:
+      shadowed = shadowed | {t.value}
+    return ({"nodeid": nodeid, "type": "lambda", "var": t.value, "children": []},shadowed)
+  elif t.kind == "apply":
+    beta = "YES" if is_redex(t,shadowed) else "NO"
+    return ({"nodeid": nodeid, "type": "apply", "beta": beta, "children": []},shadowed)
+  else: # must be  "op"
+    return ({"nodeid": nodeid, "type": "op", "value": t.value, "children": []},shadowed)
+
+def tree2dict(tree,nodeid='R',shadowed=NO_FV):
+  # node ids are paths from the root: '0' is the left child or a lambda's
+  # body, '1' the right child; shadowed holds the defined names bound above
+  # tree
+  def expand(item):
+    (t,nodeid,shadowed) = item
+    (j,shadowed) = node2dict(t,nodeid,shadowed)
+    if t.kind in ["name","num"]:
+      return (None,j)
+    def build(*children):
+      j["children"] = list(children)
+      return j
+    if t.kind == "lambda":
+      return ([(t.left,nodeid+'0',shadowed)],build)
+    return ([(t.left,nodeid+'0',shadowed),(t.right,nodeid+'1',shadowed)],build)
+  return walk((tree,nodeid,shadowed),expand)
+
+# Compact form of a tree for the stores: the nodes in preorder as ints
+# kind+5*k, where kind indexes WIRE_KINDS and k the table of the names,
+# number texts and operators in the tree (0 for apply nodes). Node ids and
+# beta flags are left out, as tree2dict derives them. Compressed, the same
+# is zlib'ed JSON as one base64 string.
+WIRE_KINDS = ["name","num","lambda","apply","op"]
+WIRE_CODES = {kind: code for (code,kind) in enumerate(WIRE_KINDS)}
+WIRE_NODE_BYTES = 32  # decompressed bytes allowed per node, names included
+# the number texts num_text writes, with no more digits than a number has;
+# a denominator is never 0
+WIRE_NUMBER_DIGITS = NUMBER_DIGITS
+WIRE_NAME = re.compile(r'[A-Za-z_][_A-Za-z0-9]*')  # the parser's names and fresh_var's
+WIRE_OPS = ["+","-","*","/"]
+WIRE_NUMBER = re.compile(r'-?[0-9]{1,%d}(/0*[1-9][0-9]{0,%d}|\.[0-9]{0,%d})?|-?inf|nan'
+                         % (WIRE_NUMBER_DIGITS,WIRE_NUMBER_DIGITS-1,WIRE_NUMBER_DIGITS))
+
+def encode_tree(tree,compress=False):
+  table = {}
+  nodes = []
+  stack = [tree]
+  while stack:
+    t = stack.pop()
+    if t.kind == "apply":
+      nodes.append(3)
     else:
-      return tree
-  elif tree[0] == "num":
-    return tree
-  elif tree[0] == "lambda":
-    if tree[1] == var:
-      return tree
-    elif tree[1] not in free_variables(val):
-      return ['lambda',tree[1],substitute(tree[2],var,val),tree[3]]
+      text = num_text(t.value) if t.kind == "num" else t.value
+      k = table.get(text)
+      if k is None:
+        k = table[text] = len(table)
+      nodes.append(WIRE_CODES[t.kind]+5*k)
+    if t.right is not None:
+      stack.append(t.right)
+    if t.left is not None:
+      stack.append(t.left)
+  if compress:
+    text = json.dumps([nodes,list(table)],separators=(',',':'))
+    return {"zlib": base64.b64encode(zlib.compress(text.encode())).decode('ascii')}
+  return {"nodes": nodes, "names": list(table)}
+
+def decode_tree(data,max_size=None,compressed=True):
+  # the tree of an encode_tree result. Children come after their parent in
+  # preorder, so reading backwards finds them on the stack, left on top.
+  # data may come from a client: it is refused with a ValueError if it is
+  # malformed, has more than max_size nodes, or is compressed when
+  # compressed is False, and it is never decompressed past its size limit.
+  try:
+    if "zlib" in data:
+      if not compressed:
+        raise ValueError("compressed tree not accepted")
+      inflate = zlib.decompressobj()
+      text = inflate.decompress(base64.b64decode(data["zlib"]),
+                                0 if max_size is None else WIRE_NODE_BYTES*max_size)
+      if inflate.unconsumed_tail:
+        raise ValueError("tree larger than %d nodes" % max_size)
+      elif not inflate.eof:
+        raise ValueError("malformed tree: truncated")
+      (nodes,names) = json.loads(text)
     else:
-      global counter
-      newvar = '_'+str(counter)
-      counter += 1
-      [a,b,new_body] = alpha_convert(tree,newvar)
-      return ['lambda',newvar,substitute(new_body,var,val),tree[3]]
-  else:  # must be  "op" or "apply"
-    return [tree[0],substitute(tree[1],var,val),substitute(tree[2],var,val),tree[3]]
-
-def to_string(tree):
-  s = ""
-  if tree[0] == "name":
-    s += tree[1]
-  elif tree[0] == "num":
-    s += str(tree[1])
-  elif tree[0] == "lambda": 
-    s += "(LAMBDA "+tree[1]+" "+to_string(tree[2])+")"
-  elif tree[0] == "apply":
-    s += "("+to_string(tree[1])+" "+to_string(tree[2])+")"
-  else: # must be  "op"
-    s += "("+tree[0]+" "+to_string(tree[1])+" "+to_string(tree[2])+")"
-  return s
+      (nodes,names) = (data["nodes"],data["names"])
+    if max_size is not None and len(nodes) > max_size:
+      raise ValueError("tree larger than %d nodes" % max_size)
+    return decode_nodes(nodes,names)
+  except (IndexError,KeyError,TypeError,ArithmeticError,zlib.error) as inst:
+    raise ValueError("malformed tree: %s" % inst)
 
-def json2tree(jtree):
-  if jtree["type"] == "num":
-    return ["num",jtree["value"]]
-  elif jtree["type"] == "name":
-    return ["name",jtree["value"]]
-  elif jtree["type"] == "lambda":
-    return ["lambda",jtree["var"],json2tree(jtree["children"][0])]
-  elif jtree["type"] == "apply":
-    return ["apply",json2tree(jtree["children"][0]),json2tree(jtree["children"][1])]
-  else: # must be op
-    return [jtree["value"],json2tree(jtree["children"][0]),json2tree(jtree["children"][1])]
-
-def tree2dict(tree):
-  if tree[0] == "name":
-    return {"nodeid": tree[2], "type": tree[0], "value": tree[1], "children": []}
-  elif tree[0] == "num":
-    #print(tree)
-    return {"nodeid": tree[2], "type": tree[0], "value": str(tree[1]), "children": []}
-  elif tree[0] == "lambda": 
-    return {"nodeid": tree[3], "type": tree[0], "var": tree[1], "children": [tree2dict(tree[2])]}
-  elif tree[0] == "apply":
-    if tree[3]:
-      return {"nodeid": tree[4], "type": tree[0], "beta": "YES", "children": [tree2dict(tree[1]),tree2dict(tree[2])]}
+def wire_number(text):
+  # number(text) for a text that came with a tree, which goes no further
+  # than the texts num_text writes
+  if type(text) is not str or len(text) > 2*WIRE_NUMBER_DIGITS+2 or not WIRE_NUMBER.fullmatch(text):
+    raise ValueError("malformed number")
+  return number(text)
+
+def wire_name(text):
+  if type(text) is not str or not WIRE_NAME.fullmatch(text):
+    raise ValueError("malformed name")
+  return text
+
+def wire_op(text):
+  if text not in WIRE_OPS:
+    raise ValueError("malformed operator")
+  return text
+
+def decode_nodes(nodes,names):
+  leaves = {}
+  values = {}  # code of a lambda or op -> its checked variable or operator
+  stack = []
+  for code in reversed(nodes):
+    if type(code) is not int or code < 0:
+      raise ValueError("malformed node")
+    kind = code % 5
+    if kind == 3:
+      left = stack.pop()
+      stack.append(node("apply",None,left,stack.pop()))
+    elif kind == 2 or kind == 4:
+      value = values.get(code)
+      if value is None:
+        value = values[code] = wire_name(names[code//5]) if kind == 2 else wire_op(names[code//5])
+      if kind == 2:
+        stack.append(node("lambda",value,stack.pop()))
+      else:
+        left = stack.pop()
+        stack.append(node("op",value,left,stack.pop()))
     else:
-      return {"nodeid": tree[4], "type": tree[0], "beta": "NO", "children": [tree2dict(tree[1]),tree2dict(tree[2])]}
-  else: # must be  "op"
-    return {"nodeid": tree[3], "type": "op", "value": tree[0], "children": [tree2dict(tree[1]),tree2dict(tree[2])]}
-
-def add_node_ids(tree,prefix):
-  if tree[0] in ['num','name']:
-    return tree + [prefix]
-  elif tree[0] == 'lambda':
-    return ['lambda',tree[1],add_node_ids(tree[2],prefix+'0'),prefix]
-  elif tree[0] == 'apply':
-    return ['apply',add_node_ids(tree[1],prefix+'0'),add_node_ids(tree[2],prefix+'1'),tree[3],prefix]
-  else: # must be op
-    return [tree[0],add_node_ids(tree[1],prefix+'0'),add_node_ids(tree[2],prefix+'1'),prefix]
-
-def remove_node_ids(tree):
-  if tree[0] in ['num','name']:
-    return tree[0:-1]
-  elif tree[0] == 'lambda':
-    return ['lambda',tree[1],remove_node_ids(tree[2])]
-  elif tree[0] == 'apply':
-    return [tree[0],remove_node_ids(tree[1]),remove_node_ids(tree[2]),tree[3]]
-  else: # must be op
-    return [tree[0],remove_node_ids(tree[1]),remove_node_ids(tree[2])]
-
-def adjust_betaBool(tree):
-  if tree[0] in ['num','name']:
-    return tree[0:2]
-  elif tree[0] == 'lambda':
-    return [tree[0],tree[1],adjust_betaBool(tree[2])]
-  elif tree[0] == 'apply':
-    leftChildLambda = (tree[1][0] == 'lambda')
-    return ['apply',adjust_betaBool(tree[1]),adjust_betaBool(tree[2]),leftChildLambda]
-  else: # must be op
-    return [tree[0],adjust_betaBool(tree[1]),adjust_betaBool(tree[2])]
-  
+      leaf = leaves.get(code)
+      if leaf is None:
+        text = names[code//5]
+        leaf = leaves[code] = node("name",wire_name(text)) if kind == 0 else node("num",wire_number(text))
+      stack.append(leaf)
+  if len(stack) != 1:
+    raise ValueError("malformed tree")
+  return stack[0]
+
+def subtree_at(tree,path):
+  # the subtree at path, a node id without its leading 'R'; None if there is none
+  for step in path:
+    if tree.kind in ["name","num"] or (tree.kind == "lambda" and step != "0"):
+      return None
+    tree = tree.right if step == "1" else tree.left
+  return tree
+
+def shadowed_at(tree,path):
+  # the defined names bound by the lambdas above path
+  shadowed = NO_FV
+  for step in path:
+    if tree.kind == "lambda" and tree.value in definitions:
+      shadowed = shadowed | {tree.value}
+    tree = tree.right if step == "1" else tree.left
+  return shadowed
+
+# Parsed trees by normalized expression text. The lexer ignores the case of
+# keywords, names are upper-cased by the parser and runs of blanks only
+# separate tokens, so texts that differ only there give the same tree.
+# Trees are immutable and shared by all callers; the JSON made from them is
+# built for each caller, who may change it.
+PARSE_CACHE_SIZE = 1024
+parsing = threading.Lock()
+
+def normalize_text(expr):
+  # a comment runs to the end of its line, so in text with comments a run
+  # of blanks with a line break in it stays a line break
+  expr = expr.strip(' \t\r\n')
+  if '#' in expr:
+    return re.sub(r'[ \t\r\n]+',lambda m: '\n' if '\n' in m.group() else ' ',expr).upper()
+  return re.sub(r'[ \t\r\n]+',' ',expr).upper()
+
+def parse_definitions(text):
+  # ([(name,definition)],expression tree or None) of text. The parser and
+  # its lexer keep their state on themselves.
+  with parsing:
+    result = parser.parse(text)
+  if result is None:
+    raise SyntaxError("syntax error")
+  lets = []
+  while result is not None and result[0] == "let":
+    lets.append((result[1],list2tree(result[2])))
+    result = result[3]
+  return (lets,None if result is None else list2tree(result))
+
+def parse_uncached(text):
+  # the expression gets each let definition as ((lambda NAME expr) def),
+  # inside those of the definitions before it, which it may use. They are
+  # not normalized here: that is up to the reduction, under its limits.
+  (lets,tree) = parse_definitions(text)
+  if tree is None:
+    raise SyntaxError("definitions without an expression")
+  for (name,definition) in reversed(lets):
+    tree = node("apply",None,node("lambda",name,tree),definition)
+  return tree
+
+parse_text = lru_cache(maxsize=PARSE_CACHE_SIZE)(parse_uncached)
+
+def set_parse_cache_size(size):
+  global parse_text
+  parse_text = lru_cache(maxsize=size)(parse_uncached)
+
+def parse_cache_info():
+  info = parse_text.cache_info()
+  return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+def parse(expr):
+  return parse_text(normalize_text(expr))
+
 def get_initial_tree(expr):
   try:
-    tree = parser.parse(expr)
-    tree = adjust_betaBool(tree)
-    #print("before add_node_ids",tree)
-    tree = add_node_ids(tree,'R')
-    #print("after add_node_ids",tree)
+    tree = parse(expr)
     jsonDict = tree2dict(tree)
     result = {"status": "OK", "expr_tree_json": jsonDict}
     return result
@@ -149,127 +501,357 @@ def get_initial_tree(expr):
     return result
 
 def specific_beta_reduction(etree,nodeid):
-  # make sure beta Boolean is reset on new tree (write a separate function to do this)
-  if etree[0] == "name" or etree[0] == "num":
+  # also takes the delta step of an applied reference
+  tree = subtree_at(etree,nodeid[1:])
+  if tree is None or tree.kind != "apply" or not is_redex(tree,shadowed_at(etree,nodeid[1:])):
     return (False,etree)
-  elif etree[0] == "lambda":
-    (b,t) = specific_beta_reduction(etree[2],nodeid)
-    if b:
-      return (True,["lambda",etree[1],t,etree[3]])
-    else:
-      return (False,etree)
-  elif etree[0] == "apply":
-    if etree[4] == nodeid:
-      return (True,substitute(etree[1][2],etree[1][1],etree[2]))
-    else:
-      (b,t) = specific_beta_reduction(etree[1],nodeid)
-      if b:
-        leftChildLambda = (t[0] == 'lambda')
-        return (True,["apply",t,etree[2],leftChildLambda,etree[4]])
-      else:
-        (b,t) = specific_beta_reduction(etree[2],nodeid)
-        if b:
-          leftChildLambda = (t[0] == 'lambda')
-          return (True,["apply",etree[1],t,leftChildLambda,etree[4]])
-        else:
-          return (False,etree)
-  else: # must be "op"
-    (b,t) = specific_beta_reduction(etree[1],nodeid)
-    if b:
-      return (True,[etree[0],t,etree[2],etree[3]])
-    else:
-      (b,t) = specific_beta_reduction(etree[2],nodeid)
-      if b:
-        return (True,[etree[0],etree[1],t,etree[3]])
-      else:
-        return (False,etree)
+  stats[step_kind(tree)] += 1
+  return (True,replace_at(etree,nodeid[1:],contract(tree)))
 
 def get_next_tree(jtree,nodeid):
   etree = json2tree(jtree)
-  etree = adjust_betaBool(etree)
-  etree = add_node_ids(etree,'R')
   (status,etree) = specific_beta_reduction(etree,nodeid)
   if status:
-    etree = remove_node_ids(etree)
-    etree = adjust_betaBool(etree)
-    etree = add_node_ids(etree,'R')
     return etree
   else:
     print('Something went WRONG!')
     return None
 
-def get_next_tree_after_math(jtree,nodeid):
-  etree = json2tree(jtree)
-  etree = adjust_betaBool(etree)
-  #print("before add_node_ids in eval_math",etree)
-  etree = add_node_ids(etree,'R')
-  #print("before eval_math",etree)
-  etree = eval_math(etree,nodeid)  # this will alter the tree and nodeids will be messed up
-  #print("after eval_math",etree)
-  etree = remove_node_ids(etree)
-  etree = add_node_ids(etree,'R')
-  return etree
-
 def eval_math(tree,nodeid):
-  if tree[0] == "name" or tree[0] == "num":
+  t = subtree_at(tree,nodeid[1:])
+  if t is None or t.kind != "op":
     return tree
-  elif tree[0] == "lambda":
-    return ["lambda",tree[1],eval_math(tree[2],nodeid),tree[3]]
-  elif tree[0] == "apply":
-    return ["apply",eval_math(tree[1],nodeid),eval_math(tree[2],nodeid),tree[3]]
-  elif tree[-1] != nodeid: # is "op" and does not match nodeid
-    return [tree[0],eval_math(tree[1],nodeid),eval_math(tree[2],nodeid),tree[3]]
-  else: # is "op" and matches nodeid
-    return apply_math(tree)
-
-def apply_math(tree):
-    #tree = remove_node_ids(tree)
-    val1 = process_math(tree[1])
-    val2 = process_math(tree[2])
-    #tree = add_node_ids(tree,'R')
-    if val1[0] == "num" and val2[0] == "num":
-      if tree[0] == "+":
-        return ["num",float(val1[1])+float(val2[1]),""]
-      elif tree[0] == "-":
-        return ["num",float(val1[1])-float(val2[1]),""]
-      elif tree[0] == "*":
-        return ["num",float(val1[1])*float(val2[1]),""]
-      elif val2[1] != 0:
-        return ["num",float(val1[1])/float(val2[1]),""]
-      else:
-        return ["num",math.nan,""]
-    elif val1[0] == "num" and val2[0] != "num":
-      return [tree[0],["num",val1[1]],val2,""]
-    elif val1[0] != "num" and val2[0] == "num":
-      return [tree[0],val1,["num",val2[1]],""]
+  (t,folded) = fold_math(t)
+  stats["math_steps"] += folded
+  return replace_at(tree,nodeid[1:],t)
+
+def fold_constants(tree):
+  # every op of tree whose operands are numbers, or fold to numbers, in one
+  # pass; (folded tree, ops folded)
+  (tree,folded) = fold_math(as_tree(tree))
+  stats["math_steps"] += folded
+  return (tree,folded)
+
+def fold_math(tree):
+  folded = 0
+  def fold(op,val1,val2):
+    nonlocal folded
+    if val1.kind == "num" and val2.kind == "num":
+      folded += 1
+    return combine_math(op,val1,val2)
+  def expand(t):
+    if t.kind == "name" or t.kind == "num":
+      return (None,t)
+    elif t.kind == "lambda":
+      return ([t.left],lambda body: node("lambda",t.value,body))
+    elif t.kind == "apply":
+      return ([t.left,t.right],lambda left,right: node("apply",None,left,right))
+    else: # must be "op"
+      return ([t.left,t.right],lambda val1,val2: fold(t.value,val1,val2))
+  return (walk_shared(tree,expand),folded)
+
+# Numbers are exact: ints, and Fractions once a literal or a division needs
+# them. Floats only come in as nan, from dividing by zero or from a result
+# with more than NUMBER_DIGITS digits, and stay floats.
+def arith(op,a,b):
+  try:
+    if op == "+":
+      value = a+b
+    elif op == "-":
+      value = a-b
+    elif op == "*":
+      value = a*b
+    elif b == 0:
+      return math.nan
+    elif type(a) is float or type(b) is float:
+      value = a/b
     else:
-      return [tree[0],val1,val2,""]
+      value = Fraction(a)/b
+  except OverflowError:  # a long int with a float
+    return math.nan
+  value = bounded(value)
+  return math.nan if value is None else value
 
-def process_math(tree):
-  if tree[0] == "name" or tree[0] == "num":
-    return tree
-  elif tree[0] == "lambda":
-    return ["lambda",tree[1],process_math(tree[2]),tree[3]]
-  elif tree[0] == "apply":
-    return ["apply",process_math(tree[1]),process_math(tree[2]),tree[3]]
+def num_text(value):
+  # ints as they are, Fractions as decimals when they have a finite one of
+  # at most NUMBER_DIGITS digits and as n/d otherwise; both read back as the
+  # same number
+  if type(value) is not Fraction:
+    return str(value)
+  d = value.denominator
+  places = next((k for k in range(1,min(d.bit_length(),NUMBER_DIGITS)+1) if 10**k % d == 0),None)
+  shifted = None if places is None else abs(value.numerator)*10**places//d
+  if shifted is None or bounded(shifted) is None:
+    return f"{value.numerator}/{d}"
+  digits = str(shifted).rjust(places+1,"0")
+  return ("-" if value < 0 else "")+digits[:-places]+"."+digits[-places:]
+
+def combine_math(op,val1,val2):
+  if val1.kind == "num" and val2.kind == "num":
+    return node("num",arith(op,val1.value,val2.value))
+  else:
+    return node("op",op,val1,val2)
+
+# ======== NORMALIZATION ========
+
+STRATEGIES = {
+  # name: (outermost redex first, reduce under lambdas, reduce arguments)
+  "normal-order": (True,True,True),
+  "head-normal-form": (True,True,False),
+  "call-by-name": (True,False,False),
+  "applicative-order": (False,True,True),
+  "call-by-value": (False,False,True),
+}
+
+def is_redex(tree,shadowed=NO_FV):
+  # shadowed holds the defined names bound above tree, which are not
+  # references there
+  if tree.kind == "apply":
+    head = tree.left
+    return head.kind == "lambda" or (head.kind == "name" and head.value in definitions and head.value not in shadowed)
+  elif tree.kind in ["name","num","lambda"]:
+    return False
+  else: # "op" on two numbers
+    return tree.left.kind == "num" and tree.right.kind == "num"
+
+def find_redex(tree,strategy):
+  # (path,redex) of the next redex for strategy, the path in node id form
+  (outermost,under_lambda,into_args) = STRATEGIES[strategy]
+  path = []
+  stack = [(tree,0,"",False,NO_FV)]
+  while stack:
+    (t,depth,step,done,shadowed) = stack.pop()
+    if done:
+      del path[depth:]
+      if is_redex(t,shadowed):
+        return ("".join(path),t)
+      continue
+    del path[depth-1 if depth else 0:]
+    if depth:
+      path.append(step)
+    if outermost and is_redex(t,shadowed):
+      return ("".join(path),t)
+    if not outermost:
+      stack.append((t,depth,step,True,shadowed))
+    if t.kind == "lambda":
+      if under_lambda:
+        if t.value in definitions:
+          shadowed = shadowed | {t.value}
+        stack.append((t.left,depth+1,"0",False,shadowed))
+    elif t.kind == "apply":
+      if into_args:
+        stack.append((t.right,depth+1,"1",False,shadowed))
+      stack.append((t.left,depth+1,"0",False,shadowed))
+    elif t.kind == "op": # op needs both operands evaluated
+      stack.append((t.right,depth+1,"1",False,shadowed))
+      stack.append((t.left,depth+1,"0",False,shadowed))
+  return None
+
+def contract(redex):
+  if redex.kind == "apply" and redex.left.kind == "name":  # a reference
+    return node("apply",None,definitions[redex.left.value],redex.right)
+  elif redex.kind == "apply":
+    return substitute(redex.left.left,redex.left.value,redex.right)
   else: # must be "op"
-    val1 = process_math(tree[1])
-    val2 = process_math(tree[2])
-    if val1[0] == "num" and val2[0] == "num":
-      if tree[0] == "+":
-        return ["num",float(val1[1])+float(val2[1]),""]
-      elif tree[0] == "-":
-        return ["num",float(val1[1])-float(val2[1]),""]
-      elif tree[0] == "*":
-        return ["num",float(val1[1])*float(val2[1]),""]
-      elif val2[1] != 0:
-        return ["num",float(val1[1])/float(val2[1]),""]
-      else:
-        return ["num",math.nan,""]
-    elif val1[0] == "num" and val2[0] != "num":
-      return [tree[0],["num",val1[1]],val2,""]
-    elif val1[0] != "num" and val2[0] == "num":
-      return [tree[0],val1,["num",val2[1]],""]
+    return combine_math(redex.value,redex.left,redex.right)
+
+def step_kind(redex):
+  if redex.kind == "op":
+    return "math_steps"
+  return "delta_steps" if redex.left.kind == "name" else "beta_steps"
+
+def replace_at(tree,path,new):
+  # rebuild only the ancestors along path, sharing every other subtree
+  spine = []
+  for step in path:
+    spine.append(tree)
+    if tree.kind == "lambda" or step == "0":
+      tree = tree.left
+    else:
+      tree = tree.right
+  for k in range(len(spine)-1,-1,-1):
+    parent = spine[k]
+    if parent.kind == "lambda":
+      new = node("lambda",parent.value,new)
+    elif path[k] == "0":
+      new = node(parent.kind,parent.value,new,parent.right)
     else:
-      return [tree[0],val1,val2,""]
+      new = node(parent.kind,parent.value,parent.left,new)
+  return new
+
+def as_tree(expr):
+  # expr is an expression string, a tree2dict dict, an encode_tree dict, a
+  # parser list or a tree
+  if type(expr) is str:
+    return parse(expr)
+  elif type(expr) is dict:
+    return json2tree(expr) if "type" in expr else decode_tree(expr)
+  elif type(expr) is list:
+    return list2tree(expr)
+  else:
+    return expr
+
+# A term met again within the last CYCLE_WINDOW steps stops the reduction,
+# which would otherwise go around the cycle until a limit. Trees are hash
+# consed and fresh names are chosen the same way each time, so a repeated
+# term is usually the same node; terms of up to CYCLE_KEY_SIZE nodes are
+# also compared by alpha_key, which costs about as much as a step.
+CYCLE_WINDOW = 1000
+CYCLE_KEY_SIZE = 256
+# The reduction also stops when the term has grown at each of the last
+# GROWTH_WINDOW steps, by more than max_growth nodes per step on average;
+# terminating reductions grow for a few steps at a time at most.
+GROWTH_WINDOW = 100
+MAX_GROWTH = 1.0
+
+def reduce_tree(tree,strategy="normal-order",max_steps=10000,max_size=100000,max_time=None,
+                max_growth=MAX_GROWTH):
+  # (tree reached, steps taken, why it stopped); max_time is in seconds and
+  # checked between steps, max_growth is None to let terms grow
+  deadline = None if max_time is None else time.perf_counter()+max_time
+  steps = 0
+  seen = {}  # term or its alpha_key -> step it was reached at
+  order = deque()
+  sizes = deque(maxlen=GROWTH_WINDOW+1)
+  growing = 0  # steps since the term last did not grow
+  while True:
+    key = tree if tree.size > CYCLE_KEY_SIZE else alpha_key(tree)
+    if key in seen:
+      return (tree,steps,"cycle of length "+str(steps-seen[key]))
+    seen[key] = steps
+    order.append(key)
+    if len(order) > CYCLE_WINDOW:
+      del seen[order.popleft()]
+    growing = growing+1 if sizes and tree.size > sizes[-1] else 0
+    sizes.append(tree.size)
+    if max_growth is not None and growing >= GROWTH_WINDOW:
+      rate = (sizes[-1]-sizes[0])/GROWTH_WINDOW
+      if rate > max_growth:
+        return (tree,steps,"growth of %g nodes per step" % rate)
+    found = find_redex(tree,strategy)
+    if found is None:
+      return (tree,steps,"done")
+    if steps >= max_steps:
+      return (tree,steps,"step limit")
+    if deadline is not None and time.perf_counter() > deadline:
+      return (tree,steps,"time limit")
+    (path,redex) = found
+    tree = replace_at(tree,path,contract(redex))
+    steps += 1
+    stats[step_kind(redex)] += 1
+    if tree.size > max_size:
+      return (tree,steps,"size limit")
+
+def normalize(expr,strategy="normal-order",max_steps=10000,max_size=100000,max_time=None,
+              max_growth=MAX_GROWTH):
+  if strategy not in STRATEGIES:
+    raise ValueError("unknown strategy "+strategy)
+  start = time.perf_counter()
+  try:
+    (tree,steps,halted) = reduce_tree(as_tree(expr),strategy,max_steps,max_size,max_time,max_growth)
+    jsonDict = tree2dict(tree)
+    return {"status": "OK", "expr_tree_json": jsonDict, "strategy": strategy, "steps": steps,
+            "halted": halted, "time": time.perf_counter()-start}
+  except Exception as inst:
+    print(inst.args[0])
+    return {"status": "ERROR", "message": inst.args[0]}
+
+# ======== DEFINITIONS ========
+# Names defined for every expression by a prelude, once load_prelude has
+# loaded one; there is none by default, so that free names keep their
+# meaning. A free occurrence of a defined name is a reference: the delta
+# step of an applied reference puts the definition in its place, so
+# definitions are only expanded where a redex needs them and every expansion
+# is the same shared tree. A lambda of the same name shadows the definition
+# as usual. Normalizing the standard prelude takes longer than the rest of
+# the engine takes to load, so its definitions are also prebuilt in
+# PRELUDE_TABLE.py, like the parser tables; after changing prelude.lambda,
+# rebuild it with python Lambda.py.
+PRELUDE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),"prelude.lambda")
+PRELUDE_TABLE = "LambdaPreludetab"
+DEFINITION_STEPS = 1000
+DEFINITION_SIZE = 2000
+definitions = {}
+prelude = None  # the file definitions came from, for processes that need the same
+definitions_key = ""  # digest of the definitions, for results that depend on them
+
+def normal_definition(tree):
+  # tree's normal form if it is reached within the limits, else tree
+  (normal,steps,halted) = reduce_tree(tree,"normal-order",DEFINITION_STEPS,DEFINITION_SIZE)
+  return normal if halted == "done" else tree
+
+def expand_definitions(tree):
+  # tree with every reference replaced by its definition, which read_prelude
+  # does to each definition with the ones before it, so that the stored
+  # definitions are closed and nothing is captured when they are put in
+  for name in sorted(tree.fv & definitions.keys()):
+    tree = substitute(tree,name,definitions[name])
+  return tree
+
+def prelude_signature(text):
+  # what the definitions of text depend on
+  limits = "%d %d\n" % (DEFINITION_STEPS,DEFINITION_SIZE)
+  return hashlib.sha256((limits+normalize_text(text)).encode()).hexdigest()
+
+def closed_definition(name,tree):
+  # the delta step puts a definition in place as it is, so a free name in
+  # it would be captured by the lambdas around the reference
+  if tree.fv:
+    raise ValueError("definition of %s has free variables: %s" % (name,", ".join(sorted(tree.fv))))
+  return tree
+
+def read_prelude(text):
+  # each definition is expanded before it is normalized, so that definitions
+  # never refer to each other; they may only use the ones before them
+  (lets,tree) = parse_definitions(normalize_text(text))
+  old = dict(definitions)
+  definitions.clear()
+  try:
+    for (name,definition) in lets:
+      definitions[name] = normal_definition(closed_definition(name,expand_definitions(definition)))
+  except ValueError:
+    definitions.clear()
+    definitions.update(old)
+    raise
+
+def load_prelude(path=PRELUDE_FILE):
+  # the definitions of path, from the prebuilt table when it was built from
+  # the same text. Parsed texts may have used the old ones.
+  global prelude
+  with open(path) as file:
+    text = file.read()
+  try:
+    table = importlib.import_module(PRELUDE_TABLE)
+  except ImportError:
+    table = None
+  if table is not None and table.signature == prelude_signature(text):
+    loaded = {name: closed_definition(name,decode_tree(data)) for (name,data) in table.definitions}
+    definitions.clear()
+    definitions.update(loaded)
+  else:
+    read_prelude(text)
+  prelude = path
+  parse_text.cache_clear()
+  set_definitions_key()
+
+def set_definitions_key():
+  global definitions_key
+  text = "".join(name+"="+alpha_key(definitions[name])+";" for name in sorted(definitions))
+  definitions_key = hashlib.sha256(text.encode()).hexdigest()[:16] if definitions else ""
+
+def build_prelude_table(path=PRELUDE_FILE):
+  with open(path) as file:
+    text = file.read()
+  read_prelude(text)
+  with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),PRELUDE_TABLE+".py"),"w") as file:
+    file.write("# %s.py\n# This file is automatically generated from %s. Do not edit.\n" %
+               (PRELUDE_TABLE,os.path.basename(path)))
+    file.write("signature = %r\n" % prelude_signature(text))
+    file.write("definitions = [\n")
+    for (name,definition) in definitions.items():
+      file.write("  (%r,%r),\n" % (name,encode_tree(definition)))
+    file.write("]\n")
+  print("wrote",PRELUDE_TABLE + ".py")
 
+if __name__ == "__main__":
+  build_prelude_table()
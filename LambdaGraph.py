@@ -0,0 +1,223 @@
+import time
+from Lambda import walk, as_tree, tree2dict, arith, bind_fv, union_fv, NO_FV, stats, definitions
+from LambdaNameless import to_named
+
+# Call-by-need graph reduction. Terms are mutable lists:
+#   ['name',X]  ['num',v]  ['var',lam]  ['lambda',hint,body,fv]
+#   ['apply',fun,arg,fv]  [op,left,right,fv]  ['ind',target]
+# A bound variable points at its own lambda node, and fv holds the ids of
+# the lambdas a node refers to (a superset once the node has been reduced).
+# Beta reduction copies the lambda body but only points at the argument, and
+# an application is overwritten with an indirection to its result, so every
+# argument is evaluated at most once no matter how often it is used.
+
+allocated = 0
+
+class Halt(Exception):
+  pass
+
+def mk(*items):
+  global allocated
+  allocated += 1
+  return list(items)
+
+def deref(n):
+  while n[0] == "ind":
+    n = n[1]
+  return n
+
+def graph_fv(n):
+  n = deref(n)
+  if n[0] == "var":
+    return frozenset([id(n[1])])
+  elif n[0] in ["name","num"]:
+    return NO_FV
+  else:
+    return n[3]
+
+def from_tree(tree):
+  scope = {}
+  def close(var,lam):
+    def combine(body):
+      scope[var].pop()
+      lam[2] = body
+      lam[3] = bind_fv(graph_fv(body),id(lam))
+      return lam
+    return combine
+  def expand(t):
+    if t.kind == "name":
+      if scope.get(t.value):
+        return (None,mk("var",scope[t.value][-1]))
+      return (None,mk("name",t.value))
+    elif t.kind == "num":
+      return (None,mk("num",t.value))
+    elif t.kind == "lambda":
+      lam = mk("lambda",t.value,None,None)
+      scope.setdefault(t.value,[]).append(lam)
+      return ([t.left],close(t.value,lam))
+    else:  # must be "op" or "apply"
+      tag = "apply" if t.kind == "apply" else t.value
+      return ([t.left,t.right],lambda left,right: mk(tag,left,right,union_fv(graph_fv(left),graph_fv(right))))
+  return walk(tree,expand)
+
+def instantiate(lam,arg,budget):
+  # copy of lam's body with its variable pointing at arg; subgraphs that do
+  # not mention any binder being copied are shared instead of copied
+  key = id(lam)
+  copies = {}
+  def new(*items):
+    budget["allocated"] += 1
+    return mk(*items)
+  def shared(n):
+    for b in graph_fv(n):
+      if b == key or b in copies:
+        return False
+    return True
+  def close(old,copy):
+    def combine(body):
+      del copies[id(old)]
+      copy[2] = body
+      copy[3] = bind_fv(graph_fv(body),id(copy))
+      return copy
+    return combine
+  def expand(n):
+    n = deref(n)
+    if n[0] == "var":
+      if n[1] is lam:
+        return (None,arg)
+      copy = copies.get(id(n[1]))
+      return (None,n if copy is None else new("var",copy))
+    elif n[0] in ["name","num"] or shared(n):
+      return (None,n)
+    elif n[0] == "lambda":
+      copy = new("lambda",n[1],None,None)
+      copies[id(n)] = copy
+      return ([n[2]],close(n,copy))
+    else:  # must be "op" or "apply"
+      return ([n[1],n[2]],lambda left,right: new(n[0],left,right,union_fv(graph_fv(left),graph_fv(right))))
+  return walk(lam[2],expand)
+
+def count_step(budget):
+  if budget["steps"] >= budget["max_steps"]:
+    raise Halt("step limit")
+  if budget["allocated"] > budget["max_size"]:
+    raise Halt("size limit")
+  if budget["deadline"] is not None and time.perf_counter() > budget["deadline"]:
+    raise Halt("time limit")
+  budget["steps"] += 1
+  stats["graph_steps"] += 1
+
+def reference(name,budget):
+  graphs = budget["definitions"]
+  if name not in graphs:
+    graphs[name] = from_tree(definitions[name])
+    budget["allocated"] += definitions[name].size
+  return graphs[name]
+
+def whnf(n,budget):
+  # unwind the application spine; frames are application nodes waiting for
+  # their function, or ["operand",op,k] while op's operands are evaluated
+  frames = []
+  finished = False
+  while True:
+    n = deref(n)
+    if finished:
+      finished = False
+    elif n[0] == "apply":
+      frames.append(n)
+      n = n[1]
+      continue
+    elif n[0] == "name" and n[1] in definitions and frames and frames[-1][0] == "apply":
+      # a delta step; the graph of a definition is made once per run and
+      # shared like any other argument
+      count_step(budget)
+      n = reference(n[1],budget)
+      continue
+    elif n[0] == "lambda" and frames and frames[-1][0] == "apply":
+      app = frames.pop()
+      count_step(budget)
+      n = instantiate(n,app[2],budget)
+      app[:] = ["ind",n]
+      continue
+    elif n[0] not in ["name","num","var","lambda"]:  # must be "op"
+      frames.append(["operand",n,1])
+      n = n[1]
+      continue
+    # n is in weak head normal form; a stuck spine is its outermost application
+    while frames and frames[-1][0] == "apply":
+      n = frames.pop()
+    if not frames:
+      return n
+    frame = frames[-1]
+    if frame[2] == 1:
+      frame[2] = 2
+      n = frame[1][2]
+      continue
+    frames.pop()
+    n = frame[1]
+    left = deref(n[1])
+    right = deref(n[2])
+    if left[0] == "num" and right[0] == "num":
+      count_step(budget)
+      n[:] = ["num",arith(n[0],left[1],right[1])]
+    finished = True
+
+def normal_form(root,budget):
+  # weak head normal form first, then the parts left to right: the graph
+  # version of normal order. seen keeps shared nodes from being redone.
+  seen = {}
+  stack = [root]
+  while stack:
+    n = whnf(stack.pop(),budget)
+    if id(n) in seen:
+      continue
+    seen[id(n)] = n
+    if n[0] == "lambda":
+      stack.append(n[2])
+    elif n[0] not in ["name","num","var"]:  # stuck "apply" or "op"
+      stack.append(n[2])
+      stack.append(n[1])
+
+def to_nameless(root):
+  levels = {}
+  def expand(item):
+    (n,depth) = item
+    n = deref(n)
+    if n[0] == "var":
+      return (None,["bound",depth-1-levels[id(n[1])]])
+    elif n[0] in ["name","num"]:
+      return (None,[n[0],n[1]])
+    elif n[0] == "lambda":
+      levels[id(n)] = depth
+      return ([(n[2],depth+1)],lambda body: ["lambda",n[1],body])
+    else:  # must be "op" or "apply"
+      return ([(n[1],depth),(n[2],depth)],lambda left,right: [n[0],left,right])
+  return walk((root,0),expand)
+
+def reduce_tree(tree,max_steps=10000,max_size=100000,max_time=None):
+  # (tree reached, steps taken, why it stopped) for an engine tree
+  deadline = None if max_time is None else time.perf_counter()+max_time
+  # allocated counts this run's graph nodes: from_tree makes one per node
+  # of the unshared tree, tree.size of them
+  budget = {"steps": 0, "max_steps": max_steps, "max_size": max_size, "allocated": tree.size, "deadline": deadline,
+            "definitions": {}}
+  root = from_tree(tree)
+  halted = "done"
+  try:
+    normal_form(root,budget)
+  except Halt as inst:
+    halted = inst.args[0]
+  return (to_named(to_nameless(root)),budget["steps"],halted)
+
+def normalize(expr,max_steps=10000,max_size=100000,max_time=None):
+  # same result as Lambda.normalize; max_size caps the graph nodes allocated
+  start = time.perf_counter()
+  try:
+    before = allocated
+    (tree,steps,halted) = reduce_tree(as_tree(expr),max_steps,max_size,max_time)
+    jsonDict = tree2dict(tree)
+    return {"status": "OK", "expr_tree_json": jsonDict, "strategy": "call-by-need", "steps": steps,
+            "halted": halted, "time": time.perf_counter()-start, "allocated": allocated-before}
+  except Exception as inst:
+    print(inst.args[0])
+    return {"status": "ERROR", "message": inst.args[0]}
@@ -1,6 +1,7 @@
 import ply.lex as lex
+from fractions import Fraction
 
-reserved = { 'lambda': 'LAMBDA', 'fv': 'FV', 'alpha': 'ALPHA' }
+reserved = { 'lambda': 'LAMBDA', 'fv': 'FV', 'alpha': 'ALPHA', 'let': 'LET' }
 
 tokens = ['NUMBER', 'LPAREN', 'RPAREN', 'OP', 'NAME', 'EQUALS', 'LBRACKET', 'RBRACKET', 'SEMI', 'COMMA'] + list(reserved.values())
 
@@ -18,11 +19,50 @@ def t_NAME(t):
   t.type = reserved.get(t.value.lower(),'NAME')
   return t
 
+# Numerators and denominators have at most NUMBER_DIGITS digits, as many as
+# int and str convert by default, so that every number can be written out
+NUMBER_DIGITS = 4300
+NUMBER_LIMIT = 10**NUMBER_DIGITS
+
 def t_NUMBER(t):
-  r'[0-9]+(\.[0-9]*)?'
-  t.value = float(t.value)
+  r'[0-9]+(/[0-9]+|\.[0-9]*)?'
+  try:
+    t.value = number(t.value)
+  except ValueError as inst:
+    print("Illegal number '%s'" % (t.value if len(t.value) <= 20 else t.value[:20]+"..."))
+    raise Exception('LEXER ERROR: %s' % inst)
   return t
 
+def number(text):
+  # exact value of a number: an int, or a Fraction for 1.5 and 1/3; float
+  # only for the nan and inf that arithmetic on floats can give. A number
+  # with too many digits is a ValueError, never read as another number.
+  if text in ["nan","inf","-inf"]:
+    return float(text)
+  try:
+    value = bounded(Fraction(text))
+  except ValueError:
+    if sum(c.isdigit() for c in text) <= NUMBER_DIGITS:
+      raise
+    value = None
+  except ZeroDivisionError:
+    raise ValueError("number with denominator 0")
+  if value is None:
+    raise ValueError("number with more than %d digits" % NUMBER_DIGITS)
+  return value
+
+def bounded(value):
+  # value, an int when it is a whole Fraction; None when its numerator or
+  # denominator has more than NUMBER_DIGITS digits
+  if type(value) is Fraction:
+    if value.denominator == 1:
+      value = value.numerator
+    elif value.denominator >= NUMBER_LIMIT or abs(value.numerator) >= NUMBER_LIMIT:
+      return None
+  if type(value) is int and abs(value) >= NUMBER_LIMIT:
+    return None
+  return value
+
 # Ignored characters
 t_ignore = " \r\n\t"
 t_ignore_COMMENT = r'\#.*'
@@ -31,4 +71,8 @@ def t_error(t):
   print("Illegal character '%s'" % t.value[0])
   raise Exception('LEXER ERROR')
 
-lexer = lex.lex()
+# The lexer tables are prebuilt in LambdaLextab.py and read without checking
+# them against the rules above; python LambdaParser.py rebuilds them
+TABLES = 'LambdaLextab'
+
+lexer = lex.lex(optimize=True, lextab=TABLES)
@@ -0,0 +1,10 @@
+# LambdaLextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('ALPHA', 'COMMA', 'EQUALS', 'FV', 'LAMBDA', 'LBRACKET', 'LET', 'LPAREN', 'NAME', 'NUMBER', 'OP', 'RBRACKET', 'RPAREN', 'SEMI'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_NAME>[a-zA-Z][_a-zA-Z0-9]*)|(?P<t_NUMBER>[0-9]+(/[0-9]+|\\.[0-9]*)?)|(?P<t_OP>\\+ | - | \\* | /)|(?P<t_ignore_COMMENT>\\#.*)|(?P<t_LBRACKET>\\[)|(?P<t_LPAREN>\\()|(?P<t_RBRACKET>\\])|(?P<t_RPAREN>\\))|(?P<t_COMMA>,)|(?P<t_EQUALS>=)|(?P<t_SEMI>;)', [None, ('t_NAME', 'NAME'), ('t_NUMBER', 'NUMBER'), None, (None, 'OP'), (None, None), (None, 'LBRACKET'), (None, 'LPAREN'), (None, 'RBRACKET'), (None, 'RPAREN'), (None, 'COMMA'), (None, 'EQUALS'), (None, 'SEMI')])]}
+_lexstateignore = {'INITIAL': ' \r\n\t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
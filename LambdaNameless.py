@@ -0,0 +1,218 @@
+from Lambda import walk, node, stats
+import Lambda
+from LambdaLexer import number
+
+# Locally nameless terms: bound variables are ['bound',k] de Bruijn indices,
+# free variables stay ['name',X]. Lambdas keep their original variable name
+# only as a hint for converting back, so substitution never renames anything.
+#
+# walk() runs expand in preorder and combine in postorder, so a binder list
+# pushed in expand and popped in combine always holds exactly the binders in
+# scope.
+
+def lookup(ctx,name):
+  for k in range(len(ctx)-1,-1,-1):
+    if ctx[k] == name:
+      return ["bound",len(ctx)-1-k]
+  return ["name",name]
+
+def to_nameless(tree):
+  ctx = []
+  def close(var):
+    def combine(body):
+      ctx.pop()
+      return ["lambda",var,body]
+    return combine
+  def expand(t):
+    if t.kind == "name":
+      return (None,lookup(ctx,t.value))
+    elif t.kind == "num":
+      return (None,["num",t.value])
+    elif t.kind == "lambda":
+      ctx.append(t.value)
+      return ([t.left],close(t.value))
+    elif t.kind == "apply":
+      return ([t.left,t.right],lambda left,right: ["apply",left,right])
+    else:  # must be "op"
+      return ([t.left,t.right],lambda left,right: [t.value,left,right])
+  return walk(tree,expand)
+
+def json2nameless(jtree):
+  ctx = []
+  def close(var):
+    def combine(body):
+      ctx.pop()
+      return ["lambda",var,body]
+    return combine
+  def expand(j):
+    if j["type"] == "name":
+      return (None,lookup(ctx,j["value"]))
+    elif j["type"] == "num":
+      return (None,["num",number(j["value"])])
+    elif j["type"] == "lambda":
+      ctx.append(j["var"])
+      return (j["children"],close(j["var"]))
+    elif j["type"] == "apply":
+      return (j["children"],lambda left,right: ["apply",left,right])
+    else: # must be op
+      return (j["children"],lambda left,right: [j["value"],left,right])
+  return walk(jtree,expand)
+
+def is_closed(term):
+  stack = [(term,0)]
+  while stack:
+    (term,depth) = stack.pop()
+    if term[0] == "bound":
+      if term[1] >= depth:
+        return False
+    elif term[0] == "lambda":
+      stack.append((term[2],depth+1))
+    elif term[0] not in ["name","num"]:  # must be "op" or "apply"
+      stack.append((term[1],depth))
+      stack.append((term[2],depth))
+  return True
+
+def shift(term,d,cutoff=0):
+  def expand(item):
+    (t,cutoff) = item
+    if t[0] == "bound":
+      if t[1] >= cutoff:
+        return (None,["bound",t[1]+d])
+      else:
+        return (None,t)
+    elif t[0] in ["name","num"]:
+      return (None,t)
+    elif t[0] == "lambda":
+      return ([(t[2],cutoff+1)],lambda body: ["lambda",t[1],body])
+    else:  # must be "op" or "apply"
+      return ([(t[1],cutoff),(t[2],cutoff)],lambda left,right: [t[0],left,right])
+  return walk((term,cutoff),expand)
+
+def open_body(body,val,closed,depth=0):
+  # body[0 := val] with the removed binder's indices shifted down, in one pass
+  def expand(item):
+    (t,depth) = item
+    if t[0] == "bound":
+      if t[1] == depth:
+        if closed or depth == 0:
+          return (None,val)
+        return (None,shift(val,depth))
+      elif t[1] > depth:
+        return (None,["bound",t[1]-1])
+      else:
+        return (None,t)
+    elif t[0] in ["name","num"]:
+      return (None,t)
+    elif t[0] == "lambda":
+      return ([(t[2],depth+1)],lambda body: ["lambda",t[1],body])
+    else:  # must be "op" or "apply"
+      return ([(t[1],depth),(t[2],depth)],lambda left,right: [t[0],left,right])
+  return walk((body,depth),expand)
+
+def beta(lam,arg):
+  return open_body(lam[2],arg,is_closed(arg))
+
+def reduce_at(term,path):
+  # path is the node id without the leading 'R', e.g. '0110'
+  spine = []
+  for step in path:
+    if term[0] in ["name","num","bound"]:
+      return None
+    spine.append(term)
+    if term[0] == "lambda":
+      term = term[2]
+    elif step == "0":
+      term = term[1]
+    else:
+      term = term[2]
+  if term[0] != "apply" or term[1][0] != "lambda":
+    return None
+  stats["beta_steps"] += 1
+  term = beta(term[1],term[2])
+  for k in range(len(spine)-1,-1,-1):
+    parent = spine[k]
+    if parent[0] == "lambda":
+      term = ["lambda",parent[1],term]
+    elif path[k] == "0":
+      term = [parent[0],term,parent[2]]
+    else:
+      term = [parent[0],parent[1],term]
+  return term
+
+def outer_refs(term,memo):
+  # (free names, loose indices relative to term); both are independent of
+  # where the term sits, so shared subterms are only analysed once
+  def remember(t,refs):
+    memo[id(t)] = (t,refs)
+    return refs
+  def expand(t):
+    key = id(t)
+    if key in memo:
+      return (None,memo[key][1])
+    elif t[0] == "bound":
+      return (None,remember(t,(frozenset(),frozenset([t[1]]))))
+    elif t[0] == "name":
+      return (None,remember(t,(frozenset([t[1]]),frozenset())))
+    elif t[0] == "num":
+      return (None,remember(t,(frozenset(),frozenset())))
+    elif t[0] == "lambda":
+      return ([t[2]],lambda refs: remember(t,(refs[0],frozenset(k-1 for k in refs[1] if k > 0))))
+    else:  # must be "op" or "apply"
+      return ([t[1],t[2]],lambda refs1,refs2: remember(t,(refs1[0] | refs2[0],refs1[1] | refs2[1])))
+  return walk(term,expand)
+
+def binder_name(term,ctx,memo):
+  (names,loose) = outer_refs(term[2],memo)
+  taken = set(names)
+  for k in loose:
+    if k > 0:
+      taken.add(ctx[-k])
+  var = term[1]
+  i = 0
+  while var in taken:
+    var = '_'+str(i)
+    i += 1
+  return var
+
+def to_named(term):
+  ctx = []
+  memo = {}
+  def close(var):
+    def combine(body):
+      ctx.pop()
+      return node("lambda",var,body)
+    return combine
+  def expand(t):
+    if t[0] == "bound":
+      return (None,node("name",ctx[-1-t[1]]))
+    elif t[0] in ["name","num"]:
+      return (None,node(t[0],t[1]))
+    elif t[0] == "lambda":
+      var = binder_name(t,ctx,memo)
+      ctx.append(var)
+      return ([t[2]],close(var))
+    elif t[0] == "apply":
+      return ([t[1],t[2]],lambda left,right: node("apply",None,left,right))
+    else:  # must be "op"
+      return ([t[1],t[2]],lambda left,right: node("op",t[0],left,right))
+  return walk(term,expand)
+
+def get_next_tree(jtree,nodeid):
+  term = reduce_at(json2nameless(jtree),nodeid[1:])
+  if term is not None:
+    return to_named(term)
+  else:
+    print('Something went WRONG!')
+    return None
+
+def contract(redex):
+  # Lambda.contract for a beta redex given as an engine tree
+  term = to_nameless(redex)
+  return to_named(beta(term[1],term[2]))
+
+def specific_beta_reduction(etree,nodeid):
+  # same contract as Lambda.specific_beta_reduction, on an engine tree
+  term = reduce_at(to_nameless(etree),nodeid[1:])
+  if term is None:  # not a beta redex, but it may be an applied reference
+    return Lambda.specific_beta_reduction(etree,nodeid)
+  return (True,to_named(term))
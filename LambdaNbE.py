@@ -0,0 +1,184 @@
+import time
+from Lambda import walk, as_tree, tree2dict, arith, find_redex, stats, definitions
+from LambdaNameless import to_nameless, to_named
+
+# Normalization by evaluation. A locally nameless term is evaluated to a
+# value, so a beta step extends an environment instead of rewriting the
+# body. Values are
+#   ('lambda',hint,body,env)  a closure of the body's nameless term
+#   ('num',v)  ('name',X)  ('level',k)  ('apply',fun,thunk)  (op,left,right)
+# where the last four are stuck: a free name, the variable of the k-th
+# lambda being read back, or an application or op that cannot go further.
+# A free name with a definition is replaced by the definition's value when
+# it is applied, as in Lambda's delta steps, and stays a name elsewhere.
+# Arguments are passed as thunks [value] or [None,term,env] and evaluated
+# at most once, so the result is the normal form normal order finds.
+# Reading back applies each lambda to a fresh 'level' value and turns the
+# result into a nameless term again.
+#
+# Evaluation goes as deep as the chains of thunks it forces, so run keeps
+# its continuation as an explicit stack of frames rather than on Python's
+# stack, and no term is too deep for it.
+
+class Halt(Exception):
+  pass
+
+def count_step(budget):
+  if budget["steps"] >= budget["max_steps"]:
+    raise Halt("step limit")
+  if budget["deadline"] is not None and time.perf_counter() > budget["deadline"]:
+    raise Halt("time limit")
+  budget["steps"] += 1
+  stats["nbe_steps"] += 1
+
+def lookup(env,k):
+  # an environment is (thunk,outer environment)
+  for _ in range(k):
+    env = env[1]
+  return env[0]
+
+def argument(t,env):
+  # the thunk of argument t: variables pass their thunk on and constants
+  # need no delaying
+  if t[0] == "bound":
+    return lookup(env,t[1])
+  elif t[0] in ["name","num"]:
+    return [(t[0],t[1])]
+  return [None,t,env]
+
+def compute(op,left,right,budget):
+  if left[0] == "num" and right[0] == "num":
+    count_step(budget)
+    return ("num",arith(op,left[1],right[1]))
+  return (op,left,right)
+
+def run(term,env,budget):
+  # the value of term in env. The frames are ("update",thunk) for a thunk
+  # being forced, ("apply",arg,env) and ("define",name,thunk) for the
+  # function of an application and the definition it refers to, and
+  # ("left",term,env) and ("right",op,left) for the operands of an op.
+  stack = []
+  while True:
+    if term is not None:
+      kind = term[0]
+      if kind == "bound":
+        thunk = lookup(env,term[1])
+        if thunk[0] is None:
+          stack.append(("update",thunk))
+          (term,env) = (thunk[1],thunk[2])
+          continue
+        value = thunk[0]
+      elif kind in ["name","num"]:
+        value = (kind,term[1])
+      elif kind == "lambda":
+        value = ("lambda",term[1],term[2],env)
+      elif kind == "apply":
+        stack.append(("apply",term[2],env))
+        term = term[1]
+        continue
+      else:  # must be an op
+        stack.append(("left",term,env))
+        term = term[1]
+        continue
+      term = None
+    if not stack:
+      return value
+    frame = stack.pop()
+    if frame[0] == "update":
+      thunk = frame[1]
+      thunk[0] = value
+      del thunk[1:]
+      continue
+    elif frame[0] == "left":
+      stack.append(("right",frame[1][0],value))
+      (term,env) = (frame[1][2],frame[2])
+      continue
+    elif frame[0] == "right":
+      value = compute(frame[1],frame[2],value,budget)
+      continue
+    elif frame[0] == "apply":
+      (fun,thunk) = (value,argument(frame[1],frame[2]))
+      if fun[0] == "name" and fun[1] in definitions:
+        # the value of a definition, evaluated once per run
+        values = budget["definitions"]
+        count_step(budget)
+        if fun[1] not in values:
+          stack.append(("define",fun[1],thunk))
+          (term,env) = (to_nameless(definitions[fun[1]]),None)
+          continue
+        fun = values[fun[1]]
+    else:  # must be "define"
+      (name,thunk) = frame[1:]
+      fun = budget["definitions"][name] = value
+    if fun[0] == "lambda":
+      count_step(budget)
+      (term,env) = (fun[2],(thunk,fun[3]))
+    else:
+      value = ("apply",fun,thunk)
+
+def force(thunk,budget):
+  if thunk[0] is None:
+    thunk[0] = run(thunk[1],thunk[2],budget)
+    del thunk[1:]
+  return thunk[0]
+
+def read_back(value,budget):
+  # the nameless term of value; a value read back at the same depth twice
+  # is only read back once. The memo holds on to its values, so their ids
+  # stay theirs.
+  memo = {}
+  def size(term):
+    budget["size"] += 1
+    if budget["size"] > budget["max_size"]:
+      raise Halt("size limit")
+    return term
+  def remember(v,depth,term):
+    memo[(id(v),depth)] = (v,term)
+    return size(term)
+  def expand(item):
+    (v,depth) = item
+    if (id(v),depth) in memo:
+      return (None,memo[(id(v),depth)][1])
+    elif v[0] in ["name","num"]:
+      return (None,size([v[0],v[1]]))
+    elif v[0] == "level":
+      return (None,size(["bound",depth-1-v[1]]))
+    elif v[0] == "lambda":
+      body = run(v[2],([("level",depth)],v[3]),budget)
+      return ([(body,depth+1)],lambda b: remember(v,depth,["lambda",v[1],b]))
+    elif v[0] == "apply":
+      return ([(v[1],depth),(force(v[2],budget),depth)],lambda f,a: remember(v,depth,["apply",f,a]))
+    else:  # must be a stuck op
+      return ([(v[1],depth),(v[2],depth)],lambda l,r: remember(v,depth,[v[0],l,r]))
+  return walk((value,0),expand)
+
+def evaluate(tree,budget):
+  # the nameless normal form of tree
+  return read_back(run(to_nameless(tree),None,budget),budget)
+
+def reduce_tree(tree,max_steps=10000,max_size=100000,max_time=None):
+  # (tree reached, steps taken, why it stopped) for an engine tree. There is
+  # no partial result to read back, so a halted run returns tree unchanged.
+  deadline = None if max_time is None else time.perf_counter()+max_time
+  budget = {"steps": 0, "max_steps": max_steps, "size": 0, "max_size": max_size, "deadline": deadline,
+            "definitions": {}}
+  if find_redex(tree,"normal-order") is None:
+    return (tree,0,"done")
+  try:
+    term = evaluate(tree,budget)
+  except Halt as inst:
+    return (tree,budget["steps"],inst.args[0])
+  return (to_named(term),budget["steps"],"done")
+
+def normalize(expr,max_steps=10000,max_size=100000,max_time=None):
+  # same result as Lambda.normalize for terms with a normal form; max_size
+  # caps the size of the normal form
+  start = time.perf_counter()
+  try:
+    (tree,steps,halted) = reduce_tree(as_tree(expr),max_steps,max_size,max_time)
+    jsonDict = tree2dict(tree)
+    return {"status": "OK", "expr_tree_json": jsonDict, "strategy": "nbe", "steps": steps,
+            "halted": halted, "time": time.perf_counter()-start}
+  except Exception as inst:
+    print(inst.args[0])
+    return {"status": "ERROR", "message": inst.args[0]}
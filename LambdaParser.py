@@ -1,4 +1,9 @@
+import os
+import sys
+
+import ply.lex as lex
 import ply.yacc as yacc
+import LambdaLexer
 from LambdaLexer import tokens
 
 def p_exprStart_1(p):
@@ -17,6 +22,14 @@ def p_exprStart_4(p):
   'exprStart : ALPHA LBRACKET expr COMMA NAME RBRACKET SEMI'
   p[0] = ['alpha', p[3], p[5].upper()]
 
+def p_exprStart_5(p):
+  'exprStart : LET NAME EQUALS expr SEMI exprStart'
+  p[0] = ['let', p[2].upper(), p[4], p[6]]
+
+def p_exprStart_6(p):
+  'exprStart : LET NAME EQUALS expr SEMI'
+  p[0] = ['let', p[2].upper(), p[4], None]
+
 def p_expr_1(p):
   'expr : NUMBER'
   p[0] = ['num', p[1]]
@@ -43,5 +56,25 @@ def p_expr_5(p):
 def p_error(p):
   print("Syntax error in input!")
 
-parser = yacc.yacc()
+# The LALR tables are prebuilt in LambdaParsetab.py and loaded in optimize
+# mode: they are not checked against the grammar, and nothing is generated
+# or written at import time. Run python LambdaParser.py after changing the
+# grammar or the tokens to rebuild them.
+TABLES = 'LambdaParsetab'
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+parser = yacc.yacc(optimize=True, debug=False, write_tables=False, tabmodule=TABLES)
+
+def build_tables():
+  for name in [LambdaLexer.TABLES, TABLES]:
+    sys.modules.pop(name,None)
+    path = os.path.join(HERE,name + '.py')
+    if os.path.exists(path):
+      os.remove(path)
+  lex.lex(module=LambdaLexer,optimize=True,lextab=LambdaLexer.TABLES,outputdir=HERE)
+  yacc.yacc(debug=False,tabmodule=TABLES,outputdir=HERE)
+  print("wrote",LambdaLexer.TABLES + ".py and",TABLES + ".py")
+
+if __name__ == '__main__':
+  build_tables()
 
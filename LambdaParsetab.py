@@ -0,0 +1,41 @@
+
+# LambdaParsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'ALPHA COMMA EQUALS FV LAMBDA LBRACKET LET LPAREN NAME NUMBER OP RBRACKET RPAREN SEMIexprStart : expr SEMIexprStart : expr LBRACKET NAME EQUALS expr RBRACKET SEMIexprStart : FV LBRACKET expr RBRACKET SEMIexprStart : ALPHA LBRACKET expr COMMA NAME RBRACKET SEMIexprStart : LET NAME EQUALS expr SEMI exprStartexprStart : LET NAME EQUALS expr SEMIexpr : NUMBERexpr : NAMEexpr : LPAREN expr expr RPARENexpr : LPAREN LAMBDA NAME expr RPARENexpr : LPAREN OP expr expr RPAREN'
+    
+_lr_action_items = {'FV':([0,34,],[4,4,]),'ALPHA':([0,34,],[5,5,]),'LET':([0,34,],[6,6,]),'NUMBER':([0,3,7,8,11,12,14,16,20,22,23,24,28,34,35,36,],[7,-8,-7,7,7,7,7,7,7,7,7,7,-9,7,-10,-11,]),'NAME':([0,3,6,7,8,10,11,12,14,15,16,20,22,23,24,26,28,34,35,36,],[3,-8,13,-7,3,17,3,3,3,22,3,3,3,3,3,33,-9,3,-10,-11,]),'LPAREN':([0,3,7,8,11,12,14,16,20,22,23,24,28,34,35,36,],[8,-8,-7,8,8,8,8,8,8,8,8,8,-9,8,-10,-11,]),'$end':([1,9,32,34,39,40,41,],[0,-1,-3,-6,-5,-2,-4,]),'SEMI':([2,3,7,25,27,28,35,36,37,38,],[9,-8,-7,32,34,-9,-10,-11,40,41,]),'LBRACKET':([2,3,4,5,7,28,35,36,],[10,-8,11,12,-7,-9,-10,-11,]),'RBRACKET':([3,7,18,28,31,33,35,36,],[-8,-7,25,-9,37,38,-10,-11,]),'COMMA':([3,7,19,28,35,36,],[-8,-7,26,-9,-10,-11,]),'RPAREN':([3,7,21,28,29,30,35,36,],[-8,-7,28,-9,35,36,-10,-11,]),'LAMBDA':([8,],[15,]),'OP':([8,],[16,]),'EQUALS':([13,17,],[20,24,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'exprStart':([0,34,],[1,39,]),'expr':([0,8,11,12,14,16,20,22,23,24,34,],[2,14,18,19,21,23,27,29,30,31,2,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> exprStart","S'",1,None,None,None),
+  ('exprStart -> expr SEMI','exprStart',2,'p_exprStart_1','LambdaParser.py',10),
+  ('exprStart -> expr LBRACKET NAME EQUALS expr RBRACKET SEMI','exprStart',7,'p_exprStart_2','LambdaParser.py',14),
+  ('exprStart -> FV LBRACKET expr RBRACKET SEMI','exprStart',5,'p_exprStart_3','LambdaParser.py',18),
+  ('exprStart -> ALPHA LBRACKET expr COMMA NAME RBRACKET SEMI','exprStart',7,'p_exprStart_4','LambdaParser.py',22),
+  ('exprStart -> LET NAME EQUALS expr SEMI exprStart','exprStart',6,'p_exprStart_5','LambdaParser.py',26),
+  ('exprStart -> LET NAME EQUALS expr SEMI','exprStart',5,'p_exprStart_6','LambdaParser.py',30),
+  ('expr -> NUMBER','expr',1,'p_expr_1','LambdaParser.py',34),
+  ('expr -> NAME','expr',1,'p_expr_2','LambdaParser.py',38),
+  ('expr -> LPAREN expr expr RPAREN','expr',4,'p_expr_3','LambdaParser.py',42),
+  ('expr -> LPAREN LAMBDA NAME expr RPAREN','expr',5,'p_expr_4','LambdaParser.py',49),
+  ('expr -> LPAREN OP expr expr RPAREN','expr',5,'p_expr_5','LambdaParser.py',53),
+]
@@ -0,0 +1,34 @@
+# LambdaPreludetab.py
+# This file is automatically generated from prelude.lambda. Do not edit.
+signature = '24d2ab69677e3288b240e412e060ff982a5164abad6a289322c3a31fa1fbe1f2'
+definitions = [
+  ('TRUE',{'nodes': [2, 7, 0], 'names': ['X', 'Y']}),
+  ('FALSE',{'nodes': [2, 7, 5], 'names': ['X', 'Y']}),
+  ('IF',{'nodes': [2, 7, 12, 3, 3, 0, 5, 10], 'names': ['B', 'T', 'E']}),
+  ('NOT',{'nodes': [2, 3, 3, 0, 7, 12, 10, 7, 12, 5], 'names': ['B', 'X', 'Y']}),
+  ('AND',{'nodes': [2, 7, 3, 3, 0, 5, 12, 17, 15], 'names': ['A', 'B', 'X', 'Y']}),
+  ('OR',{'nodes': [2, 7, 3, 3, 0, 12, 17, 10, 5], 'names': ['A', 'B', 'X', 'Y']}),
+  ('PAIR',{'nodes': [2, 7, 12, 3, 3, 10, 0, 5], 'names': ['A', 'B', 'S']}),
+  ('FST',{'nodes': [2, 3, 0, 7, 12, 5], 'names': ['P', 'X', 'Y']}),
+  ('SND',{'nodes': [2, 3, 0, 7, 12, 10], 'names': ['P', 'X', 'Y']}),
+  ('ZERO',{'nodes': [2, 7, 5], 'names': ['F', 'X']}),
+  ('SUCC',{'nodes': [2, 7, 12, 3, 5, 3, 3, 0, 5, 10], 'names': ['N', 'F', 'X']}),
+  ('ONE',{'nodes': [2, 7, 3, 0, 5], 'names': ['F', 'X']}),
+  ('TWO',{'nodes': [2, 7, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('THREE',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('FOUR',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('FIVE',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('SIX',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('SEVEN',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('EIGHT',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('NINE',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('TEN',{'nodes': [2, 7, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 3, 0, 5], 'names': ['F', 'X']}),
+  ('PLUS',{'nodes': [2, 7, 12, 17, 3, 3, 0, 10, 3, 3, 5, 10, 15], 'names': ['M', 'N', 'F', 'X']}),
+  ('MULT',{'nodes': [2, 7, 12, 3, 0, 3, 5, 10], 'names': ['M', 'N', 'F']}),
+  ('POW',{'nodes': [2, 7, 3, 5, 0], 'names': ['B', 'E']}),
+  ('ISZERO',{'nodes': [2, 3, 3, 0, 7, 7, 12, 10, 7, 12, 5], 'names': ['N', 'X', 'Y']}),
+  ('PRED',{'nodes': [2, 3, 3, 3, 0, 7, 12, 3, 3, 10, 3, 5, 17, 22, 20, 27, 17, 3, 25, 3, 3, 3, 5, 17, 22, 20, 25, 15, 12, 3, 3, 10, 27, 17, 15, 27, 17, 15, 17, 22, 15], 'names': ['N', 'P', 'S', 'X', 'Y', 'F']}),
+  ('SUB',{'nodes': [2, 7, 3, 3, 5, 7, 3, 3, 3, 5, 12, 17, 3, 3, 15, 3, 10, 22, 27, 25, 32, 22, 3, 30, 3, 3, 3, 10, 22, 27, 25, 30, 20, 17, 3, 3, 15, 32, 22, 20, 32, 22, 20, 22, 27, 20, 0], 'names': ['M', 'N', 'P', 'S', 'X', 'Y', 'F']}),
+  ('Y',{'nodes': [2, 3, 7, 3, 0, 3, 5, 5, 7, 3, 0, 3, 5, 5], 'names': ['F', 'X']}),
+  ('FACT',{'nodes': [3, 2, 3, 7, 3, 0, 3, 5, 5, 7, 3, 0, 3, 5, 5, 2, 12, 3, 3, 3, 17, 22, 27, 3, 3, 15, 20, 25, 3, 12, 3, 3, 10, 7, 7, 32, 30, 7, 32, 5, 10, 2, 7, 3, 0, 5, 3, 3, 37, 12, 2, 3, 35, 3, 10, 0, 10, 3, 0, 3, 12, 3, 3, 3, 10, 42, 47, 3, 3, 45, 3, 40, 7, 32, 30, 2, 7, 3, 0, 3, 3, 3, 40, 7, 32, 30, 0, 5, 47, 3, 3, 45, 2, 7, 5, 2, 7, 5, 7, 32, 5, 10], 'names': ['F', 'X', 'N', 'B', 'T', 'E', 'Y', 'M', 'P', 'S']}),
+]
@@ -1,14 +1,30 @@
 import dash
-from dash import Dash, html, dcc, callback, Output, Input, State, no_update
+from dash import Dash, html, dcc, callback, Output, Input, State, no_update, Patch
 import dash_cytoscape as cyto
 from urllib.parse import urlparse, parse_qs
 from argparse import ArgumentParser
+from bisect import bisect_left, bisect_right
+from collections import deque
 
+import cProfile
+import json
 import os
+import shlex
+import sys
+import threading
+import time
+from functools import wraps
+from flask import request, g
 
-from Lambda import get_initial_tree, get_next_tree, get_next_tree_after_math
-from Lambda import tree2dict, to_string, json2tree
+from Lambda import parse, specific_beta_reduction, eval_math, fold_constants, STRATEGIES
+from Lambda import node2dict, to_string, subtree_at, shadowed_at
+from Lambda import encode_tree, decode_tree
+from Lambda import parse_cache_info, set_parse_cache_size, PARSE_CACHE_SIZE, MAX_GROWTH, PRELUDE_FILE, load_prelude
+from sessions import MemoryStore, DiskStore, new_session_id
 from styles import cytoscape_stylesheet
+from metrics import Registry
+from normalforms import NormalForms, reduce_with
+from sandbox import Sandbox, BudgetExceeded
 import re
 
 cyto.load_extra_layouts()
@@ -17,76 +33,674 @@ app.title = "Lambda Engine"
 
 
 # --------- Helpers ---------
-def compute_subtree_width(node, base_width=120):
-    if not node.get("children"):
-        return base_width
-    return sum(compute_subtree_width(child, base_width) for child in node["children"])
+def tidy_layout(root, x_sep=60, y_sep=100):
+    # Reingold-Tilford layout: (x, y) of every node in preorder, with the
+    # root at (0, 0).
+    # Subtrees are laid out bottom up and the two subtrees of a binary node
+    # are pushed apart until their facing contours are x_sep apart on every
+    # level, with the parent centred above them; a single child sits right
+    # under its parent. Contours are followed through threads, so each merge
+    # costs the height of the shorter subtree and the layout is linear.
+    order = []  # preorder
+    parent = []
+    stack = [(root, -1)]
+    while stack:
+        node, up = stack.pop()
+        parent.append(up)
+        order.append(node)
+        stack.extend((child, len(order) - 1) for child in reversed(node["children"]))
+    n = len(order)
+    kids = [[] for _ in range(n)]
+    for v in range(1, n):
+        kids[parent[v]].append(v)
 
+    offset = [0.0] * n  # x relative to the parent
+    thread = [-1] * n  # next contour node below a leaf, if any
+    thread_offset = [0.0] * n  # x of that node relative to the leaf
+    height = [0] * n
+    # deepest level extremes of each subtree: node and x relative to the root
+    left_extreme = list(range(n))
+    left_x = [0.0] * n
+    right_extreme = list(range(n))
+    right_x = [0.0] * n
 
-def json_to_cytoscape_elements(node_data, parent_id=None, elements=None, x=0, y=0, x_offset=120, y_offset=100):
+    def next_left(v):
+        if kids[v]:
+            return kids[v][0], offset[kids[v][0]]
+        return thread[v], thread_offset[v]
+
+    def next_right(v):
+        if kids[v]:
+            return kids[v][-1], offset[kids[v][-1]]
+        return thread[v], thread_offset[v]
+
+    for v in reversed(range(n)):
+        if len(kids[v]) == 1:
+            (c,) = kids[v]
+            height[v] = height[c] + 1
+            left_extreme[v], left_x[v] = left_extreme[c], left_x[c]
+            right_extreme[v], right_x[v] = right_extreme[c], right_x[c]
+        elif kids[v]:
+            (l, r) = kids[v]
+            # walk the right contour of l and the left contour of r together
+            li, lx, ri, rx = l, 0.0, r, 0.0
+            dist = x_sep
+            while True:
+                dist = max(dist, x_sep + lx - rx)
+                nl, step_l = next_right(li)
+                nr, step_r = next_left(ri)
+                if nl < 0 or nr < 0:
+                    break
+                li, lx, ri, rx = nl, lx + step_l, nr, rx + step_r
+            offset[l], offset[r] = -dist / 2, dist / 2
+            height[v] = max(height[l], height[r]) + 1
+            if height[l] > height[r]:
+                # the right contour carries on down the left subtree
+                e = right_extreme[r]
+                thread[e] = nl
+                thread_offset[e] = (offset[l] + lx + step_l) - (offset[r] + right_x[r])
+                left_extreme[v], left_x[v] = left_extreme[l], offset[l] + left_x[l]
+                right_extreme[v], right_x[v] = right_extreme[l], offset[l] + right_x[l]
+            elif height[r] > height[l]:
+                e = left_extreme[l]
+                thread[e] = nr
+                thread_offset[e] = (offset[r] + rx + step_r) - (offset[l] + left_x[l])
+                left_extreme[v], left_x[v] = left_extreme[r], offset[r] + left_x[r]
+                right_extreme[v], right_x[v] = right_extreme[r], offset[r] + right_x[r]
+            else:
+                left_extreme[v], left_x[v] = left_extreme[l], offset[l] + left_x[l]
+                right_extreme[v], right_x[v] = right_extreme[r], offset[r] + right_x[r]
+
+    positions = []
+    xs = [0.0] * n
+    depth = [0] * n
+    for v in range(n):
+        if v:
+            xs[v] = xs[parent[v]] + offset[v]
+            depth[v] = depth[parent[v]] + 1
+        positions.append((xs[v], depth[v] * y_sep))
+    return positions
+
+
+def json_to_cytoscape_elements(node_data, parent_id=None, elements=None, x=0, y=0, x_offset=60, y_offset=100):
     if elements is None:
         elements = []
 
-    node_id = node_data["nodeid"]
-    node_type = node_data["type"]
-    beta_status = node_data.get("beta")
-
-    label = ""
-    node_class = "default-node"
-    if node_type == "lambda":
-        label = node_data["var"]
-        node_class = "lambda-node"
-    elif node_type == "apply":
-        node_class = "apply-node"
-        if beta_status == "YES":
-            node_class += " apply-yes"
-        elif beta_status == "NO":
-            node_class += " apply-no"
-    elif node_type in ["name", "num", "op"]:
-        label = node_data["value"]
-        node_class = f"{node_type}-node"
-
-    # Add current node
-    elements.append({
-        "data": {
-            "id": node_id,
-            "label": label,
-            "type": node_type,
-            "beta": beta_status,
-            "var": node_data.get("var"),
-            "value": node_data.get("value"),
-            "class": node_class,
-        },
-        "position": {"x": x, "y": y},
-        "classes": node_class,
-    })
-
-    if parent_id:
+    positions = iter(tidy_layout(node_data, x_offset, y_offset))  # in the order of the walk below
+    stack = [(node_data, parent_id)]
+    while stack:
+        node_data, parent_id = stack.pop()
+        node_id = node_data["key"]
+        node_type = node_data["type"]
+        beta_status = node_data.get("beta")
+        (node_x, node_y) = next(positions)
+
+        label = ""
+        node_class = "default-node"
+        if node_type == "lambda":
+            label = node_data["var"]
+            node_class = "lambda-node"
+        elif node_type == "apply":
+            node_class = "apply-node"
+            if beta_status == "YES":
+                node_class += " apply-yes"
+            elif beta_status == "NO":
+                node_class += " apply-no"
+        elif node_type in ["name", "num", "op"]:
+            label = node_data["value"]
+            node_class = f"{node_type}-node"
+        elif node_type == "summary":
+            fv = node_data["fv"]
+            label = f'{node_data["size"]} nodes'
+            if fv:
+                label += "\n" + " ".join(fv[:4]) + (" ..." if len(fv) > 4 else "")
+            node_class = "summary-node"
+
+        # Add current node
         elements.append({
             "data": {
-                "source": parent_id,
-                "target": node_id,
-                "id": f"edge_{parent_id}_{node_id}",
-            }
+                "id": node_id,
+                "nodeid": node_data["nodeid"],
+                "label": label,
+                "type": node_type,
+                "beta": beta_status,
+                "var": node_data.get("var"),
+                "value": node_data.get("value"),
+                "size": node_data.get("size"),
+                "class": node_class,
+            },
+            "position": {"x": x + node_x, "y": y + node_y},
+            "classes": node_class,
         })
 
-    # Recurse into children
-    children = node_data.get("children", [])
-    if children:
-        if len(children) == 2:
-            # Dynamically expand offset for wider subtrees
-            left_width = compute_subtree_width(children[0])
-            right_width = compute_subtree_width(children[1])
+        if parent_id:
+            elements.append({
+                "data": {
+                    "source": parent_id,
+                    "target": node_id,
+                    "id": f"edge_{node_id}",
+                }
+            })
+
+        # Visit children, left child first
+        for child in reversed(node_data.get("children", [])):
+            stack.append((child, node_id))
 
-            new_offset = max(x_offset, (left_width + right_width) // 2)
+    elements.sort(key=element_order)
+    return elements
 
-            json_to_cytoscape_elements(children[0], node_id, elements, x - new_offset, y + y_offset, x_offset, y_offset)
-            json_to_cytoscape_elements(children[1], node_id, elements, x + new_offset, y + y_offset, x_offset, y_offset)
 
-        elif len(children) == 1:
-            json_to_cytoscape_elements(children[0], node_id, elements, x, y + y_offset, x_offset, y_offset)
+def element_order(element):
+    # key order, each node's incoming edge right after it
+    data = element["data"]
+    if "target" in data:
+        return (int(data["target"]), 1)
+    return (int(data["id"]), 0)
+
+
+# --------- Reduction history ---------
+# The history is a log of the actions that led to each state plus a full
+# tree every CHECKPOINT_EVERY states. An earlier state is rebuilt by
+# replaying the log from the nearest checkpoint before it. Only the last
+# HISTORY_CAP states are kept, so the history stays the same size however
+# long the reduction runs. Checkpoints are encode_tree dicts when the history
+# lives in the prevtrees store and engine trees when it lives in a session.
+HISTORY_CAP = 200
+CHECKPOINT_EVERY = 20
+
+
+def new_history(checkpoint):
+    return {"log": [{"action": "start"}], "checkpoints": [[0, checkpoint]]}
+
+
+def call(function, *args):
+    return function(*args)
+
+
+def apply_action(etree, entry, run=call):
+    # run calls an engine function, in the sandbox for new steps
+    if entry['action'] == 'beta':
+        (status, etree) = run(specific_beta_reduction, etree, entry['nodeid'])
+        return etree
+    elif entry['action'] == 'fold':
+        return run(fold_constants, etree)[0]
+    else:  # must be 'math'
+        return run(eval_math, etree, entry['nodeid'])
+
+
+def state_at(history, index):
+    # the engine tree of state index. The steps are replayed as take_step
+    # takes them: in the sandbox when it is on, and refused past MAX_SIZE
+    base, checkpoint = max((c for c in history['checkpoints'] if c[0] <= index), key=lambda c: c[0])
+    etree = unpack_tree(checkpoint) if type(checkpoint) is dict else checkpoint
+    for entry in history['log'][base + 1:index + 1]:
+        etree = apply_action(etree, entry, call if SANDBOX is None else SANDBOX.run)
+        if etree.size > MAX_SIZE:
+            raise BudgetExceeded('size', MAX_SIZE)
+    return etree
+
+
+NODE_ID = re.compile(r'R[01]*')
+KEY = re.compile(r'[0-9]{1,18}')
+
+
+def check_history(history):
+    # a history from the prevtrees store must be one record could have made:
+    # at most HISTORY_CAP states, a checkpoint at least every
+    # CHECKPOINT_EVERY states and at every normalize, and only steps in the
+    # log, so going back replays fewer than CHECKPOINT_EVERY steps
+    log = history['log']
+    indexes = [c[0] for c in history['checkpoints']]
+    if not 0 < len(log) <= HISTORY_CAP or log[0] != {"action": "start"}:
+        raise ValueError('not a history')
+    if not indexes or indexes[0] != 0 or any(type(i) is not int for i in indexes):
+        raise ValueError('not a history')
+    for index, next_index in zip(indexes, indexes[1:] + [len(log)]):
+        if not 0 < next_index - index <= CHECKPOINT_EVERY:
+            raise ValueError('not a history')
+    for index, entry in enumerate(log[1:], 1):
+        action = entry['action']
+        if action in ['beta', 'math']:
+            if type(entry['nodeid']) is not str or not NODE_ID.fullmatch(entry['nodeid']):
+                raise ValueError('not a history')
+        elif action not in ['fold', 'normalize'] or (action == 'normalize' and index not in indexes):
+            raise ValueError('not a history')
+    return history
+
+
+def record(history, entry, etree, pack=None):
+    # add the step that produced etree, checkpointed as pack(etree) if pack is
+    # given; normalize results are not replayed, so they are always checkpointed
+    pack = pack or (lambda t: t)
+    if history is None:
+        return new_history(pack(etree))
+    log = history['log']
+    checkpoints = history['checkpoints']
+    log.append(entry)
+    index = len(log) - 1
+    if entry['action'] == 'normalize' or index - checkpoints[-1][0] >= CHECKPOINT_EVERY:
+        checkpoints.append([index, pack(etree)])
+    if len(log) > HISTORY_CAP:
+        # forget everything before the oldest checkpoint that keeps the cap
+        drop = next(c[0] for c in checkpoints if len(log) - c[0] <= HISTORY_CAP)
+        history['log'] = [{"action": "start"}] + log[drop + 1:]
+        history['checkpoints'] = [[i - drop, t] for i, t in checkpoints if i >= drop]
+    return history
+
+
+def go_back_in(history):
+    # (history without its last state, engine tree before it). history may
+    # be a live session, so it is left as it is should the replay fail
+    log = history['log'][:-1]
+    index = len(log) - 1
+    back = {"log": log, "checkpoints": [c for c in history['checkpoints'] if c[0] <= index]}
+    return back, state_at(back, index)
+
+
+# --------- Element keys ---------
+# Cytoscape element ids are per node "key"s rather than node ids. A node id
+# is the node's path and changes whenever the node moves; a key stays with
+# the node for as long as its subtree survives, so the browser only has to
+# be sent the elements that really changed. The keys of a tree are kept as
+# [first, count] runs of consecutive keys in preorder: a fresh tree is one
+# run and a step only breaks up a few. Fresh keys count up from nextkey.
+
+def fresh_keys(etree):
+    return [[0, etree.size]], etree.size
+
+
+def run_starts(runs):
+    # preorder index of the first node of every run
+    starts = []
+    index = 0
+    for first, count in runs:
+        starts.append(index)
+        index += count
+    return starts
+
+
+def key_at(runs, starts, index):
+    # the key of the node at preorder index
+    run = bisect_right(starts, index) - 1
+    return str(runs[run][0] + index - starts[run])
+
+
+def add_run(runs, first, count):
+    if runs and runs[-1][0] + runs[-1][1] == first:
+        runs[-1][1] += count
+    elif count:
+        runs.append([first, count])
+
+
+def copy_runs(runs, starts, start, end, out):
+    # adds the keys of the nodes at preorder indexes start to end to out
+    run = bisect_right(starts, start) - 1
+    while start < end:
+        first, count = runs[run]
+        skip = start - starts[run]
+        take = min(count - skip, end - start)
+        add_run(out, first + skip, take)
+        start += take
+        run += 1
+
+
+def preorder_index(etree, nodeid):
+    index = 0
+    for step in nodeid[1:]:
+        if step == '1':
+            index += 1 + etree.left.size
+            etree = etree.right
+        else:
+            index += 1
+            etree = etree.left
+    return index
+
+
+def carry_keys(etree, new_etree, keys, nodeid='R'):
+    # keys for new_etree, which is etree with the subtree at nodeid replaced.
+    # Nodes outside that subtree keep their keys. A subtree of the
+    # replacement that also occurs in the old subtree takes over its keys;
+    # everything else gets fresh ones. Only the two subtrees are walked.
+    runs, next_key = keys
+    starts = run_starts(runs)
+    old = subtree_at(etree, nodeid[1:])
+    start = preorder_index(etree, nodeid)
+    # old nodes by preorder index within old
+    survivors = {}
+    parents = []
+    stack = [(old, -1)]
+    while stack:
+        t, up = stack.pop()
+        index = len(parents)
+        survivors.setdefault(t, []).append(index)
+        parents.append(up)
+        if t.kind == "lambda":
+            stack.append((t.left, index))
+        elif t.kind in ["apply", "op"]:
+            stack.append((t.right, index))
+            stack.append((t.left, index))
+    for matches in survivors.values():
+        matches.reverse()  # first occurrence last
+    # claimed old nodes and their ancestors, which can no longer be taken whole
+    used = bytearray(old.size)
+
+    def claim(index, size):
+        used[index:index + size] = b'\x01' * size
+        up = parents[index]
+        while up >= 0 and not used[up]:
+            used[up] = 1
+            up = parents[up]
+
+    new_runs = []
+    copy_runs(runs, starts, 0, start, new_runs)
+    stack = [subtree_at(new_etree, nodeid[1:])]
+    while stack:
+        t = stack.pop()
+        matches = survivors.get(t, [])
+        while matches and used[matches[-1]]:
+            matches.pop()
+        if matches:
+            index = matches.pop()
+            claim(index, t.size)
+            copy_runs(runs, starts, start + index, start + index + t.size, new_runs)
+            continue
+        add_run(new_runs, next_key, 1)
+        next_key += 1
+        if t.kind == "lambda":
+            stack.append(t.left)
+        elif t.kind in ["apply", "op"]:
+            stack.append(t.right)
+            stack.append(t.left)
+    copy_runs(runs, starts, start + old.size, etree.size, new_runs)
+    return new_runs, next_key
+
+
+def elements_patch(old_elements, new_elements):
+    # Patch turning the browser's old element list into the new one. Both are
+    # in key order, so changed and removed elements are addressed by index
+    # and new ones are inserted where they sort; fresh keys are larger than
+    # any old one and simply go on the end. When the patch would be no
+    # smaller, the whole list is sent instead.
+    new_by_id = {e["data"]["id"]: e for e in new_elements}
+    patch = Patch()
+    removed = []
+    kept = []
+    for index, element in enumerate(old_elements):
+        new = new_by_id.pop(element["data"]["id"], None)
+        if new is None:
+            removed.append(index)
+            continue
+        kept.append(element_order(element))
+        for field, value in new.items():
+            if element.get(field) != value:
+                patch[index][field] = value
+    for index in reversed(removed):
+        del patch[index]
+    added = list(new_by_id.values())
+    orders = [element_order(e) for e in added]
+    tail = bisect_left(orders, kept[-1]) if kept else 0
+    for count, element in enumerate(added[:tail]):
+        patch.insert(bisect_left(kept, orders[count]) + count, element)
+    patch.extend(added[tail:])
+    if len(json.dumps(patch.to_plotly_json())) >= len(json.dumps(new_elements)):
+        return new_elements
+    return patch
 
-    return elements
+
+# --------- Level of detail ---------
+# Only a window of the tree is drawn: VISIBLE_NODES nodes breadth first from
+# the root, as many again from FOCUS_LEVELS levels above the focus (the node
+# of the last step, which is always drawn with the path down to it) and
+# from the focus itself, and from every subtree the user expanded. Children
+# just outside the window, and subtrees the user collapsed, are drawn as one
+# summary node with the size and free variables of the subtree; so are the
+# ancestors between the root's window and the focus's. Only the window is
+# built, laid out and sent, so drawing does not depend on the size or the
+# depth of the whole term, and neither does the text form, which is cut at
+# TEXT_LIMIT characters.
+VISIBLE_NODES = 1000
+FOCUS_LEVELS = 10
+TEXT_LIMIT = 10000
+
+
+def summary(etree, nodeid, key):
+    return {"nodeid": nodeid, "key": key, "type": "summary",
+            "size": etree.size, "fv": sorted(etree.fv), "children": []}
+
+
+def visible_tree(etree, keys, focus=None, expanded=(), collapsed=()):
+    # the window of etree as keyed tree2dict dicts. Only the nodes in the
+    # window and the children just outside it are looked at: preorder
+    # indexes, and so keys, follow from the cached subtree sizes, and a node
+    # is an ancestor of the nodes whose indexes its subtree spans.
+    expanded = set(expanded)
+    collapsed = set(collapsed)
+    runs = keys[0]
+    starts = run_starts(runs)
+    focus_index = anchor_index = -1
+    if type(focus) is str and NODE_ID.fullmatch(focus) and subtree_at(etree, focus[1:]) is not None:
+        anchor = focus[:max(len(focus) - FOCUS_LEVELS, 1)]
+        anchor_t = subtree_at(etree, anchor[1:])
+        focus_index = preorder_index(etree, focus)
+        anchor_index = preorder_index(etree, anchor)
+
+    root, shadowed = node2dict(etree)
+    root["key"] = key_at(runs, starts, 0)
+    budgets = [VISIBLE_NODES - 1]  # nodes left in each window
+    queue = deque([(etree, root, shadowed, 0, 0)])
+    while queue:
+        t, j, shadowed, index, window = queue.popleft()
+        if t.kind in ["name", "num"]:
+            continue
+        children = [(t.left, j["nodeid"] + '0', index + 1)]
+        if t.kind != "lambda":
+            children.append((t.right, j["nodeid"] + '1', index + 1 + t.left.size))
+        for child_t, nodeid, child_index in children:
+            key = key_at(runs, starts, child_index)
+            if key in collapsed:
+                j["children"].append(summary(child_t, nodeid, key))
+                continue
+            child_window = window
+            if key in expanded or child_index in [focus_index, anchor_index]:
+                child_window = len(budgets)
+                budgets.append(VISIBLE_NODES)
+            elif budgets[window] <= 0:
+                if child_index < anchor_index < child_index + child_t.size:
+                    # the rest of the path to the anchor in one summary node,
+                    # with the anchor's window under it
+                    gap = summary(child_t, nodeid, key)
+                    gap["size"] -= anchor_t.size
+                    child, child_shadowed = node2dict(anchor_t, anchor, shadowed_at(etree, anchor[1:]))
+                    child["key"] = key_at(runs, starts, anchor_index)
+                    gap["children"].append(child)
+                    j["children"].append(gap)
+                    budgets.append(VISIBLE_NODES - 1)
+                    queue.append((anchor_t, child, child_shadowed, anchor_index, len(budgets) - 1))
+                    continue
+                if not anchor_index < child_index <= focus_index < child_index + child_t.size:
+                    j["children"].append(summary(child_t, nodeid, key))
+                    continue
+            budgets[child_window] -= 1
+            child, child_shadowed = node2dict(child_t, nodeid, shadowed)
+            child["key"] = key
+            j["children"].append(child)
+            queue.append((child_t, child, child_shadowed, child_index, child_window))
+    return root
+
+
+def window_elements(tree, etree, keys):
+    # cytoscape elements for etree with the level of detail settings in tree
+    window = visible_tree(etree, keys, tree.get("focus"), tree.get("expanded", []), tree.get("collapsed", []))
+    return json_to_cytoscape_elements(window)
+
+
+def live_keys(keys, runs):
+    # those of keys, which may come from the browser, that a node of the
+    # tree with the given key runs still has
+    runs = sorted(runs)
+    firsts = [first for first, count in runs]
+    live = []
+    for key in keys if type(keys) is list else []:
+        if type(key) is str and KEY.fullmatch(key):
+            run = bisect_right(firsts, int(key)) - 1
+            if run >= 0 and int(key) < runs[run][0] + runs[run][1]:
+                live.append(key)
+    return live
+
+
+def carry_window(tree, new_tree, keys, focus=None):
+    # level of detail settings of tree for the store value that replaces it,
+    # without the subtrees that are gone
+    for name in ["expanded", "collapsed"]:
+        if name in tree:
+            new_tree[name] = live_keys(tree[name], keys[0])
+    if focus is not None:
+        new_tree["focus"] = focus
+    return new_tree
+
+
+# --------- Session state ---------
+# By default the tree store holds the current tree and prevtrees the
+# history, with the trees in the compact encode_tree form: ints in preorder
+# and a table of names, rather than tree2dict dicts whose node ids grow with
+# depth. The element keys go with it as runs of consecutive keys, and the
+# drawn window is built from the decoded tree. --compress-stores also zlib
+# compresses the trees. With --sessions both are kept server side in SESSIONS as engine
+# trees and the stores only carry the session id, so a click does not ship
+# the tree back and forth.
+COMPRESS_STORES = False
+SESSIONS = None
+NODE_BYTES = 300  # memory of one engine tree node, table entry included
+
+
+def session_bytes(session):
+    # an upper bound: subtrees shared between the trees are counted each time
+    trees = [session['tree']] + [t for i, t in session['history']['checkpoints']]
+    return NODE_BYTES * sum(t.size for t in trees) + 16 * len(session['keys'])
+
+
+def pack_tree(etree):
+    return encode_tree(etree, COMPRESS_STORES)
+
+
+def unpack_tree(data):
+    # store values come from the browser: decode_tree refuses, with a
+    # ValueError, data it would not have made, and data over MAX_SIZE nodes
+    return decode_tree(data, MAX_SIZE, COMPRESS_STORES)
+
+
+def check_runs(runs, next_key, size):
+    # keys that come from the browser must be distinct non-negative ints
+    # for the size nodes, all below next_key
+    if type(runs) is not list or type(next_key) is not int:
+        raise ValueError('keys do not fit the tree')
+    end = 0
+    for first, count in sorted(runs):
+        if type(first) is not int or type(count) is not int or first < end or count < 1:
+            raise ValueError('keys do not fit the tree')
+        end = first + count
+    if sum(count for first, count in runs) != size or next_key < end:
+        raise ValueError('keys do not fit the tree')
+    return runs, next_key
+
+
+def tree_value(etree, keys):
+    return {"status": "OK", "tree": pack_tree(etree), "keys": keys[0], "nextkey": keys[1]}
+
+
+def start_state(etree):
+    # store values for a newly submitted tree
+    if SESSIONS is None:
+        return tree_value(etree, fresh_keys(etree)), new_history(pack_tree(etree))
+    return store_session(new_session_id(), etree, new_history(etree), fresh_keys(etree))
+
+
+PARSE_ERROR = 'Parse Error!'
+SIZE_ERROR = 'The term has {} nodes, more than the {} allowed'
+EXPIRED = 'Session expired, please submit the expression again'
+BAD_STORE = 'The tree in the page could not be read ({}), please submit the expression again'
+
+
+def load_state(tree, prevtrees):
+    # (engine tree, (key runs, next key), history) behind the stores; all
+    # None for an expired session. A store value that is not valid, or
+    # holds a tree of more than MAX_SIZE nodes, is a ValueError.
+    if 'session' not in tree:
+        try:
+            etree = unpack_tree(tree['tree'])
+            history = check_history(prevtrees) if prevtrees is not None else None
+            return etree, check_runs(tree['keys'], tree['nextkey'], etree.size), history
+        except (TypeError, KeyError) as inst:
+            raise ValueError(f'malformed store: {inst!r}')
+    session = SESSIONS.get(tree['session']) if SESSIONS is not None else None
+    if session is None:
+        return None, None, None
+    return session['tree'], (session['keys'], session['nextkey']), session['history']
+
+
+def save_state(tree, etree, keys, history, entry):
+    # store values after entry produced etree
+    if 'session' not in tree:
+        return tree_value(etree, keys), record(history, entry, etree, pack_tree)
+    return store_session(tree['session'], etree, record(history, entry, etree), keys)
+
+
+def store_session(sid, etree, history, keys):
+    SESSIONS.put(sid, {"tree": etree, "history": history, "keys": keys[0], "nextkey": keys[1]})
+    steps = len(history['log'])
+    return {"status": "OK", "session": sid, "steps": steps}, {"session": sid, "steps": steps}
+
+
+def history_length(prevtrees):
+    if 'session' in prevtrees:
+        return prevtrees['steps']
+    return len(prevtrees['log'])
+
+
+# --------- Metrics ---------
+# With --metrics, callbacks wrapped in instrumented() record their latency
+# and the JSON size of the stores they write, served with the engine
+# counters at /metrics. --profile DIR writes a cProfile dump of every
+# callback request to DIR.
+METRICS = None
+PROFILE_DIR = None
+profiling = threading.Lock()  # one profiler can be active at a time
+
+
+def instrumented(name, stores=None):
+    # stores maps a store name to its position in the callback's outputs
+    def wrap(func):
+        @wraps(func)
+        def timed(*args):
+            if METRICS is None:
+                return func(*args)
+            start = time.perf_counter()
+            outputs = func(*args)
+            METRICS.callback_time(name, time.perf_counter() - start)
+            for store, index in (stores or {}).items():
+                value = outputs[index]
+                if value is not None and value is not no_update and not isinstance(value, Patch):
+                    METRICS.store_size(store, len(json.dumps(value, separators=(',', ':'))))
+            return outputs
+        return timed
+    return wrap
+
+
+def start_profile():
+    if request.path.endswith('_dash-update-component') and profiling.acquire(blocking=False):
+        g.profile = cProfile.Profile()
+        g.profile.enable()
+
+
+def stop_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        profiling.release()
+        output = (request.get_json(silent=True) or {}).get('output', 'callback')
+        name = re.sub(r'[^\w.-]+', '_', output).strip('_.')[:80]
+        profile.dump_stats(os.path.join(PROFILE_DIR, f'{time.time_ns()}-{name}.prof'))
+    return response
 
 
 def get_md_file_content(filename):
@@ -94,6 +708,60 @@ def get_md_file_content(filename):
         return file.read()
 
 
+# --------- Normal form cache ---------
+# With --normal-forms, Reduce to normal form goes through a NormalForms
+# cache, filled with the queries.md examples when a server process gets its
+# first request. That is after gunicorn has forked it: a process forked while
+# the warm-up held one of the engine's locks would never get the lock.
+NORMAL_FORMS = None
+warmed = None  # the process whose warm-up has started
+warming = threading.Lock()
+
+
+def warm_up():
+    examples = re.findall(r'```\n(.*?)\n```', get_md_file_content('queries.md'), flags=re.DOTALL)
+    NORMAL_FORMS.warm_up(examples, [*STRATEGIES, 'call-by-need', 'nbe'])
+
+
+def start_warm_up():
+    global warmed
+    with warming:
+        if warmed == os.getpid():
+            return
+        warmed = os.getpid()
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
+# --------- Sandbox ---------
+# With --sandbox N, steps and normalizations run in a pool of N worker
+# processes, which are killed and replaced when a job runs past
+# --sandbox-timeout or --sandbox-max-mb. Steps and normalizations that give
+# a term of more than MAX_SIZE nodes are stopped in any case.
+SANDBOX = None
+MAX_STEPS = 10000
+MAX_SIZE = 100000
+MAX_TIME = 5.0  # seconds, below the sandbox timeout so a slow run stops with its partial result
+
+
+def normal_form(etree, strategy):
+    # the normalize result for etree, through the normal form cache and the
+    # sandbox when they are on, or a BudgetExceeded result
+    start = time.perf_counter()
+    try:
+        if NORMAL_FORMS is not None:
+            (tree, steps, halted, hits) = NORMAL_FORMS.reduce(etree, strategy, MAX_STEPS, MAX_SIZE, MAX_TIME, MAX_GROWTH)
+        else:
+            engine = reduce_with if SANDBOX is None else SANDBOX.reduce
+            (tree, steps, halted) = engine(etree, strategy, MAX_STEPS, MAX_SIZE, MAX_TIME, MAX_GROWTH)
+            hits = 0
+    except BudgetExceeded as inst:
+        return inst.result()
+    except Exception as inst:
+        return {"status": "ERROR", "message": str(inst)}
+    return {"status": "OK", "tree": tree, "strategy": strategy, "steps": steps,
+            "halted": halted, "time": time.perf_counter() - start, "cached": hits}
+
+
 # --------- Layout ---------
 app.layout = html.Div([
     dcc.Location(id='url'),
@@ -110,7 +778,16 @@ app.layout = html.Div([
                 dcc.Input(id='lambdaex', type='text', placeholder='Enter expression...', className="text-input"),
                 html.Button('Submit', id='submit', className="button"),
                 html.Button('Reset', id='reset', className="button"),
-                dcc.ConfirmDialog(id='parseerror', message='Parse Error!'),
+                html.Button('Reduce to normal form', id='normalize', className="button"),
+                html.Button('Evaluate arithmetic', id='fold', className="button"),
+                dcc.Dropdown(
+                    id='strategy',
+                    options=[{'label': name, 'value': name} for name in [*STRATEGIES, 'call-by-need', 'nbe']],
+                    value='normal-order',
+                    clearable=False,
+                    className="strategy-select"
+                ),
+                dcc.ConfirmDialog(id='parseerror', message=PARSE_ERROR),
             ]),
             cyto.Cytoscape(
                 id='cytoscape-graph',
@@ -121,7 +798,8 @@ app.layout = html.Div([
                 userZoomingEnabled=True,
                 userPanningEnabled=True
             ),
-            html.P(id='stringtree', className="string-output")
+            html.P(id='stringtree', className="string-output"),
+            html.P(id='normalize-info', className="string-output")
         ]),
         html.Div(className="divider", id="divider"),
         html.Div(className="right-section", children=[
@@ -239,26 +917,40 @@ def insert_query_block(clicks, children):
     Output('prevtrees', 'data', allow_duplicate=True),
     Output('submit', 'disabled'),
     Output("parseerror", "displayed"),
+    Output("parseerror", "message"),
     Input('submit', 'n_clicks'), 
     State('lambdaex', 'value'),
     prevent_initial_call=True
 )
+@instrumented('submit_initial_expression', stores={'tree': 0, 'prevtrees': 1})
 def submit_initial_expression(n_clicks, value):
-    tree = get_initial_tree(value)
-    if tree["status"] == "OK":
-        return tree, [tree], True, False
-    else:
-        print("ERROR parsing lambda expression", tree["message"])
-        return None, None, False, True
+    return submit(value)
+
+
+def submit(expression):
+    # store values, submit disabled, and whether to show an error and which
+    # one for expression. The engine tree goes straight into the stores; no
+    # tree2dict form of the whole term is made. A term over MAX_SIZE nodes
+    # is refused here, as every later callback would refuse it.
+    try:
+        etree = parse(expression)
+    except Exception as inst:
+        print("ERROR parsing lambda expression", inst.args[0] if inst.args else inst)
+        return None, None, False, True, PARSE_ERROR
+    if etree.size > MAX_SIZE:
+        return None, None, False, True, SIZE_ERROR.format(etree.size, MAX_SIZE)
+    return *start_state(etree), True, False, no_update
     
 @callback(
     Output('tree', 'data', allow_duplicate=True),
     Output('prevtrees', 'data', allow_duplicate=True),
     Output('submit', 'disabled', allow_duplicate=True),
     Output("parseerror", "displayed", allow_duplicate=True),
+    Output("parseerror", "message", allow_duplicate=True),
     Input('url', 'href'), 
     prevent_initial_call=True
 )
+@instrumented('submit_initial_expression_url', stores={'tree': 0, 'prevtrees': 1})
 def submit_initial_expression_url(href):
     if href:
         parsed_url = urlparse(href)
@@ -267,14 +959,9 @@ def submit_initial_expression_url(href):
         if 'expression' in query_params:
             expression = query_params['expression'][0]
             expression = str(expression).replace('%20', ' ')
-            tree = get_initial_tree(expression)
-            if tree["status"] == "OK":
-                return tree, [tree], True, False
-            else:
-                print("ERROR parsing lambda expression", tree["message"])
-                return None, None, False, True
+            return submit(expression)
     
-    return None, None, False, False
+    return None, None, False, False, no_update
 
 # ======== VISUALIZATION CALLBACKS ========
 @callback(
@@ -283,126 +970,240 @@ def submit_initial_expression_url(href):
     Input('tree', 'data'),
     prevent_initial_call=True
 )
+@instrumented('retrieve_data_from_store')
 def retrieve_data_from_store(tree):
     if tree is None:
         return [], ""
-        
-    root_data = tree['expr_tree_json']
-    elements = json_to_cytoscape_elements(root_data)
-    
+    if tree.get('patched'):
+        # select_node already sent the changed elements
+        return no_update, no_update
+
+    try:
+        etree, keys, history = load_state(tree, None)
+    except ValueError as inst:
+        return [], BAD_STORE.format(inst)
+    if etree is None:
+        return [], EXPIRED
+    elements = window_elements(tree, etree, keys)
+
     # create text representation
-    stringtree = ''
-    if type(tree) == dict:
-        stringtree = json2tree(tree['expr_tree_json'])
-        stringtree = to_string(stringtree)
-    
+    stringtree = to_string(etree, TEXT_LIMIT)
+
     return elements, stringtree
 
 def build_cytoscape_elements(node_data, parent_id=None, elements=None):
     if elements is None:
         elements = []
-    
-    node_id = node_data['nodeid']
-    node_type = node_data['type']
-    beta_status = node_data.get('beta')
-    
-    if node_type == 'lambda':
-        label = f"{node_data['var']}"
-        node_class = 'lambda-node'
-    elif node_type == 'apply':
-        label = ""
-        node_class = 'apply-node'
-        if beta_status == 'YES':
-            node_class += ' apply-yes'
-        elif beta_status == 'NO':
-            node_class += ' apply-no'
-    elif node_type == 'name':
-        label = f"{node_data['value']}"
-        node_class = 'name-node'
-    elif node_type == 'num':
-        label = f"{node_data['value']}"
-        node_class = 'num-node'
-    elif node_type == 'op':
-        label = f"{node_data['value']}"
-        node_class = 'op-node'
-    else:
-        label = node_type
-        node_class = 'default-node'
-    
-    node = {
-        'data': {
-            'id': node_id,
-            'label': label,
-            'type': node_type,
-            'beta': beta_status,
-            'var': node_data.get('var'),
-            'value': node_data.get('value'),
-            'class': node_class
-        },
-        'classes': node_class
-    }
-    
-    elements.append(node)
-    
-    if parent_id:
-        elements.append({
+
+    stack = [(node_data, parent_id)]
+    while stack:
+        node_data, parent_id = stack.pop()
+        node_id = node_data['nodeid']
+        node_type = node_data['type']
+        beta_status = node_data.get('beta')
+
+        if node_type == 'lambda':
+            label = f"{node_data['var']}"
+            node_class = 'lambda-node'
+        elif node_type == 'apply':
+            label = ""
+            node_class = 'apply-node'
+            if beta_status == 'YES':
+                node_class += ' apply-yes'
+            elif beta_status == 'NO':
+                node_class += ' apply-no'
+        elif node_type == 'name':
+            label = f"{node_data['value']}"
+            node_class = 'name-node'
+        elif node_type == 'num':
+            label = f"{node_data['value']}"
+            node_class = 'num-node'
+        elif node_type == 'op':
+            label = f"{node_data['value']}"
+            node_class = 'op-node'
+        else:
+            label = node_type
+            node_class = 'default-node'
+
+        node = {
             'data': {
-                'source': parent_id,
-                'target': node_id,
-                'id': f'edge_{parent_id}_{node_id}'
-            }
-        })
-    
-    children = node_data.get('children', [])
-    for child in children:
-        build_cytoscape_elements(child, node_id, elements)
-    
+                'id': node_id,
+                'label': label,
+                'type': node_type,
+                'beta': beta_status,
+                'var': node_data.get('var'),
+                'value': node_data.get('value'),
+                'class': node_class
+            },
+            'classes': node_class
+        }
+
+        elements.append(node)
+
+        if parent_id:
+            elements.append({
+                'data': {
+                    'source': parent_id,
+                    'target': node_id,
+                    'id': f'edge_{parent_id}_{node_id}'
+                }
+            })
+
+        children = node_data.get('children', [])
+        for child in reversed(children):
+            stack.append((child, node_id))
+
     return elements
 
 # ======== INTERACTION CALLBACKS ========
 @callback(
     Output('tree', 'data', allow_duplicate=True),
     Output('prevtrees', 'data', allow_duplicate=True),
+    Output('cytoscape-graph', 'elements', allow_duplicate=True),
+    Output('stringtree', 'children', allow_duplicate=True),
+    Output('normalize-info', 'children', allow_duplicate=True),
     Input('cytoscape-graph', 'tapNodeData'), 
     State('tree', 'data'),
     State('prevtrees', 'data'),
     prevent_initial_call=True
 )
+@instrumented('select_node', stores={'tree': 0, 'prevtrees': 1})
 def select_node(node_data, tree, prevtrees):
     if tree is None or node_data is None:
-        return no_update, no_update
+        return no_update, no_update, no_update, no_update, no_update
         
-    selected_node_id = node_data['id']
+    selected_node_id = node_data['nodeid']
     selected_node_type = node_data['type']
     selected_node_beta = node_data.get('beta')
     
+    # a summary node is expanded; a node that takes no step, a lambda or an
+    # application that is not a redex, folds its subtree into a summary node
+    if selected_node_type == 'summary' or selected_node_type == 'lambda' or selected_node_beta == "NO":
+        return change_window(node_data, tree, prevtrees)
+
     # perform beta reduction on eligible nodes
     if selected_node_type == 'apply' and selected_node_beta == "YES":
-        tree = get_next_tree(tree['expr_tree_json'], selected_node_id)
-        tree = tree2dict(tree)
-        tree = {"status": "OK", "expr_tree_json": tree}
-        
-        if prevtrees == [] or prevtrees is None:
-            prevtrees = [tree]
-        else:
-            prevtrees.append(tree)
-            
-        return tree, prevtrees
-    
+        entry = {"action": "beta", "nodeid": selected_node_id}
+
     # evaluate arithmetic expressions
     elif selected_node_type == 'op':
-        tree = get_next_tree_after_math(tree['expr_tree_json'], selected_node_id)
-        tree = tree2dict(tree)
-        tree = {"status": "OK", "expr_tree_json": tree}
-        
-        if prevtrees == [] or prevtrees is None:
-            prevtrees = [tree]
-        else:
-            prevtrees.append(tree)
-            
-        return tree, prevtrees
-        
-    return no_update, no_update
+        entry = {"action": "math", "nodeid": selected_node_id}
+
+    else:
+        return no_update, no_update, no_update, no_update, no_update
+
+    return take_step(tree, prevtrees, entry, selected_node_id)
+
+
+def take_step(tree, prevtrees, entry, nodeid):
+    # store values, elements patch, text and info after entry, which changes
+    # the subtree at nodeid
+    try:
+        etree, keys, history = load_state(tree, prevtrees)
+    except ValueError as inst:
+        return no_update, no_update, no_update, no_update, BAD_STORE.format(inst)
+    if etree is None:
+        return no_update, no_update, no_update, no_update, EXPIRED
+    try:
+        new_etree = apply_action(etree, entry, call if SANDBOX is None else SANDBOX.run)
+        if new_etree.size > MAX_SIZE:
+            raise BudgetExceeded('size', MAX_SIZE)
+    except BudgetExceeded as inst:
+        return no_update, no_update, no_update, no_update, inst.result()["message"]
+    info = ""
+    if entry['action'] == 'fold':
+        # trees are hash consed, so a fold that finds nothing gives etree back;
+        # every operation on two numbers turns three nodes into one
+        if new_etree is etree:
+            return no_update, no_update, no_update, no_update, "No arithmetic to evaluate"
+        info = f"Evaluated {(etree.size - new_etree.size) // 2} operations"
+    # only the subtree at nodeid changed, so only its keys are carried over
+    new_keys = carry_keys(etree, new_etree, keys, nodeid)
+    new_tree, prevtrees = save_state(tree, new_etree, new_keys, history, entry)
+    new_tree = carry_window(tree, new_tree, new_keys, focus=nodeid)
+
+    # only the elements that changed go to the browser
+    patch = elements_patch(window_elements(tree, etree, keys), window_elements(new_tree, new_etree, new_keys))
+    new_tree['patched'] = True
+    return new_tree, prevtrees, patch, to_string(new_etree, TEXT_LIMIT), info
+
+
+def change_window(node_data, tree, prevtrees):
+    try:
+        etree, keys, history = load_state(tree, prevtrees)
+    except ValueError as inst:
+        return no_update, no_update, no_update, no_update, BAD_STORE.format(inst)
+    if etree is None:
+        return no_update, no_update, no_update, no_update, EXPIRED
+    key = node_data['id']
+    expanded = [k for k in live_keys(tree.get('expanded', []), keys[0]) if k != key]
+    collapsed = [k for k in live_keys(tree.get('collapsed', []), keys[0]) if k != key]
+    if node_data['type'] == 'summary':
+        expanded.append(key)
+    else:
+        collapsed.append(key)
+    new_tree = dict(tree, expanded=expanded, collapsed=collapsed, patched=True)
+    patch = elements_patch(window_elements(tree, etree, keys), window_elements(new_tree, etree, keys))
+    return new_tree, no_update, patch, no_update, no_update
+
+@callback(
+    Output('tree', 'data', allow_duplicate=True),
+    Output('prevtrees', 'data', allow_duplicate=True),
+    Output('cytoscape-graph', 'elements', allow_duplicate=True),
+    Output('stringtree', 'children', allow_duplicate=True),
+    Output('normalize-info', 'children', allow_duplicate=True),
+    Input('fold', 'n_clicks'),
+    State('tree', 'data'),
+    State('prevtrees', 'data'),
+    prevent_initial_call=True
+)
+@instrumented('fold_arithmetic', stores={'tree': 0, 'prevtrees': 1})
+def fold_arithmetic(n_clicks, tree, prevtrees):
+    # every arithmetic operation on numbers in one step
+    if tree is None:
+        return no_update, no_update, no_update, no_update, ""
+    return take_step(tree, prevtrees, {"action": "fold"}, 'R')
+
+@callback(
+    Output('tree', 'data', allow_duplicate=True),
+    Output('prevtrees', 'data', allow_duplicate=True),
+    Output('normalize-info', 'children'),
+    Input('normalize', 'n_clicks'),
+    State('tree', 'data'),
+    State('prevtrees', 'data'),
+    State('strategy', 'value'),
+    prevent_initial_call=True
+)
+@instrumented('normalize_tree', stores={'tree': 0, 'prevtrees': 1})
+def normalize_tree(n_clicks, tree, prevtrees, strategy):
+    if tree is None:
+        return no_update, no_update, ""
+
+    try:
+        etree, keys, history = load_state(tree, prevtrees)
+    except ValueError as inst:
+        return no_update, no_update, BAD_STORE.format(inst)
+    if etree is None:
+        return no_update, no_update, EXPIRED
+
+    result = normal_form(etree, strategy)
+    if result["status"] == "BUDGET":
+        return no_update, no_update, result["message"]
+    elif result["status"] != "OK":
+        return no_update, no_update, f"Error: {result['message']}"
+
+    info = f"{strategy}: {result['steps']} steps in {result['time'] * 1000:.1f} ms"
+    if result["halted"] != "done":
+        info += f" (stopped: {result['halted']})"
+    elif result.get("cached"):
+        info += " (cached)"
+    if result["steps"] == 0:
+        # nothing changed, so there is no state to record
+        return no_update, no_update, info
+    entry = {"action": "normalize", "strategy": strategy}
+    new_keys = carry_keys(etree, result["tree"], keys)
+    new_tree, prevtrees = save_state(tree, result["tree"], new_keys, history, entry)
+    return carry_window(tree, new_tree, new_keys), prevtrees, info
 
 @callback(
     Output('tree', 'data', allow_duplicate=True),
@@ -412,11 +1213,25 @@ def select_node(node_data, tree, prevtrees):
     State('prevtrees', 'data'),
     prevent_initial_call=True
 )
+@instrumented('go_back', stores={'tree': 0, 'prevtrees': 1})
 def go_back(n_clicks, tree, prevtrees):
-    if prevtrees and len(prevtrees) > 1:
-        pt = prevtrees.pop(-1)
-        return prevtrees[-1], prevtrees
-    return no_update, no_update
+    if tree is None or not prevtrees or history_length(prevtrees) <= 1:
+        return no_update, no_update
+    try:
+        etree, keys, history = load_state(tree, prevtrees)
+    except ValueError:
+        return no_update, no_update
+    if etree is None:
+        return no_update, no_update
+    try:
+        history, back = go_back_in(history)
+    except (ValueError, TypeError, KeyError, BudgetExceeded):
+        return no_update, no_update
+    keys = carry_keys(etree, back, keys)
+    if 'session' in tree:
+        new_tree, prevtrees = store_session(tree['session'], back, history, keys)
+        return carry_window(tree, new_tree, keys), prevtrees
+    return carry_window(tree, tree_value(back, keys), keys), history
 
 @callback(
     Output('back', 'disabled'),
@@ -425,7 +1240,7 @@ def go_back(n_clicks, tree, prevtrees):
 )
 def set_back_button_disabled_state(prevtrees):
     if prevtrees != None:
-        return len(prevtrees) == 1
+        return history_length(prevtrees) == 1
     else:
         return True
     
@@ -435,20 +1250,174 @@ def set_back_button_disabled_state(prevtrees):
     Output('back', 'disabled', allow_duplicate=True),
     Output('lambdaex', 'value', allow_duplicate=True),
     Output('submit', 'disabled', allow_duplicate=True),
+    Output('normalize-info', 'children', allow_duplicate=True),
     Input('reset', 'n_clicks'),  
     prevent_initial_call=True
 )
 def reset(n_clicks):
-    return [], None, True, '', False
+    return None, None, True, '', False, ''
+
+# ======== STATS ========
+@app.server.route('/stats/parse-cache')
+def parse_cache_stats():
+    # hits and misses of the cache in front of parse
+    return parse_cache_info()
+
+@app.server.route('/stats/normal-forms')
+def normal_form_stats():
+    if NORMAL_FORMS is None:
+        return 'the normal form cache is off, start the app with --normal-forms\n', 404
+    return NORMAL_FORMS.info()
+
+@app.server.route('/stats/sandbox')
+def sandbox_stats():
+    if SANDBOX is None:
+        return 'the sandbox is off, start the app with --sandbox N\n', 404
+    return SANDBOX.info()
+
+@app.server.route('/metrics')
+def metrics():
+    if METRICS is None:
+        return 'metrics are off, start the app with --metrics\n', 404
+    return METRICS.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 # ======== MAIN ========
-if __name__ == '__main__':
+# The Flask server is the WSGI application, e.g. for gunicorn 'app:server'.
+# A WSGI server imports this module without running main, so options for it
+# go in the LAMBDA_ENGINE_OPTIONS environment variable, written as on the
+# command line.
+server = app.server
+
+
+def options(argv=None):
     parser = ArgumentParser(
         prog='Lambda Engine',
         description='Process Lambda calculus and provides a graphical view of the steps of the process'
     )
     parser.add_argument('--hostname', default='localhost')
     parser.add_argument('--port', default='8081')
-    args = parser.parse_args()
+    parser.add_argument('--workers', type=int, default=1,
+                        help='server processes; more than one needs gunicorn')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='request threads per process; more than one needs gunicorn')
+    parser.add_argument('--engine', choices=['named', 'nameless'], default='named')
+    parser.add_argument('--history-cap', type=int, default=HISTORY_CAP,
+                        help='number of steps Back can undo')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help='steps between full trees kept in the history')
+    parser.add_argument('--parse-cache', type=int, default=PARSE_CACHE_SIZE,
+                        help='number of parsed expressions kept for repeated submits')
+    parser.add_argument('--normal-forms', metavar='FILE',
+                        help='keep normal forms in this SQLite file, :memory: for none, and reuse them')
+    parser.add_argument('--normal-forms-memory', type=int, default=1024,
+                        help='normal forms also kept in memory')
+    parser.add_argument('--max-steps', type=int, default=MAX_STEPS,
+                        help='steps Normalize takes before it stops')
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE,
+                        help='nodes a term may have after a step or Normalize')
+    parser.add_argument('--max-time', type=float, default=MAX_TIME,
+                        help='seconds Normalize runs before it stops')
+    parser.add_argument('--max-growth', type=float, default=MAX_GROWTH,
+                        help='nodes per step a term may keep growing by before Normalize stops it, inf for no limit')
+    parser.add_argument('--prelude', nargs='?', const=PRELUDE_FILE, metavar='FILE',
+                        help='let expressions use the definitions of FILE (default prelude.lambda)')
+    parser.add_argument('--sandbox', type=int, default=0, metavar='N',
+                        help='run steps and normalizations in N worker processes')
+    parser.add_argument('--sandbox-timeout', type=float, default=10.0,
+                        help='seconds a sandboxed job may run before its worker is killed')
+    parser.add_argument('--sandbox-max-mb', type=int, default=512,
+                        help='resident memory a sandbox worker may use before it is killed')
+    parser.add_argument('--visible-nodes', type=int, default=VISIBLE_NODES,
+                        help='nodes drawn before subtrees are collapsed into summary nodes')
+    parser.add_argument('--compress-stores', action='store_true',
+                        help='zlib compress the trees in the browser stores')
+    parser.add_argument('--sessions', choices=['memory', 'disk'],
+                        help='keep trees and history on the server instead of in the browser')
+    parser.add_argument('--session-dir', default='sessions',
+                        help='directory of the disk session store')
+    parser.add_argument('--session-ttl', type=int, default=3600,
+                        help='seconds an unused session is kept')
+    parser.add_argument('--session-max-mb', type=int, default=256,
+                        help='memory (or disk) ceiling of the session store')
+    parser.add_argument('--metrics', action='store_true',
+                        help='time callbacks and serve them with the engine counters at /metrics')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='write a cProfile dump of every callback request to DIR')
+    args = parser.parse_args(argv)
+    if args.workers > 1 and args.sessions == 'memory':
+        parser.error('--sessions memory is per process, use --sessions disk with --workers')
+    return args
+
 
-    app.run(debug=False, host=args.hostname, port=args.port)
\ No newline at end of file
+def configure(args):
+    global HISTORY_CAP, CHECKPOINT_EVERY, VISIBLE_NODES, MAX_STEPS, MAX_SIZE, MAX_TIME, MAX_GROWTH
+    global COMPRESS_STORES, SESSIONS, METRICS, PROFILE_DIR, SANDBOX, NORMAL_FORMS
+    global specific_beta_reduction
+    HISTORY_CAP = args.history_cap
+    CHECKPOINT_EVERY = min(args.checkpoint_every, args.history_cap)
+    VISIBLE_NODES = max(args.visible_nodes, 1)
+    MAX_STEPS = args.max_steps
+    MAX_SIZE = args.max_size
+    MAX_TIME = args.max_time
+    MAX_GROWTH = args.max_growth
+    set_parse_cache_size(args.parse_cache)
+    COMPRESS_STORES = args.compress_stores
+    if args.prelude:
+        load_prelude(args.prelude)
+
+    if args.sessions == 'memory':
+        SESSIONS = MemoryStore(session_bytes, ttl=args.session_ttl, max_bytes=args.session_max_mb * 2**20)
+    elif args.sessions == 'disk':
+        SESSIONS = DiskStore(args.session_dir, ttl=args.session_ttl, max_bytes=args.session_max_mb * 2**20)
+
+    if args.sandbox:
+        SANDBOX = Sandbox(args.sandbox, max_time=args.sandbox_timeout, max_mb=args.sandbox_max_mb)
+    if args.normal_forms:
+        NORMAL_FORMS = NormalForms(args.normal_forms, size=args.normal_forms_memory,
+                                   engine=reduce_with if SANDBOX is None else SANDBOX.reduce)
+        server.before_request(start_warm_up)
+
+    if args.metrics:
+        METRICS = Registry()
+    if args.profile:
+        PROFILE_DIR = args.profile
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        server.before_request(start_profile)
+        server.after_request(stop_profile)
+
+    if args.engine == 'nameless':
+        from LambdaNameless import specific_beta_reduction
+
+
+def serve(args):
+    if args.workers == 1 and args.threads == 1:
+        if SANDBOX is not None:
+            SANDBOX.start()
+        app.run(debug=False, host=args.hostname, port=args.port)
+        return
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit('--workers and --threads need gunicorn: pip3 install gunicorn')
+
+    class Gunicorn(BaseApplication):
+        # the workers are forked from this process, configured as it is
+        def load_config(self):
+            self.cfg.set('bind', f'{args.hostname}:{args.port}')
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            if SANDBOX is not None:
+                self.cfg.set('post_fork', lambda arbiter, worker: SANDBOX.start())
+
+        def load(self):
+            return server
+
+    Gunicorn().run()
+
+
+if __name__ == '__main__':
+    args = options()
+    configure(args)
+    serve(args)
+elif os.environ.get('LAMBDA_ENGINE_OPTIONS'):
+    configure(options(shlex.split(os.environ['LAMBDA_ENGINE_OPTIONS'])))
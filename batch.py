@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import sys
+import time
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import Lambda
+from normalforms import reduce_with
+
+# Offline normalization of many expressions. Expressions are read from a file
+# or stdin as they are needed, evaluated in chunks on a process pool and
+# written as one JSON line each, in input order. Only a bounded window of
+# chunks is in flight at a time, so memory does not grow with the input.
+
+
+LET = re.compile(r'let\b', re.IGNORECASE)
+
+
+def expressions(stream):
+    # the ';' terminated expressions of stream, each with the 'let' clauses
+    # before it, and with comments dropped; text after the last ';' is passed
+    # on too, so that it is reported as an error
+    lets = []
+    pending = []
+    for line in stream:
+        code, hash_mark, comment = line.partition('#')
+        start = 0
+        end = code.find(';')
+        while end >= 0:
+            pending.append(code[start:end + 1])
+            clause = ''.join(pending).strip()
+            pending = []
+            if LET.match(clause):
+                lets.append(clause)
+            else:
+                yield ' '.join(lets + [clause])
+                lets = []
+            start = end + 1
+            end = code.find(';', start)
+        pending.append(code[start:] if not hash_mark else code[start:] + '\n')
+    rest = ' '.join(lets + [''.join(pending)]).strip()
+    if rest:
+        yield rest
+
+
+def chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate(text, strategy, max_steps, max_size, max_time, max_growth=Lambda.MAX_GROWTH):
+    start = time.perf_counter()
+    try:
+        (tree, steps, halted) = reduce_with(Lambda.parse(text), strategy, max_steps, max_size, max_time, max_growth)
+        return {"status": "OK", "normal_form": Lambda.to_string(tree), "steps": steps, "halted": halted,
+                "seconds": time.perf_counter() - start}
+    except Exception as inst:
+        return {"status": "ERROR", "error": str(inst), "seconds": time.perf_counter() - start}
+
+
+def evaluate_chunk(chunk, strategy, max_steps, max_size, max_time, max_growth):
+    results = []
+    for index, text in chunk:
+        result = evaluate(text, strategy, max_steps, max_size, max_time, max_growth)
+        results.append({"index": index, "expr": text, **result})
+    return results
+
+
+def start_worker(prelude):
+    # the lexer and parser print their errors; keep them out of the JSONL
+    sys.stdout = sys.stderr
+    if prelude is not None:
+        Lambda.load_prelude(prelude)
+
+
+def run(stream, out, strategy='normal-order', max_steps=10000, max_size=100000, max_time=10.0,
+        workers=None, chunk_size=16, max_growth=Lambda.MAX_GROWTH, prelude=None):
+    budgets = (strategy, max_steps, max_size, max_time, max_growth)
+    workers = workers or os.cpu_count() or 1
+    items = chunks(enumerate(expressions(stream)), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers, initializer=start_worker, initargs=(prelude,)) as pool:
+        window = deque()
+        for chunk in items:
+            window.append(pool.submit(evaluate_chunk, chunk, *budgets))
+            if len(window) >= 4 * workers:
+                write(window.popleft().result(), out)
+        while window:
+            write(window.popleft().result(), out)
+
+
+def write(results, out):
+    for result in results:
+        out.write(json.dumps(result) + '\n')
+    out.flush()
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(
+        prog='Lambda Engine batch',
+        description='Normalize the ;-terminated expressions of a file and write one JSON line per expression'
+    )
+    parser.add_argument('input', nargs='?', default='-', help='input file, - for stdin')
+    parser.add_argument('-o', '--output', default='-', help='output file, - for stdout')
+    parser.add_argument('--strategy', choices=[*Lambda.STRATEGIES, 'call-by-need', 'nbe'], default='normal-order')
+    parser.add_argument('--max-steps', type=int, default=10000, help='reduction steps per expression')
+    parser.add_argument('--max-size', type=int, default=100000, help='term size per expression')
+    parser.add_argument('--timeout', type=float, default=10.0,
+                        help='seconds per expression, checked between steps')
+    parser.add_argument('--max-growth', type=float, default=Lambda.MAX_GROWTH,
+                        help='nodes per step a term may keep growing by before it is stopped, inf for no limit')
+    parser.add_argument('--prelude', nargs='?', const=Lambda.PRELUDE_FILE, metavar='FILE',
+                        help='let expressions use the definitions of FILE (default prelude.lambda)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per core)')
+    parser.add_argument('--chunk-size', type=int, default=16, help='expressions sent to a worker at a time')
+    args = parser.parse_args()
+
+    stream = sys.stdin if args.input == '-' else open(args.input)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    with stream, out:
+        run(stream, out, args.strategy, args.max_steps, args.max_size, args.timeout, args.workers, args.chunk_size,
+            args.max_growth, args.prelude)
@@ -0,0 +1,72 @@
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from benchmarks.common import query_examples, church_mult
+
+# batch.py end to end: expressions per second for growing worker counts, and
+# peak memory for growing inputs, which should stay flat.
+
+
+# one run in a fresh process tree, printing seconds and peak RSS in KiB
+PEAK = '''
+import sys
+from benchmarks.batch import run_batch
+seconds, rss = run_batch(sys.argv[1], 1)
+print(seconds, rss)
+'''
+
+
+def write_input(path, count, seed=1):
+    rand = random.Random(seed)
+    examples = [q for q in query_examples() if 'lambda f ((lambda x' not in q.lower()]
+    with open(path, 'w') as file:
+        for _ in range(count):
+            if rand.random() < 0.5:
+                file.write(rand.choice(examples).strip() + '\n')
+            else:
+                file.write(church_mult(rand.randint(1, 6), rand.randint(1, 6)) + '\n')
+
+
+def run_batch(path, workers):
+    before = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'batch.py', path, '-o', os.devnull, '--workers', str(workers)],
+                   check=True, stderr=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    # largest process so far, the batch parent or one of its workers
+    return seconds, max(before, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def main():
+    arg_parser = ArgumentParser(description='batch.py throughput by worker count and memory by input size')
+    arg_parser.add_argument('--count', type=int, default=5000)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'input.txt')
+        write_input(path, args.count)
+        print(f"{'workers':>8}{'expr/s':>10}")
+        workers = 1
+        while workers <= (os.cpu_count() or 1):
+            seconds, rss = run_batch(path, workers)
+            print(f'{workers:>8}{args.count / seconds:>10.0f}')
+            workers *= 2
+
+        print()
+        print(f"{'expressions':>12}{'seconds':>9}{'peak RSS MiB':>14}")
+        for count in [args.count, args.count * 4, args.count * 16]:
+            write_input(path, count)
+            # each size in its own process tree, so the peaks stay apart
+            output = subprocess.run([sys.executable, '-c', PEAK, path], capture_output=True, text=True, check=True)
+            seconds, rss = output.stdout.split()
+            print(f'{count:>12}{float(seconds):>9.2f}{int(rss) / 1024:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import re
+import time
+
+QUERIES_FILE = 'assets/queries.md'
+
+
+def query_examples(filename=QUERIES_FILE):
+    with open(filename, 'r') as file:
+        return re.findall(r'```\n(.*?)\n```', file.read(), flags=re.DOTALL)
+
+
+def church(n):
+    body = 'x'
+    for _ in range(n):
+        body = f'(f {body})'
+    return f'(lambda f (lambda x {body}))'
+
+
+def church_exp(base, exponent):
+    return f'(((lambda m (lambda n (n m))) {church(base)}) {church(exponent)});'
+
+
+def church_factorial(n):
+    # the factorial example of queries.md applied to the Church numeral n
+    fact = query_examples()[4].rstrip().rstrip(';')
+    fact = fact[:fact.rindex(' (LAMBDA F (LAMBDA X (F (F X)))))')]
+    return f'{fact} {church(n)});'
+
+
+def church_mult(a, b):
+    mult = '(lambda m (lambda n (lambda f (m (n f)))))'
+    return f'(({mult} {church(a)}) {church(b)});'
+
+
+def first_redex(node):
+    # leftmost-outermost redex of a tree2dict tree, i.e. the normal-order step
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.get('beta') == 'YES':
+            return node['nodeid']
+        stack.extend(reversed(node['children']))
+    return None
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
@@ -0,0 +1,57 @@
+import os
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import Lambda
+from benchmarks.common import query_examples, church_exp, church_mult, church_factorial
+
+# Normalization throughput with a pool of threads or of processes, the two
+# ways the server can run several requests at once. Threads share one
+# interpreter lock, so only processes can scale with the cores; the thread
+# runs check that concurrent reductions give the same normal forms as
+# serial ones.
+
+
+def workload(count):
+    examples = [q for q in query_examples() if 'lambda f ((lambda x' not in q.lower()]
+    examples += [church_mult(4, 5), church_exp(2, 4), church_exp(3, 2), church_factorial(3)]
+    return [examples[i % len(examples)] for i in range(count)]
+
+
+def normal_form(expr):
+    # parsed anew each time, as a request for a new expression would be
+    tree = Lambda.parse_uncached(Lambda.normalize_text(expr))
+    return Lambda.to_string(Lambda.reduce_tree(tree, 'normal-order', 10000, 10**6)[0])
+
+
+def run(pool, exprs):
+    start = time.perf_counter()
+    results = list(pool.map(normal_form, exprs, chunksize=1 if isinstance(pool, ThreadPoolExecutor) else 8))
+    return time.perf_counter() - start, results
+
+
+def main():
+    arg_parser = ArgumentParser(description='Normalizations per second by thread and process count')
+    arg_parser.add_argument('--count', type=int, default=400)
+    arg_parser.add_argument('--max-workers', type=int, default=2 * (os.cpu_count() or 1))
+    args = arg_parser.parse_args()
+
+    exprs = workload(args.count)
+    serial = [normal_form(expr) for expr in exprs]
+    print(f'{os.cpu_count()} cores')
+    print(f"{'workers':>8}{'threads/s':>11}{'processes/s':>13}  same results")
+    workers = 1
+    while workers <= args.max_workers:
+        with ThreadPoolExecutor(workers) as pool:
+            threads, thread_results = run(pool, exprs)
+        with ProcessPoolExecutor(workers) as pool:
+            pool.submit(normal_form, exprs[0]).result()  # start the workers first
+            processes, process_results = run(pool, exprs)
+        same = thread_results == serial and process_results == serial
+        print(f'{workers:>8}{args.count / threads:>11.0f}{args.count / processes:>13.0f}  {same}')
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
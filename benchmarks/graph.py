@@ -0,0 +1,64 @@
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+
+import Lambda
+import LambdaGraph
+from benchmarks.common import query_examples, church_exp, church_mult
+
+
+def doubling(k):
+    # k nested (lambda x (+ x x)) around one multiplication: a tree rewriter
+    # copies the argument, so it does the arithmetic 2^k times
+    expr = '(* 3 4)'
+    for _ in range(k):
+        expr = f'((lambda x (+ x x)) {expr})'
+    return expr + ';'
+
+
+def workloads():
+    for index, expr in enumerate(query_examples(), 1):
+        yield f'queries.md #{index}', expr
+    yield 'church 2*8', church_mult(2, 8)
+    yield 'church 2^5', church_exp(2, 5)
+    yield 'church 3^3', church_exp(3, 3)
+    yield 'doubling 10', doubling(10)
+
+
+def measure(fn):
+    # (result, seconds, tracemalloc peak in KiB)
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def tree_normalize(expr, max_steps):
+    # Lambda.normalize, counting the tree nodes it builds
+    before = Lambda.allocated
+    result = Lambda.normalize(expr, max_steps=max_steps, max_size=10**7)
+    result['allocated'] = Lambda.allocated - before
+    return result
+
+
+def main():
+    arg_parser = ArgumentParser(description='Tree rewriting vs call-by-need graph reduction')
+    arg_parser.add_argument('--steps', type=int, default=2000)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    print(f"{'workload':<16}{'engine':<7}{'steps':>7}{'allocs':>9}{'peak KiB':>10}{'ms':>10}  halted")
+    for name, expr in workloads():
+        tree, tree_s, tree_peak = measure(lambda: tree_normalize(expr, args.steps))
+        graph, graph_s, graph_peak = measure(lambda: LambdaGraph.normalize(expr, max_steps=args.steps, max_size=10**7))
+        for engine, result, seconds, peak in [('tree', tree, tree_s, tree_peak), ('graph', graph, graph_s, graph_peak)]:
+            print(f"{name if engine == 'tree' else '':<16}{engine:<7}{result['steps']:>7}{result['allocated']:>9}"
+                  f"{peak:>10.0f}{seconds * 1000:>10.2f}  {result['halted']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import random
+import sys
+from argparse import ArgumentParser
+
+from Lambda import as_tree, tree2dict
+from app import tidy_layout
+from benchmarks.common import church, timed
+
+
+# The leaf-count layout app.py used before tidy_layout: every leaf gets
+# base_width and the children of a binary node are spread by half the
+# summed widths of the two subtrees.
+
+def width_layout(root, base_width=120, y_offset=100):
+    widths = {}
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        children = node["children"]
+        if not children:
+            widths[node["nodeid"]] = base_width
+        elif done:
+            widths[node["nodeid"]] = sum(widths[child["nodeid"]] for child in children)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+    positions = {}
+    stack = [(root, 0, 0)]
+    while stack:
+        node, x, y = stack.pop()
+        positions[node["nodeid"]] = (x, y)
+        children = node["children"]
+        if len(children) == 2:
+            offset = max(base_width, (widths[children[0]["nodeid"]] + widths[children[1]["nodeid"]]) // 2)
+            stack.append((children[1], x + offset, y + y_offset))
+            stack.append((children[0], x - offset, y + y_offset))
+        elif children:
+            stack.append((children[0], x, y + y_offset))
+    return positions
+
+
+def balanced(depth):
+    if depth == 0:
+        return 'x'
+    return f'((lambda y {balanced(depth - 1)}) {balanced(depth - 1)})'
+
+
+def left_spine(n):
+    expr = 'f'
+    for k in range(n):
+        expr = f'({expr} x{k % 10})'
+    return expr
+
+
+def random_term(n, rand):
+    # built bottom up so deep terms need no recursion
+    terms = [rand.choice(['x', 'y', '3']) for _ in range(n)]
+    while len(terms) > 1:
+        i = rand.randrange(len(terms) - 1)
+        if rand.random() < 0.3:
+            terms[i] = f'(lambda {rand.choice("xyz")} {terms[i]})'
+        else:
+            terms[i:i + 2] = [f'({terms[i]} {terms[i + 1]})']
+    return terms[0]
+
+
+def extent(points):
+    xs = [x for (x, y) in points]
+    return max(xs) - min(xs)
+
+
+def iter_nodes(jtree):
+    stack = [jtree]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node["children"])
+
+
+def main():
+    arg_parser = ArgumentParser(description='Leaf-count layout vs Reingold-Tilford tidy_layout')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(100000)
+
+    terms = [
+        ('balanced 2^12', balanced(12)),
+        ('balanced 2^14', balanced(14)),
+        ('church 5000', church(5000)),
+        ('left spine 5000', left_spine(5000)),
+        ('random 20000', random_term(20000, random.Random(1))),
+        ('random 50000', random_term(50000, random.Random(2))),
+    ]
+    print(f"{'term':<18}{'nodes':>8}{'width ms':>10}{'tidy ms':>10}{'width px':>12}{'tidy px':>10}")
+    for name, expr in terms:
+        jtree = tree2dict(as_tree(expr + ';'))
+        n = sum(1 for _ in iter_nodes(jtree))
+        old_s, old = timed(width_layout, jtree, repeat=args.repeat)
+        new_s, new = timed(tidy_layout, jtree, repeat=args.repeat)
+        print(f'{name:<18}{n:>8}{old_s * 1000:>10.1f}{new_s * 1000:>10.1f}{extent(old.values()):>12.0f}{extent(new):>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+from benchmarks.common import query_examples, church_exp, first_redex
+
+
+def workloads():
+    return {
+        'factorial': query_examples()[4],
+        'y-combinator': query_examples()[3],
+        'church-2^6': church_exp(2, 6),
+        'church-3^3': church_exp(3, 3),
+        'church-2^8': church_exp(2, 8),
+    }
+
+
+def max_rss_kib():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_child(name, steps):
+    # the whole click-by-click reduction, keeping every engine tree the way
+    # a session keeps its history
+    import Lambda
+    jtree = Lambda.get_initial_tree(workloads()[name])['expr_tree_json']
+    baseline = max_rss_kib()
+    start = time.perf_counter()
+    history = []
+    for _ in range(steps):
+        nodeid = first_redex(jtree)
+        if nodeid is None:
+            break
+        etree = Lambda.get_next_tree(jtree, nodeid)
+        history.append(etree)
+        jtree = Lambda.tree2dict(etree)
+    jtree = None
+    print(json.dumps({
+        'steps': len(history),
+        'seconds': time.perf_counter() - start,
+        'peak_rss_kib': max_rss_kib() - baseline,
+    }))
+
+
+def main():
+    arg_parser = ArgumentParser(description='Peak RSS of a full reduction sequence with history')
+    arg_parser.add_argument('--steps', type=int, default=300)
+    arg_parser.add_argument('--child', help='run one workload in this process')
+    args = arg_parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.steps)
+        return
+
+    print(f"{'workload':<14}{'steps':>7}{'peak RSS MiB':>14}{'seconds':>10}")
+    for name in workloads():
+        # one process per workload so the peaks do not mask each other
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.memory', '--child', name, '--steps', str(args.steps)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{name:<14}{result['steps']:>7}{result['peak_rss_kib'] / 1024:>14.1f}{result['seconds']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
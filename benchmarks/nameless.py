@@ -0,0 +1,102 @@
+import sys
+from argparse import ArgumentParser
+
+import Lambda
+import LambdaNameless
+from Lambda import get_initial_tree, tree2dict
+from benchmarks.common import query_examples, church_exp, church_mult, first_redex, timed
+
+
+def reduce_with(get_next_tree, jtree, max_steps):
+    steps = 0
+    while steps < max_steps:
+        nodeid = first_redex(jtree)
+        if nodeid is None:
+            break
+        jtree = tree2dict(get_next_tree(jtree, nodeid))
+        steps += 1
+    return steps
+
+
+def named_step(tree):
+    if tree.kind in ['name', 'num']:
+        return None
+    elif tree.kind == 'lambda':
+        body = named_step(tree.left)
+        return None if body is None else Lambda.node('lambda', tree.value, body)
+    elif tree.kind == 'apply' and tree.left.kind == 'lambda':
+        return Lambda.substitute(tree.left.left, tree.left.value, tree.right)
+    left = named_step(tree.left)
+    if left is not None:
+        return Lambda.node(tree.kind, tree.value, left, tree.right)
+    right = named_step(tree.right)
+    return None if right is None else Lambda.node(tree.kind, tree.value, tree.left, right)
+
+
+def nameless_step(term):
+    if term[0] in ['name', 'num', 'bound']:
+        return None
+    elif term[0] == 'lambda':
+        body = nameless_step(term[2])
+        return None if body is None else ['lambda', term[1], body]
+    elif term[0] == 'apply' and term[1][0] == 'lambda':
+        return LambdaNameless.beta(term[1], term[2])
+    left = nameless_step(term[1])
+    if left is not None:
+        return [term[0], left, term[2]]
+    right = nameless_step(term[2])
+    return None if right is None else [term[0], term[1], right]
+
+
+def normalize_with(step, tree, max_steps):
+    steps = 0
+    while steps < max_steps:
+        reduced = step(tree)
+        if reduced is None:
+            break
+        tree = reduced
+        steps += 1
+    return steps
+
+
+def workloads():
+    yield 'factorial (queries.md)', query_examples()[4]
+    yield 'church 2*8', church_mult(2, 8)
+    yield 'church 2^4', church_exp(2, 4)
+    yield 'church 3^3', church_exp(3, 3)
+    yield 'church 2^6', church_exp(2, 6)
+    yield 'church 4^3', church_exp(4, 3)
+
+
+def main():
+    parser = ArgumentParser(description='Named vs locally nameless get_next_tree')
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    sys.setrecursionlimit(100000)
+
+    header = f"{'workload':<24}{'steps':>7}{'named s':>11}{'nameless s':>12}{'speedup':>9}"
+
+    # get_next_tree round trips, JSON conversion included, as app.py drives them
+    print('get_next_tree (drop-in, per click)')
+    print(header)
+    for name, expr in workloads():
+        jtree = get_initial_tree(expr)['expr_tree_json']
+        named, steps = timed(reduce_with, Lambda.get_next_tree, jtree, args.steps, repeat=args.repeat)
+        nameless, _ = timed(reduce_with, LambdaNameless.get_next_tree, jtree, args.steps, repeat=args.repeat)
+        print(f'{name:<24}{steps:>7}{named:>11.4f}{nameless:>12.4f}{named / nameless:>8.2f}x')
+
+    # normal-order reduction kept in each engine's own representation
+    print()
+    print('substitution core (normal order, no JSON)')
+    print(header)
+    for name, expr in workloads():
+        etree = Lambda.as_tree(expr)
+        term = LambdaNameless.to_nameless(etree)
+        named, steps = timed(normalize_with, named_step, etree, args.steps * 10, repeat=args.repeat)
+        nameless, _ = timed(normalize_with, nameless_step, term, args.steps * 10, repeat=args.repeat)
+        print(f'{name:<24}{steps:>7}{named:>11.4f}{nameless:>12.4f}{named / nameless:>8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
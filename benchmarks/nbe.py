@@ -0,0 +1,70 @@
+import sys
+import time
+from argparse import ArgumentParser
+
+import Lambda
+import LambdaGraph
+import LambdaNbE
+from LambdaNameless import to_nameless
+from benchmarks.common import query_examples, church, church_exp, church_mult, church_factorial
+
+# Full normalization by tree rewriting, call-by-need graph reduction and
+# normalization by evaluation, on Church numeral workloads. The last column
+# checks that the normal forms agree up to the names of bound variables.
+
+
+def workloads():
+    for index, expr in enumerate(query_examples(), 1):
+        yield f'queries.md #{index}', expr
+    yield 'church 1000', church(1000) + ';'
+    yield 'church 8*8', church_mult(8, 8)
+    yield 'church 30*30', church_mult(30, 30)
+    yield 'church 2^8', church_exp(2, 8)
+    yield 'church 3^5', church_exp(3, 5)
+    yield 'factorial 4', church_factorial(4)
+    yield 'factorial 5', church_factorial(5)
+
+
+def shape(tree):
+    # tree's nameless form without the variable names kept as hints
+    def strip(term):
+        if term[0] == 'lambda':
+            return ['lambda', strip(term[2])]
+        return [strip(t) if type(t) is list else t for t in term]
+    return strip(to_nameless(tree))
+
+
+def run(engine, tree, max_steps):
+    start = time.perf_counter()
+    if engine == 'tree':
+        result = Lambda.reduce_tree(tree, 'normal-order', max_steps, 10**7)
+    elif engine == 'graph':
+        result = LambdaGraph.reduce_tree(tree, max_steps, 10**7)
+    else:
+        result = LambdaNbE.reduce_tree(tree, max_steps, 10**7)
+    return result, time.perf_counter() - start
+
+
+def main():
+    arg_parser = ArgumentParser(description='Tree rewriting vs graph reduction vs normalization by evaluation')
+    arg_parser.add_argument('--steps', type=int, default=2000)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    print(f"{'workload':<16}{'engine':<7}{'steps':>7}{'ms':>10}{'speedup':>9}  halted  agrees")
+    for name, expr in workloads():
+        tree = Lambda.as_tree(expr)
+        base = None
+        for engine in ['tree', 'graph', 'nbe']:
+            (normal, steps, halted), seconds = run(engine, tree, args.steps)
+            if base is None:
+                base = (normal, halted, seconds)
+            agrees = ''
+            if halted == 'done' and base[1] == 'done':
+                agrees = 'yes' if shape(normal) == shape(base[0]) else 'NO'
+            print(f"{name if engine == 'tree' else '':<16}{engine:<7}{steps:>7}{seconds * 1000:>10.2f}"
+                  f"{base[2] / seconds:>9.1f}  {halted:<7} {agrees}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import threading
+import time
+from argparse import ArgumentParser
+
+import Lambda
+from benchmarks.common import query_examples
+from normalforms import reduce_with
+from sandbox import Sandbox, BudgetExceeded
+
+# Latency of small normalizations while another request reduces a term that
+# grows without bound, with the reductions in the request threads and in
+# the sandbox. In the request threads the bomb holds the interpreter lock
+# most of the time; in the sandbox it only costs its own worker.
+
+BOMB = '((lambda x ((x x) x)) (lambda x ((x x) x)));'
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def measure(engine, trees, bombs, seconds):
+    stop = threading.Event()
+
+    def bomb():
+        while not stop.is_set():
+            try:
+                engine(Lambda.as_tree(BOMB), 'normal-order', 10**9, 10**9, seconds, None)
+            except BudgetExceeded:
+                pass
+
+    threads = [threading.Thread(target=bomb) for _ in range(bombs)]
+    for thread in threads:
+        thread.start()
+    try:
+        time.sleep(0.1)
+        latencies = []
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            for tree in trees:
+                start = time.perf_counter()
+                engine(tree, 'normal-order', 10000, 100000, None, None)
+                latencies.append(time.perf_counter() - start)
+    finally:
+        # the bombs stop at their next limit, also when a request failed
+        stop.set()
+        for thread in threads:
+            thread.join()
+    return latencies
+
+
+def main():
+    arg_parser = ArgumentParser(description='Latency of small normalizations next to a divergent one')
+    arg_parser.add_argument('--seconds', type=float, default=3.0)
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--bombs', type=int, nargs='+', default=[0, 1, 3])
+    args = arg_parser.parse_args()
+
+    trees = [Lambda.as_tree(q) for q in query_examples()[:3]]
+    sandbox = Sandbox(args.workers, max_time=args.seconds / 2)
+    sandbox.start()
+    print(f"{'engine':<16}{'bombs':>6}{'requests':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, engine in [('request thread', reduce_with), ('sandbox', sandbox.reduce)]:
+        for bombs in args.bombs:
+            latencies = measure(engine, trees, bombs, args.seconds)
+            print(f'{name:<16}{bombs:>6}{len(latencies):>10}'
+                  f'{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.99) * 1000:>9.2f}')
+    print(sandbox.info())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+# Each measurement runs in a fresh interpreter, the way a new worker starts.
+# Bytecode caching is left on, as it is for a deployed server.
+
+IMPORT = '''
+import json, time
+start = time.perf_counter()
+import Lambda
+print(json.dumps(time.perf_counter() - start))
+'''
+
+# Lexer and parser setup on its own, done the way the modules did it before
+# the tables were prebuilt (reflect over the rules, then build the tables or
+# check them against the grammar, writing parsetab.py and parser.out) and
+# the way they do it now.
+SETUP = '''
+import json, sys, time
+import ply.lex as lex
+import ply.yacc as yacc
+import LambdaLexer, LambdaParser
+sys.path.insert(0, {outdir!r})
+start = time.perf_counter()
+if {prebuilt!r}:
+    lex.lex(module=LambdaLexer, optimize=True, lextab=LambdaLexer.TABLES)
+    yacc.yacc(module=LambdaParser, optimize=True, debug=False, write_tables=False, tabmodule=LambdaParser.TABLES)
+else:
+    lex.lex(module=LambdaLexer)
+    yacc.yacc(module=LambdaParser, tabmodule='parsetab', outputdir={outdir!r})
+print(json.dumps(time.perf_counter() - start))
+'''
+
+
+def run(code, env):
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    arg_parser = ArgumentParser(description='Parser setup and import time of Lambda, generated vs prebuilt tables')
+    arg_parser.add_argument('--repeat', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPATH'] = os.getcwd()
+    run(IMPORT, env)  # fill the bytecode cache
+
+    with tempfile.TemporaryDirectory() as outdir:
+        cold = []
+        for _ in range(args.repeat):
+            for name in os.listdir(outdir):
+                if os.path.isfile(os.path.join(outdir, name)):
+                    os.remove(os.path.join(outdir, name))
+            cold.append(run(SETUP.format(outdir=outdir, prebuilt=False), env))
+        warm = [run(SETUP.format(outdir=outdir, prebuilt=False), env) for _ in range(args.repeat)]
+        prebuilt = [run(SETUP.format(outdir=outdir, prebuilt=True), env) for _ in range(args.repeat)]
+    total = [run(IMPORT, env) for _ in range(args.repeat)]
+
+    print(f"{'lexer + parser setup':<34}{'best ms':>9}")
+    print(f"{'generated, no tables on disk':<34}{min(cold) * 1000:>9.2f}")
+    print(f"{'generated, tables on disk':<34}{min(warm) * 1000:>9.2f}")
+    print(f"{'prebuilt, optimize mode':<34}{min(prebuilt) * 1000:>9.2f}")
+    print()
+    print(f"{'import Lambda, prebuilt tables':<34}{min(total) * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import sys
+from argparse import ArgumentParser
+
+from Lambda import as_tree, get_initial_tree, get_next_tree, tree2dict, specific_beta_reduction
+from app import carry_keys, fresh_keys
+from benchmarks.common import timed
+
+
+def balanced(n):
+    if n <= 1:
+        return f'x{n}'
+    return f'({balanced(n // 2)} {balanced(n - n // 2)})'
+
+
+def wide(n):
+    # a small redex next to an n-leaf balanced argument: the work of one
+    # step is tiny, the tree around it is not
+    return f'(((lambda y y) z) {balanced(n)});'
+
+
+def deep(n):
+    # the same redex at the bottom of an n-deep spine
+    expr = '((lambda y y) z)'
+    for k in range(n // 2):
+        expr = f'(x{k % 10} {expr})'
+    return expr + ';'
+
+
+def full_step(jtree, nodeid):
+    # the conversion round trip once done for every click
+    return tree2dict(get_next_tree(jtree, nodeid))
+
+
+def engine_step(etree, keys, nodeid):
+    # what a click does to the tree now: the step on the engine tree, and
+    # the element keys carried over the subtree it replaced
+    (status, new_etree) = specific_beta_reduction(etree, nodeid)
+    return new_etree, carry_keys(etree, new_etree, keys, nodeid)
+
+
+def main():
+    arg_parser = ArgumentParser(description='One click: full JSON round trip vs the engine tree step')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    print(f"{'term':<8}{'size':>8}{'full ms':>10}{'engine ms':>11}{'speedup':>9}")
+    for (shape, sizes) in [(wide, [1000, 10000, 100000]), (deep, [1000, 4000, 16000])]:
+        for n in sizes:
+            jtree = get_initial_tree(shape(n))['expr_tree_json']
+            etree = as_tree(shape(n))
+            nodeid = 'R0' if shape is wide else 'R' + '1' * (n // 2)
+            full, _ = timed(full_step, jtree, nodeid, repeat=args.repeat)
+            engine, _ = timed(engine_step, etree, fresh_keys(etree), nodeid, repeat=args.repeat)
+            print(f'{shape.__name__:<8}{n:>8}{full * 1000:>10.3f}{engine * 1000:>11.3f}{full / engine:>8.0f}x')
+
+
+if __name__ == '__main__':
+    main()
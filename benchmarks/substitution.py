@@ -0,0 +1,64 @@
+import sys
+from argparse import ArgumentParser
+
+from Lambda import as_tree, node, substitute, alpha_convert, walk
+from benchmarks.common import timed
+
+
+def binder_body(n):
+    # (lambda Y0 ((x Y0) (lambda Y1 ((x Y1) ... x))))
+    body = 'x'
+    for k in reversed(range(n)):
+        body = f'(lambda y{k} ((x y{k}) {body}))'
+    return body
+
+
+def free_spine(m):
+    val = 'z0'
+    for k in range(1, m):
+        val = f'(z{k} {val})'
+    return val
+
+
+def free_variables_walk(tree):
+    return walk(tree, lambda t: (None, {t.value}) if t.kind == 'name' else
+                (None, set()) if t.kind == 'num' else
+                ([t.left], lambda fv: fv - {t.value}) if t.kind == 'lambda' else
+                ([t.left, t.right], lambda fv1, fv2: fv1 | fv2))
+
+
+def substitute_uncached(tree, var, val):
+    # substitute as it was before free variables were cached on the nodes:
+    # every binder walks val again for the capture check
+    if tree.kind == 'name':
+        return val if tree.value == var else tree
+    elif tree.kind == 'num':
+        return tree
+    elif tree.kind == 'lambda':
+        if tree.value == var:
+            return tree
+        elif tree.value not in free_variables_walk(val):
+            return node('lambda', tree.value, substitute_uncached(tree.left, var, val))
+        renamed = alpha_convert(tree, tree.value + '_')
+        return node('lambda', renamed.value, substitute_uncached(renamed.left, var, val))
+    return node(tree.kind, tree.value, substitute_uncached(tree.left, var, val), substitute_uncached(tree.right, var, val))
+
+
+def main():
+    arg_parser = ArgumentParser(description='substitute cost with and without cached free variables')
+    arg_parser.add_argument('--val-size', type=int, default=300)
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(100000)
+
+    val = as_tree(free_spine(args.val_size) + ';')
+    print(f"{'binders':>8}{'cached s':>11}{'uncached s':>12}{'speedup':>9}")
+    for n in [100, 200, 400, 800, 1600]:
+        body = as_tree(binder_body(n) + ';')
+        cached, _ = timed(substitute, body, 'X', val, repeat=args.repeat)
+        uncached, _ = timed(substitute_uncached, body, 'X', val, repeat=args.repeat)
+        print(f'{n:>8}{cached:>11.5f}{uncached:>12.5f}{uncached / cached:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import gc
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+
+import Lambda
+import LambdaGraph
+import LambdaNbE
+from Lambda import parser, as_tree, tree2dict, substitute, free_variables, encode_tree, decode_tree
+from app import json_to_cytoscape_elements
+from benchmarks.common import query_examples, church, church_exp, church_factorial
+from benchmarks.layout import random_term
+
+# The whole engine and UI serialization path in one run. Every case reports
+# its best time, the engine nodes it allocates (tree nodes plus call-by-need
+# graph nodes) and its tracemalloc peak. --save writes the results as JSON,
+# and --baseline compares a run against saved results, exiting with status 1
+# when a case got slower, bigger or hungrier than --tolerance allows.
+#
+#   python -m benchmarks.suite --save baseline.json
+#   python -m benchmarks.suite --baseline baseline.json
+
+
+def add_keys(jtree):
+    # fresh element keys for every node of jtree, in preorder, as the app
+    # gives them to a submitted tree
+    stack = [jtree]
+    count = 0
+    while stack:
+        j = stack.pop()
+        j["key"] = str(count)
+        count += 1
+        stack.extend(reversed(j["children"]))
+    return jtree
+
+
+def cases():
+    # (name, fn); setup runs here, only fn is measured
+    sizes = [('1k', 1000), ('10k', 10000), ('100k', 100000)]
+
+    for label, n in sizes[:2]:
+        text = church(n) + ';'
+        yield f'parse church {label}', lambda text=text: parser.parse(text)
+    text = random_term(4000, random.Random(1)) + ';'
+    yield 'parse random 10k', lambda: parser.parse(text)
+
+    for label, n in sizes[:2]:
+        text = church(n) + ';'
+        yield f'get_initial_tree cold church {label}', lambda text=text: cold_initial_tree(text)
+        yield f'get_initial_tree warm church {label}', lambda text=text: Lambda.get_initial_tree(text)
+
+    for label, n in sizes:
+        tree = as_tree(f'({church(n)} (lambda y (+ y 1)));')
+        body = tree.left.left.left
+        yield f'substitute church {label}', lambda body=body, val=tree.right: substitute(body, 'F', val)
+        yield f'free_variables church {label}', lambda tree=tree: free_variables(tree)
+
+    for index, expr in enumerate(query_examples(), 1):
+        yield f'normalize queries.md #{index}', lambda expr=expr: Lambda.normalize(expr, max_steps=1000)
+    for n in [3, 4]:
+        expr = church_factorial(n)
+        yield f'normalize factorial {n}', lambda expr=expr: Lambda.normalize(expr, max_steps=100000, max_size=10**7)
+        yield f'call-by-need factorial {n}', lambda expr=expr: LambdaGraph.normalize(expr, max_steps=100000, max_size=10**7)
+        yield f'nbe factorial {n}', lambda expr=expr: LambdaNbE.normalize(expr, max_steps=100000, max_size=10**7)
+    for base, exponent in [(2, 5), (3, 3)]:
+        expr = church_exp(base, exponent)
+        yield f'normalize {base}^{exponent}', lambda expr=expr: Lambda.normalize(expr, max_steps=100000, max_size=10**7)
+        yield f'call-by-need {base}^{exponent}', lambda expr=expr: LambdaGraph.normalize(expr, max_steps=100000, max_size=10**7)
+        yield f'nbe {base}^{exponent}', lambda expr=expr: LambdaNbE.normalize(expr, max_steps=100000, max_size=10**7)
+
+    for label, n in sizes[:2]:
+        tree = as_tree(arithmetic(n, random.Random(n)) + ';')
+        yield f'fold_constants arithmetic {label}', lambda tree=tree: Lambda.fold_constants(tree)
+
+    for (label, n), leaves in zip(sizes, [400, 4000, 40000]):
+        jtree = add_keys(tree2dict(as_tree(random_term(leaves, random.Random(n)) + ';')))
+        yield f'json_to_cytoscape_elements random {label}', lambda jtree=jtree: json_to_cytoscape_elements(jtree)
+
+    for (label, n), leaves in zip(sizes[1:], [4000, 40000]):
+        tree = as_tree(random_term(leaves, random.Random(n)) + ';')
+        data = encode_tree(tree)
+        yield f'encode_tree random {label}', lambda tree=tree: encode_tree(tree)
+        yield f'decode_tree random {label}', lambda data=data: decode_tree(data)
+
+
+def arithmetic(n, rand):
+    # a random op tree of about n nodes over small integers and decimals
+    if n < 3:
+        return str(rand.randint(1, 9)) if rand.random() < 0.7 else f'{rand.randint(1, 9)}.5'
+    left = rand.randint(1, n - 2)
+    return f"({rand.choice('+-*/')} {arithmetic(left, rand)} {arithmetic(n - 1 - left, rand)})"
+
+
+def cold_initial_tree(text):
+    Lambda.parse_text.cache_clear()
+    return Lambda.get_initial_tree(text)
+
+
+def allocated():
+    return Lambda.allocated + LambdaGraph.allocated
+
+
+def measure(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # one more run for the memory figures; tracemalloc slows it down
+    gc.collect()
+    before = allocated()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": best, "allocations": allocated() - before, "peak_kib": peak / 1024}
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {"python": platform.python_version(), "platform": platform.platform(), "commit": commit,
+            "date": datetime.now(timezone.utc).isoformat(timespec='seconds')}
+
+
+def compare(results, baseline, tolerance):
+    # names of the cases that regressed against baseline
+    regressions = []
+    print()
+    print(f"{'case':<44}{'metric':<13}{'baseline':>12}{'now':>12}{'ratio':>8}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ["seconds", "allocations", "peak_kib"]:
+            if not before[metric]:
+                continue
+            ratio = now[metric] / before[metric]
+            flag = ''
+            if ratio > 1 + tolerance:
+                flag = '  REGRESSION'
+                if name not in regressions:
+                    regressions.append(name)
+            print(f'{name:<44}{metric:<13}{before[metric]:>12.4g}{now[metric]:>12.4g}{ratio:>8.2f}{flag}')
+    if regressions:
+        print()
+        print(f"{len(regressions)} cases regressed: {', '.join(regressions)}")
+    return regressions
+
+
+def main():
+    arg_parser = ArgumentParser(description='Time, allocations and peak memory of the engine and UI path')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    arg_parser.add_argument('--save', help='write the results to this JSON file')
+    arg_parser.add_argument('--baseline', help='compare with results saved by --save')
+    arg_parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed growth over the baseline before a case counts as regressed')
+    args = arg_parser.parse_args()
+
+    results = {}
+    print(f"{'case':<44}{'ms':>10}{'allocs':>10}{'peak KiB':>10}")
+    for name, fn in cases():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(fn, args.repeat)
+        print(f"{name:<44}{result['seconds'] * 1000:>10.2f}{result['allocations']:>10}{result['peak_kib']:>10.0f}")
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump({"meta": metadata(), "results": results}, file, indent=1)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)["results"]
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
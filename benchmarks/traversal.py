@@ -0,0 +1,94 @@
+import sys
+from argparse import ArgumentParser
+
+import Lambda
+from Lambda import as_tree, node
+from benchmarks.common import church, timed
+
+
+# Recursive reference walkers, as Lambda.py had them before walk()
+
+def to_string_rec(tree):
+    if tree.kind == "name":
+        return tree.value
+    elif tree.kind == "num":
+        return str(tree.value)
+    elif tree.kind == "lambda":
+        return "(LAMBDA " + tree.value + " " + to_string_rec(tree.left) + ")"
+    elif tree.kind == "apply":
+        return "(" + to_string_rec(tree.left) + " " + to_string_rec(tree.right) + ")"
+    else:
+        return "(" + tree.value + " " + to_string_rec(tree.left) + " " + to_string_rec(tree.right) + ")"
+
+
+def tree2dict_rec(tree, nodeid='R'):
+    if tree.kind == "name":
+        return {"nodeid": nodeid, "type": "name", "value": tree.value, "children": []}
+    elif tree.kind == "num":
+        return {"nodeid": nodeid, "type": "num", "value": str(tree.value), "children": []}
+    elif tree.kind == "lambda":
+        return {"nodeid": nodeid, "type": "lambda", "var": tree.value, "children": [tree2dict_rec(tree.left, nodeid + '0')]}
+    elif tree.kind == "apply":
+        beta = "YES" if tree.left.kind == "lambda" else "NO"
+        return {"nodeid": nodeid, "type": "apply", "beta": beta,
+                "children": [tree2dict_rec(tree.left, nodeid + '0'), tree2dict_rec(tree.right, nodeid + '1')]}
+    else:
+        return {"nodeid": nodeid, "type": "op", "value": tree.value,
+                "children": [tree2dict_rec(tree.left, nodeid + '0'), tree2dict_rec(tree.right, nodeid + '1')]}
+
+
+def json2tree_rec(jtree):
+    if jtree["type"] == "num":
+        return node("num", float(jtree["value"]))
+    elif jtree["type"] == "name":
+        return node("name", jtree["value"])
+    elif jtree["type"] == "lambda":
+        return node("lambda", jtree["var"], json2tree_rec(jtree["children"][0]))
+    elif jtree["type"] == "apply":
+        return node("apply", None, json2tree_rec(jtree["children"][0]), json2tree_rec(jtree["children"][1]))
+    else:
+        return node("op", jtree["value"], json2tree_rec(jtree["children"][0]), json2tree_rec(jtree["children"][1]))
+
+
+def balanced(depth):
+    if depth == 0:
+        return 'x'
+    return f'((lambda y {balanced(depth - 1)}) {balanced(depth - 1)})'
+
+
+def main():
+    arg_parser = ArgumentParser(description='Iterative walk() walkers vs the recursive originals')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    args = arg_parser.parse_args()
+    sys.setrecursionlimit(10000)
+
+    terms = [
+        ('church 500', church(500)),
+        ('balanced 2^13', balanced(13)),
+    ]
+    print(f"{'walker':<16}{'term':<16}{'nodes':>8}{'rec Mn/s':>10}{'iter Mn/s':>11}{'ratio':>7}")
+    for term_name, expr in terms:
+        tree = as_tree(expr + ';')
+        jtree = Lambda.tree2dict(tree)
+        n = tree.size
+        cases = [
+            ('to_string', to_string_rec, Lambda.to_string, (tree,)),
+            ('tree2dict', tree2dict_rec, Lambda.tree2dict, (tree,)),
+            ('json2tree', json2tree_rec, Lambda.json2tree, (jtree,)),
+        ]
+        for walker, rec, it, fn_args in cases:
+            rec_s, _ = timed(rec, *fn_args, repeat=args.repeat)
+            it_s, _ = timed(it, *fn_args, repeat=args.repeat)
+            print(f'{walker:<16}{term_name:<16}{n:>8}{n / rec_s / 1e6:>10.2f}{n / it_s / 1e6:>11.2f}{rec_s / it_s:>7.2f}')
+
+    print()
+    print('deep terms (recursive walkers raise RecursionError here)')
+    for depth in [10000, 100000]:
+        tree = as_tree(church(depth) + ';')
+        it_s, _ = timed(Lambda.to_string, tree, repeat=1)
+        sub_s, _ = timed(Lambda.substitute, tree.left.left, 'F', node('name', 'G'), repeat=1)
+        print(f'church {depth:<7} to_string {it_s:.3f}s  substitute {sub_s:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import json
+import random
+from argparse import ArgumentParser
+
+from Lambda import as_tree, tree2dict, json2tree, encode_tree, decode_tree
+from benchmarks.common import church, timed
+from benchmarks.layout import random_term
+
+
+# Bytes and time of a tree in the stores: as tree2dict JSON, as it was
+# stored before, and in the encode_tree form, plain and compressed. Encoding
+# runs from the engine tree to the JSON text and decoding back, as in a
+# callback. Nested dicts are encoded recursively, so a deep enough tree does
+# not fit in tree2dict JSON at all; the flat form has no such limit.
+
+def formats():
+    return {
+        'tree2dict': (lambda tree: json.dumps(tree2dict(tree)),
+                      lambda text: json2tree(json.loads(text))),
+        'compact': (lambda tree: json.dumps(encode_tree(tree)),
+                    lambda text: decode_tree(json.loads(text))),
+        'compact+zlib': (lambda tree: json.dumps(encode_tree(tree, compress=True)),
+                         lambda text: decode_tree(json.loads(text))),
+    }
+
+
+def workloads(scale):
+    for label, leaves in [('1k', 400), ('10k', 4000), ('100k', 40000)][:scale]:
+        yield f'random {label}', as_tree(random_term(leaves, random.Random(leaves)) + ';')
+    # a numeral is a chain, so its node ids are as long as the term is deep
+    for n in [1000, 5000][:scale]:
+        yield f'church {n}', as_tree(church(n) + ';')
+
+
+def main():
+    arg_parser = ArgumentParser(description='Store size and (de)serialization time of the tree formats')
+    arg_parser.add_argument('--scale', type=int, default=3, choices=[1, 2, 3],
+                            help='how many of the growing workload sizes to run')
+    args = arg_parser.parse_args()
+
+    print(f"{'workload':<14}{'format':<14}{'nodes':>8}{'bytes':>11}{'encode ms':>11}{'decode ms':>11}{'smaller':>9}")
+    for name, tree in workloads(args.scale):
+        base = None
+        for index, (label, (encode, decode)) in enumerate(formats().items()):
+            prefix = f"{name if index == 0 else '':<14}{label:<14}{tree.size:>8}"
+            try:
+                encode_s, text = timed(encode, tree)
+            except RecursionError:
+                print(f'{prefix}  too deep to encode')
+                continue
+            decode_s, back = timed(decode, text)
+            assert back is tree, (name, label)
+            if index == 0:
+                base = len(text)
+            ratio = f'{base / len(text):>9.1f}' if base else f"{'-':>9}"
+            print(f'{prefix}{len(text):>11}{encode_s * 1000:>11.2f}{decode_s * 1000:>11.2f}{ratio}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import threading
+
+import Lambda
+import LambdaGraph
+
+# Counters and latency histograms for the web app, rendered in the Prometheus
+# text format. Histograms are filled by the app as requests come in; engine
+# counters are read from the engine modules when the metrics are scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.series = {}  # label value -> [bucket counts, sum, count]
+
+    def observe(self, value, amount):
+        series = self.series.get(value)
+        if series is None:
+            series = self.series[value] = [[0] * len(self.buckets), 0, 0]
+        for index, bound in enumerate(self.buckets):
+            if amount <= bound:
+                series[0][index] += 1
+        series[1] += amount
+        series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for value, (counts, total, count) in sorted(self.series.items()):
+            label = f'{self.label}="{value}"'
+            for bound, bucket in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {bucket}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label}}} {total}')
+            lines.append(f'{self.name}_count{{{label}}} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.callbacks = Histogram('lambda_callback_seconds', 'Time spent in a Dash callback.',
+                                   'callback', LATENCY_BUCKETS)
+        self.stores = Histogram('lambda_store_bytes', 'JSON size of a store written by a callback.',
+                                'store', SIZE_BUCKETS)
+
+    def callback_time(self, name, seconds):
+        with self.lock:
+            self.callbacks.observe(name, seconds)
+
+    def store_size(self, name, size):
+        with self.lock:
+            self.stores.observe(name, size)
+
+    def render(self):
+        with self.lock:
+            lines = self.callbacks.render() + self.stores.render()
+        lines += engine_metrics()
+        return '\n'.join(lines) + '\n'
+
+
+def counter(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} counter', f'{name} {value}']
+
+
+def gauge(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {value}']
+
+
+def engine_metrics():
+    stats = Lambda.stats
+    cache = Lambda.parse_cache_info()
+    return (counter('lambda_beta_steps_total', 'Beta reductions, named and nameless engines.', stats["beta_steps"])
+            + counter('lambda_delta_steps_total', 'Prelude references expanded.', stats["delta_steps"])
+            + counter('lambda_math_steps_total', 'Arithmetic operations evaluated.', stats["math_steps"])
+            + counter('lambda_graph_steps_total', 'Steps of the call-by-need engine.', stats["graph_steps"])
+            + counter('lambda_nbe_steps_total', 'Steps of the normalization by evaluation engine.',
+                      stats["nbe_steps"])
+            + counter('lambda_substitutions_total', 'Calls to substitute.', stats["substitutions"])
+            + counter('lambda_alpha_conversions_total', 'Lambdas renamed to avoid capture.',
+                      stats["alpha_conversions"])
+            + counter('lambda_nodes_allocated_total', 'Tree nodes created.', Lambda.allocated)
+            + counter('lambda_graph_nodes_allocated_total', 'Call-by-need graph nodes created.',
+                      LambdaGraph.allocated)
+            + gauge('lambda_nodes_live', 'Tree nodes currently alive.', len(Lambda.nodes))
+            + counter('lambda_parse_cache_hits_total', 'Parse cache hits.', cache["hits"])
+            + counter('lambda_parse_cache_misses_total', 'Parse cache misses.', cache["misses"])
+            + gauge('lambda_parse_cache_size', 'Expressions in the parse cache.', cache["size"]))
@@ -0,0 +1,189 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import Lambda
+import LambdaGraph
+import LambdaNbE
+from Lambda import alpha_key, node, walk
+from sessions import dump, load
+
+# Normal forms of terms already reduced, keyed by strategy and alpha_key, so
+# alpha-equivalent terms share an entry. The most recently used entries are
+# kept in memory; with a path, every entry is also written to an SQLite
+# database that outlives the process and can be shared by several.
+#
+# Only finished reductions are stored. A hit is used whenever its step
+# count is within the caller's max_steps and its normal form within
+# max_size, since a reduction under those limits would have finished. For the strategies that reduce to the full normal
+# form, a term that misses can still use the stored normal forms of its
+# closed subterms: putting them in place first gives the same normal form.
+# A term's normal form also depends on the prelude definitions its free
+# names refer to, so with a prelude loaded the keys carry a digest of it.
+
+FULL = ['normal-order', 'call-by-need', 'nbe']
+SUBTERM_SIZE = 16  # smallest closed subterm worth looking up
+
+
+def reduce_with(tree, strategy, max_steps, max_size, max_time, max_growth=Lambda.MAX_GROWTH):
+    # call-by-need and nbe never see the terms in between, so when they stop
+    # at a limit, up to CYCLE_WINDOW normal order steps tell whether the term
+    # cycles or keeps growing, as the step-by-step strategies report it
+    if strategy == 'call-by-need':
+        result = LambdaGraph.reduce_tree(tree, max_steps, max_size, max_time)
+    elif strategy == 'nbe':
+        result = LambdaNbE.reduce_tree(tree, max_steps, max_size, max_time)
+    else:
+        return Lambda.reduce_tree(tree, strategy, max_steps, max_size, max_time, max_growth)
+    if result[2] == 'done':
+        return result
+    probe = Lambda.reduce_tree(tree, 'normal-order', min(max_steps, Lambda.CYCLE_WINDOW), max_size, max_time,
+                               max_growth)
+    if probe[2].startswith(('cycle', 'growth')):
+        return probe
+    return result
+
+
+class NormalForms:
+    def __init__(self, path=None, size=1024, engine=reduce_with):
+        self.size = size
+        self.engine = engine  # called as reduce_with to reduce a term that misses
+        self.memory = OrderedDict()  # key -> (normal form, steps), oldest first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.path = path
+        self.connection = None
+        self.pid = None
+
+    def database(self):
+        # one connection per process, shared by its threads under the lock;
+        # a connection must not be used on both sides of a fork
+        if self.path is None:
+            return None
+        if self.pid != os.getpid():
+            self.connection = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS normal_forms '
+                                    '(key TEXT PRIMARY KEY, tree BLOB, steps INTEGER)')
+            self.connection.commit()
+            self.pid = os.getpid()
+        return self.connection
+
+    def get(self, key):
+        with self.lock:
+            item = self.memory.get(key)
+            if item is not None:
+                self.memory.move_to_end(key)
+            elif self.path is not None:
+                row = self.database().execute('SELECT tree, steps FROM normal_forms WHERE key = ?', (key,)).fetchone()
+                if row is not None:
+                    item = (load(io.BytesIO(row[0])), row[1])
+                    self.remember(key, item)
+            if item is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return item
+
+    def put(self, key, tree, steps):
+        with self.lock:
+            self.remember(key, (tree, steps))
+            if self.path is not None:
+                blob = io.BytesIO()
+                dump(tree, blob)
+                db = self.database()
+                db.execute('INSERT OR REPLACE INTO normal_forms VALUES (?, ?, ?)', (key, blob.getvalue(), steps))
+                db.commit()
+
+    def remember(self, key, item):
+        self.memory[key] = item
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.size:
+            self.memory.popitem(last=False)
+
+    def reduce(self, tree, strategy='normal-order', max_steps=10000, max_size=100000, max_time=None,
+               max_growth=Lambda.MAX_GROWTH):
+        # (normal form or tree reached, steps, why it stopped, cache hits);
+        # steps taken on a cached normal form count as taken
+        key = self.prefix(strategy) + alpha_key(tree)
+        item = self.get(key)
+        if item is not None and item[1] <= max_steps and item[0].size <= max_size:
+            return (item[0], item[1], 'done', 1)
+        hits = 0
+        cached_steps = 0
+        if strategy in FULL:
+            (tree, hits, cached_steps) = self.use_subterms(tree, self.prefix(strategy), max_steps, max_size)
+        (normal, steps, halted) = self.engine(tree, strategy, max_steps - cached_steps, max_size, max_time,
+                                              max_growth)
+        steps += cached_steps
+        if halted == 'done':
+            self.put(key, normal, steps)
+        return (normal, steps, halted, hits)
+
+    def prefix(self, strategy):
+        if Lambda.definitions_key:
+            return f'{strategy}@{Lambda.definitions_key}:'
+        return strategy + ':'
+
+    def use_subterms(self, tree, prefix, max_steps, max_size):
+        # tree with its largest closed subterms replaced by their stored
+        # normal forms, as long as their steps fit in max_steps and each fits
+        # in max_size; (tree, subterms replaced, their steps)
+        hits = 0
+        steps = 0
+
+        def lookup(t):
+            nonlocal hits, steps
+            item = self.get(prefix + alpha_key(t))
+            if item is None or steps + item[1] > max_steps or item[0].size > max_size:
+                return None
+            hits += 1
+            steps += item[1]
+            return item[0]
+
+        def expand(item):
+            (t, top) = item
+            if t.size < SUBTERM_SIZE or t.kind in ['name', 'num']:
+                return (None, t)
+            elif not t.fv and not top:
+                return (None, lookup(t) or t)
+            elif t.kind == 'lambda':
+                return ([(t.left, False)], lambda body: t if body is t.left else node('lambda', t.value, body))
+            else:  # must be "op" or "apply"
+                return ([(t.left, False), (t.right, False)],
+                        lambda left, right: t if left is t.left and right is t.right
+                        else node(t.kind, t.value, left, right))
+
+        return (walk((tree, True), expand), hits, steps)
+
+    def normalize(self, expr, strategy='normal-order', max_steps=10000, max_size=100000, max_time=None,
+                  max_growth=Lambda.MAX_GROWTH):
+        # Lambda.normalize through the cache, with "cached" counting the hits
+        start = time.perf_counter()
+        try:
+            (tree, steps, halted, hits) = self.reduce(Lambda.as_tree(expr), strategy, max_steps, max_size, max_time,
+                                                        max_growth)
+            return {"status": "OK", "expr_tree_json": Lambda.tree2dict(tree), "strategy": strategy, "steps": steps,
+                    "halted": halted, "time": time.perf_counter() - start, "cached": hits}
+        except Exception as inst:
+            print(inst.args[0])
+            return {"status": "ERROR", "message": inst.args[0]}
+
+    def warm_up(self, exprs, strategies, max_time=1.0):
+        # reduce exprs with every strategy, so that their normal forms are
+        # stored; the database makes this quick after the first start
+        for expr in exprs:
+            for strategy in strategies:
+                self.normalize(expr, strategy, max_time=max_time)
+
+    def info(self):
+        with self.lock:
+            stored = None
+            if self.path is not None:
+                stored = self.database().execute('SELECT COUNT(*) FROM normal_forms').fetchone()[0]
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.memory), "maxsize": self.size,
+                    "stored": stored}
@@ -0,0 +1,171 @@
+import io
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import Pipe
+from multiprocessing.connection import Connection
+
+import Lambda
+from normalforms import reduce_with
+from sessions import dump, load
+
+# Evaluation in a pool of worker processes, so that a term that blows up
+# takes a worker down rather than the server. Jobs are engine functions,
+# sent with their arguments in the session format, which keeps shared
+# subtrees shared. The caller waits for the result and kills the worker if
+# it runs past the time limit or its resident memory past the memory limit;
+# a new worker takes its place and the caller gets BudgetExceeded.
+#
+# Workers are new interpreters running this file, started before they are
+# needed, rather than forks of the server: a fork of a threaded process can
+# inherit a lock that another thread holds, and a worker has no use for the
+# Dash app. A worker is ready in about 0.2 s.
+
+POLL = 0.02  # seconds between checks of a running job
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class BudgetExceeded(Exception):
+    MESSAGES = {
+        'time': 'took more than {} s',
+        'memory': 'used more than {} MB',
+        'size': 'grew past {} nodes',
+        'crash': 'crashed its worker (exit code {})',
+        'busy': 'found every worker busy for {} s',
+    }
+
+    def __init__(self, limit, value):
+        super().__init__('Budget exceeded: the evaluation ' + self.MESSAGES[limit].format(value))
+        self.limit = limit
+        self.value = value
+
+    def result(self):
+        # in the form of the engines' normalize results
+        return {"status": "BUDGET", "limit": self.limit, "value": self.value, "message": self.args[0]}
+
+
+def resident_memory(pid):
+    # bytes, or None where /proc is not available
+    try:
+        with open(f'/proc/{pid}/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def serve(conn):
+    conn.send_bytes(b'')  # ready
+    while True:
+        try:
+            (function, args) = load(io.BytesIO(conn.recv_bytes()))
+        except EOFError:
+            return
+        try:
+            reply = (True, function(*args))
+        except Exception as inst:
+            reply = (False, inst)
+        out = io.BytesIO()
+        dump(reply, out)
+        conn.send_bytes(out.getvalue())
+
+
+class Sandbox:
+    def __init__(self, size=2, max_time=10.0, max_mb=512):
+        self.size = size
+        self.max_time = max_time
+        self.max_mb = max_mb
+        self.lock = threading.Lock()
+        self.idle = None  # queue of (process, connection)
+        self.pid = None
+        self.jobs = 0
+        self.killed = {'time': 0, 'memory': 0, 'crash': 0}
+
+    def start(self):
+        # the workers of this process; a pool must not be used on both sides
+        # of a fork, so a forked process starts its own
+        with self.lock:
+            if self.pid != os.getpid():
+                self.idle = queue.Queue()
+                for _ in range(self.size):
+                    self.idle.put(self.spawn())
+                self.pid = os.getpid()
+            return self.idle
+
+    def spawn(self):
+        (conn, child) = Pipe()
+        command = [sys.executable, __file__, str(child.fileno())]
+        if Lambda.prelude is not None:
+            command.append(Lambda.prelude)  # workers must know the same definitions
+        process = subprocess.Popen(command, pass_fds=[child.fileno()])
+        child.close()
+        conn.recv_bytes()
+        return (process, conn)
+
+    def run(self, function, *args):
+        # function(*args) in a worker; function must be importable by name
+        job = io.BytesIO()
+        dump((function, args), job)
+        idle = self.start()
+        try:
+            worker = idle.get(timeout=self.max_time)
+        except queue.Empty:
+            raise BudgetExceeded('busy', self.max_time)
+        (process, conn) = worker
+        with self.lock:
+            self.jobs += 1
+        try:
+            conn.send_bytes(job.getvalue())
+            limit = self.wait(process, conn)
+            if limit is None:
+                (ok, value) = load(io.BytesIO(conn.recv_bytes()))
+        except (EOFError, OSError):
+            limit = ('crash', process.wait())
+        if limit is not None:
+            self.replace(worker, limit[0])
+            raise BudgetExceeded(*limit)
+        idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    def wait(self, process, conn):
+        # None once the reply is ready, else the (limit, value) it broke
+        deadline = time.perf_counter() + self.max_time
+        while not conn.poll(POLL):
+            if process.poll() is not None:
+                return ('crash', process.returncode)
+            if time.perf_counter() > deadline:
+                return ('time', self.max_time)
+            rss = resident_memory(process.pid)
+            if rss is not None and rss > self.max_mb * 2**20:
+                return ('memory', self.max_mb)
+        return None
+
+    def replace(self, worker, limit):
+        (process, conn) = worker
+        process.kill()
+        process.wait()
+        conn.close()
+        with self.lock:
+            self.killed[limit] += 1
+        self.idle.put(self.spawn())
+
+    def reduce(self, tree, strategy, max_steps, max_size, max_time, max_growth):
+        # normalforms.reduce_with in a worker
+        return self.run(reduce_with, tree, strategy, max_steps, max_size, max_time, max_growth)
+
+    def info(self):
+        with self.lock:
+            return {"workers": self.size, "jobs": self.jobs, "killed": dict(self.killed),
+                    "max_time": self.max_time, "max_mb": self.max_mb}
+
+
+if __name__ == '__main__':
+    # a worker, given its end of the pipe and the prelude by Sandbox.spawn
+    sys.stdout = sys.stderr  # the parser prints its errors
+    if len(sys.argv) > 2:
+        Lambda.load_prelude(sys.argv[2])
+    serve(Connection(int(sys.argv[1])))
@@ -0,0 +1,205 @@
+import io
+import os
+import pickle
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from Lambda import Node, node, walk
+
+# Server-side session stores. A session value is any picklable object, and
+# engine trees in it are kept as they are. Sessions are evicted least
+# recently used first once the store is over its memory ceiling, and
+# dropped when they have not been used for ttl seconds.
+#   MemoryStore: in this process; sizes come from a caller supplied sizeof
+#   DiskStore:   one file per session in a directory, so several server
+#                processes can share sessions
+
+SESSION_ID = re.compile(r'[0-9a-f]{32}')
+# A DiskStore scans its directory for sessions to evict at most this often,
+# or after writing a sixteenth of its ceiling, rather than on every put
+EVICT_EVERY = 60  # seconds
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+class MemoryStore:
+    def __init__(self, sizeof, ttl=3600, max_bytes=256 * 2**20):
+        self.sizeof = sizeof
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sessions = OrderedDict()  # id -> (value, size, last used), oldest first
+        self.total = 0
+        self.lock = threading.Lock()
+
+    def get(self, sid):
+        if not isinstance(sid, str):  # from the browser, maybe not hashable
+            return None
+        with self.lock:
+            item = self.sessions.get(sid)
+            if item is None:
+                return None
+            (value, size, used) = item
+            now = time.time()
+            if now - used > self.ttl:
+                self.drop(sid)
+                return None
+            self.sessions[sid] = (value, size, now)
+            self.sessions.move_to_end(sid)
+            return value
+
+    def put(self, sid, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if sid in self.sessions:
+                self.drop(sid)
+            self.sessions[sid] = (value, size, time.time())
+            self.total += size
+            self.evict()
+
+    def drop(self, sid):
+        self.total -= self.sessions.pop(sid)[1]
+
+    def evict(self):
+        # the newest session is kept even when it alone is over the ceiling
+        now = time.time()
+        while len(self.sessions) > 1:
+            (sid, (value, size, used)) = next(iter(self.sessions.items()))
+            if self.total <= self.max_bytes and now - used <= self.ttl:
+                break
+            self.drop(sid)
+
+
+class DiskStore:
+    def __init__(self, directory, ttl=3600, max_bytes=1024 * 2**20):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.written = 0  # bytes put since the last scan
+        self.scanned = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, sid):
+        # session ids come from the browser: only ever use well formed ones
+        if not isinstance(sid, str) or not SESSION_ID.fullmatch(sid):
+            return None
+        return os.path.join(self.directory, sid + '.session')
+
+    def get(self, sid):
+        path = self.path(sid)
+        if path is None:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, 'rb') as file:
+                value = load(file)
+            os.utime(path)  # the file's mtime is its last use
+            return value
+        except FileNotFoundError:
+            return None
+
+    def put(self, sid, value):
+        path = self.path(sid)
+        if path is None:
+            raise ValueError("bad session id " + repr(sid))
+        # write then rename, so other processes never read half a session
+        temp = f'{path}.{new_session_id()}.tmp'
+        with open(temp, 'wb') as file:
+            dump(value, file)
+            size = file.tell()
+        os.replace(temp, path)
+        now = time.time()
+        with self.lock:
+            self.written += size
+            due = self.written > self.max_bytes // 16 or now - self.scanned > EVICT_EVERY
+            if due:
+                self.written = 0
+                self.scanned = now
+        if due:
+            self.evict()
+
+    def evict(self):
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.session'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        files.sort()
+        total = sum(size for (mtime, size, path) in files)
+        for (mtime, size, path) in files[:-1]:
+            if total <= self.max_bytes and now - mtime <= self.ttl:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+# Pickling engine trees node by node would recurse as deep as the tree, and
+# would lose the sharing between the trees of one session. Trees are written
+# instead as one table of (kind, value, left, right) rows, children before
+# parents and each shared node once, followed by the value with every node
+# replaced by its row number.
+
+class TreePickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.rows = []
+        self.index = {}
+
+    def persistent_id(self, obj):
+        if type(obj) is not Node:
+            return None
+        def expand(t):
+            if t in self.index:
+                return (None, self.index[t])
+            elif t.kind in ["name", "num"]:
+                return (None, self.add(t, None, None))
+            elif t.kind == "lambda":
+                return ([t.left], lambda body: self.add(t, body, None))
+            else:  # must be "op" or "apply"
+                return ([t.left, t.right], lambda left, right: self.add(t, left, right))
+        return walk(obj, expand)
+
+    def add(self, t, left, right):
+        self.index[t] = len(self.rows)
+        self.rows.append((t.kind, t.value, left, right))
+        return self.index[t]
+
+
+class TreeUnpickler(pickle.Unpickler):
+    def __init__(self, file, nodes):
+        super().__init__(file)
+        self.nodes = nodes
+
+    def persistent_load(self, pid):
+        return self.nodes[pid]
+
+
+def dump(value, file):
+    body = io.BytesIO()
+    pickler = TreePickler(body)
+    pickler.dump(value)
+    pickle.dump(pickler.rows, file, protocol=pickle.HIGHEST_PROTOCOL)
+    file.write(body.getvalue())
+
+
+def load(file):
+    nodes = []
+    for (kind, value, left, right) in pickle.load(file):
+        nodes.append(node(kind, value,
+                          None if left is None else nodes[left],
+                          None if right is None else nodes[right]))
+    return TreeUnpickler(file, nodes).load()
@@ -73,6 +73,19 @@ cytoscape_stylesheet = [
             'background-color': '#e6e6e6',  
         }
     },
+    {
+        'selector': '.summary-node',
+        'style': {
+            'shape': 'round-rectangle',
+            'background-color': '#ffffff',
+            'border-style': 'dashed',
+            'width': 'label',
+            'height': 'label',
+            'padding': '6px',
+            'font-size': '12px',
+            'text-wrap': 'wrap',
+        }
+    },
 ]
 
 styles = {
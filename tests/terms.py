@@ -0,0 +1,18 @@
+# Random terms for the tests, built bottom up like
+# benchmarks.layout.random_term so that deep terms need no recursion. Two
+# neighbouring terms are joined by one of ops with probability op_rate and
+# by an application otherwise, and a term is put under a lambda with
+# probability 0.3.
+
+
+def random_term(leaves, rand, atoms=('x', 'y', '3'), ops='', op_rate=0.0):
+    terms = [rand.choice(atoms) for _ in range(leaves)]
+    while len(terms) > 1:
+        i = rand.randrange(len(terms) - 1)
+        if rand.random() < 0.3:
+            terms[i] = f'(lambda {rand.choice("xyz")} {terms[i]})'
+        elif ops and rand.random() < op_rate:
+            terms[i:i + 2] = [f'({rand.choice(ops)} {terms[i]} {terms[i + 1]})']
+        else:
+            terms[i:i + 2] = [f'({terms[i]} {terms[i + 1]})']
+    return terms[0] + ';'
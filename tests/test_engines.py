@@ -0,0 +1,114 @@
+import os
+import random
+import tempfile
+import unittest
+
+import Lambda
+import LambdaGraph
+import LambdaNbE
+from Lambda import alpha_key, as_tree
+from normalforms import FULL, reduce_with
+from terms import random_term
+
+# Differential tests: on random terms, call-by-need graph reduction and
+# normalization by evaluation must find the normal form the step-by-step
+# reducer finds in normal order, up to the names of bound variables.
+
+TERMS = 3000
+STEPS = 300
+MAX_SIZE = 10000
+
+
+class DifferentialTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the terms normal order normalizes, with their normal forms
+        rand = random.Random(5)
+        cls.normal = []
+        for _ in range(TERMS):
+            tree = as_tree(random_term(rand.randint(2, 30), rand, ops='+', op_rate=0.1))
+            (normal, steps, halted) = Lambda.reduce_tree(tree, 'normal-order', STEPS, MAX_SIZE)
+            if halted == 'done':
+                cls.normal.append((tree, alpha_key(normal)))
+
+    def check(self, engine):
+        self.assertGreater(len(self.normal), TERMS // 3)
+        for (tree, key) in self.normal:
+            (other, steps, halted) = engine(tree, 10 * STEPS, 10 * MAX_SIZE)
+            with self.subTest(expr=Lambda.to_string(tree)):
+                self.assertEqual(halted, 'done')
+                self.assertEqual(alpha_key(other), key)
+
+    def test_nbe(self):
+        self.check(LambdaNbE.reduce_tree)
+
+    def test_graph(self):
+        self.check(LambdaGraph.reduce_tree)
+
+    def test_divergence(self):
+        # every strategy stops Omega at its cycle, and the ones that reduce
+        # under lambdas stop Y at its growth
+        omega = as_tree('((lambda x (x x)) (lambda x (x x)));')
+        y = as_tree('(lambda f ((lambda x (f (x x))) (lambda x (f (x x)))));')
+        for strategy in Lambda.STRATEGIES:
+            with self.subTest(strategy=strategy):
+                self.assertEqual(reduce_with(omega, strategy, 10000, MAX_SIZE, None)[1:], (1, 'cycle of length 1'))
+                if strategy in FULL:
+                    halted = reduce_with(y, strategy, 10000, MAX_SIZE, None)[2]
+                    self.assertTrue(halted.startswith('growth'), halted)
+
+
+# Terms with let and prelude definitions, where a delta step must not let
+# the binders around a reference capture anything.
+DEFINED = [
+    'let K = (lambda x z); (lambda z (K 1));',
+    'let K = (lambda x (lambda y x)); let I = (K K); (lambda k ((I k) 2));',
+    '(lambda z ((K z) 1));',
+    '((PLUS TWO) THREE);',
+    '(FACT THREE);',
+    '(lambda x (FST ((PAIR x) 1)));',
+    '(lambda TRUE ((TRUE 1) 2));',
+    '(lambda f ((POW TWO) f));',
+    '(((IF (ISZERO ZERO)) (lambda a b)) 3);',
+]
+
+
+class DefinitionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Lambda.load_prelude()
+
+    @classmethod
+    def tearDownClass(cls):
+        Lambda.definitions.clear()
+        Lambda.prelude = None
+        Lambda.parse_text.cache_clear()
+        Lambda.set_definitions_key()
+
+    def test_engines_agree(self):
+        for expr in DEFINED:
+            tree = as_tree(expr)
+            (normal, steps, halted) = Lambda.reduce_tree(tree, 'normal-order', 10 * STEPS, MAX_SIZE)
+            for engine in [LambdaNbE.reduce_tree, LambdaGraph.reduce_tree]:
+                (other, steps, other_halted) = engine(tree, 10 * STEPS, MAX_SIZE)
+                with self.subTest(expr=expr, engine=engine.__module__):
+                    self.assertEqual((halted, other_halted), ('done', 'done'))
+                    self.assertEqual(alpha_key(other), alpha_key(normal))
+
+    def test_no_capture(self):
+        (normal, steps, halted) = Lambda.reduce_tree(as_tree(DEFINED[0]))
+        self.assertEqual(normal.fv, frozenset(['Z']))
+
+    def test_open_definition_refused(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.lambda', delete=False) as file:
+            file.write('let K = (lambda x z);')
+        try:
+            with self.assertRaises(ValueError):
+                Lambda.load_prelude(file.name)
+        finally:
+            os.remove(file.name)
+        self.assertIn('FACT', Lambda.definitions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import copy
+import random
+import unittest
+
+import app
+from Lambda import as_tree, find_redex
+from sessions import MemoryStore
+from terms import random_term
+
+# The reduction history: record keeps an action log with a checkpoint
+# every CHECKPOINT_EVERY states and at every normalize, state_at replays
+# any state from the nearest checkpoint, and check_history refuses logs
+# record could not have made.
+
+TERMS = 100
+STEPS = 30
+# 3 * 3 on Church numerals, which takes more than STEPS steps
+LONG = '(((lambda m (lambda n (lambda f (m (n f))))) (lambda f (lambda x (f (f (f x)))))) ' \
+       '(lambda f (lambda x (f (f (f x))))));'
+
+
+def random_steps(tree, rand):
+    # (entry, tree after it) for STEPS random steps from tree; once it is
+    # normal, folds that change nothing
+    for _ in range(STEPS):
+        if rand.random() < 0.1:
+            entry = {"action": "normalize", "strategy": "normal-order"}
+            tree = app.normal_form(tree, "normal-order")["tree"]
+        elif rand.random() < 0.1:
+            entry = {"action": "fold"}
+            tree = app.apply_action(tree, entry)
+        else:
+            found = find_redex(tree, rand.choice(["normal-order", "applicative-order"]))
+            if found is None:
+                entry = {"action": "fold"}
+            else:
+                entry = {"action": "math" if found[1].kind == "op" else "beta", "nodeid": "R" + found[0]}
+            tree = app.apply_action(tree, entry)
+        yield entry, tree
+
+
+class HistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (app.HISTORY_CAP, app.CHECKPOINT_EVERY)
+
+    def tearDown(self):
+        (app.HISTORY_CAP, app.CHECKPOINT_EVERY) = self.saved
+
+    def check_replay(self, pack):
+        rand = random.Random(7)
+        for n in range(TERMS):
+            tree = as_tree(LONG if n % 10 == 0 else random_term(rand.randint(2, 30), rand, ops='+*', op_rate=0.2))
+            trees = [tree]
+            history = app.new_history(pack(tree))
+            for entry, tree in random_steps(tree, rand):
+                trees.append(tree)
+                history = app.record(history, entry, tree, pack)
+                self.assertLessEqual(len(history['log']), app.HISTORY_CAP)
+                if pack is app.pack_tree:
+                    app.check_history(history)
+                self.assertIs(app.state_at(history, len(history['log']) - 1), tree)
+            log = history['log']
+            offset = len(trees) - len(log)
+            for index in range(len(log)):
+                with self.subTest(expr=str(trees[0]), index=index):
+                    self.assertIs(app.state_at(history, index), trees[offset + index])
+
+    def test_replay(self):
+        self.check_replay(app.pack_tree)
+        self.check_replay(lambda t: t)
+
+    def test_replay_truncated(self):
+        (app.HISTORY_CAP, app.CHECKPOINT_EVERY) = (7, 3)
+        self.check_replay(app.pack_tree)
+        self.check_replay(lambda t: t)
+
+    def test_malformed(self):
+        tree = as_tree('((lambda x (x x)) (lambda y y));')
+        good = app.new_history(app.pack_tree(tree))
+        good = app.record(good, {"action": "beta", "nodeid": "R"}, tree, app.pack_tree)
+        app.check_history(copy.deepcopy(good))
+        cases = [
+            {},
+            {"log": [], "checkpoints": [[0, good['checkpoints'][0][1]]]},
+            dict(good, log=[{"action": "beta", "nodeid": "R"}] * 2),
+            dict(good, log=good['log'] + [{"action": "beta", "nodeid": "X"}]),
+            dict(good, log=good['log'] + [{"action": "beta", "nodeid": 0}]),
+            dict(good, log=good['log'] + [{"action": "normalize"}]),
+            dict(good, log=good['log'] + [{"action": "start"}]),
+            dict(good, log=[{"action": "start"}] + [{"action": "fold"}] * (app.CHECKPOINT_EVERY + 1)),
+            dict(good, log=[{"action": "start"}] + [{"action": "fold"}] * app.HISTORY_CAP),
+            dict(good, checkpoints=[]),
+            dict(good, checkpoints=[[1, good['checkpoints'][0][1]]]),
+            dict(good, checkpoints=[["0", good['checkpoints'][0][1]]]),
+        ]
+        for history in cases:
+            with self.subTest(history=str(history)[:80]):
+                with self.assertRaises((ValueError, TypeError, KeyError)):
+                    app.check_history(history)
+
+
+class SessionBackTest(unittest.TestCase):
+    def setUp(self):
+        self.saved = (app.SESSIONS, app.MAX_SIZE)
+        app.SESSIONS = MemoryStore(app.session_bytes)
+
+    def tearDown(self):
+        (app.SESSIONS, app.MAX_SIZE) = self.saved
+
+    def test_failed_back_keeps_history(self):
+        tree, prevtrees, disabled, error, message = app.submit('(((lambda x (lambda y (x y))) a) b);')
+        tree, prevtrees = app.select_node({'nodeid': 'R0', 'type': 'apply', 'beta': 'YES'}, tree, prevtrees)[:2]
+        tree, prevtrees = app.select_node({'nodeid': 'R', 'type': 'apply', 'beta': 'YES'}, tree, prevtrees)[:2]
+        session = app.SESSIONS.get(tree['session'])
+        log = list(session['history']['log'])
+        self.assertEqual(prevtrees['steps'], 3)  # the start and two steps
+
+        app.MAX_SIZE = 1  # every replayed step is now over budget
+        self.assertEqual(app.go_back(1, tree, prevtrees), (app.no_update, app.no_update))
+        self.assertEqual(session['history']['log'], log)
+
+        app.MAX_SIZE = self.saved[1]
+        tree, prevtrees = app.go_back(1, tree, prevtrees)
+        self.assertEqual(prevtrees['steps'], 2)
+        self.assertEqual(app.SESSIONS.get(tree['session'])['history']['log'], log[:-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import copy
+import random
+import unittest
+
+import app
+from Lambda import as_tree, find_redex, specific_beta_reduction
+from app import carry_keys, elements_patch, fresh_keys, preorder_index, window_elements
+from terms import random_term
+
+# Element keys across steps: nodes outside the replaced subtree keep their
+# keys, every node of the new tree has a key of its own, and the patch sent
+# to the browser turns the old elements into the new ones.
+
+TERMS = 300
+STEPS = 5
+
+
+def expand(runs):
+    # the keys in preorder
+    return [first + i for first, count in runs for i in range(count)]
+
+
+def apply_patch(elements, patch):
+    # what the browser does with an elements_patch result
+    if type(patch) is list:
+        return patch
+    elements = copy.deepcopy(elements)
+    for op in patch.to_plotly_json()['operations']:
+        *path, last = op['location'] or [None]
+        target = elements
+        for k in path:
+            target = target[k]
+        if op['operation'] == 'Assign':
+            target[last] = op['params']['value']
+        elif op['operation'] == 'Delete':
+            del target[last]
+        elif op['operation'] == 'Insert':
+            target.insert(op['params']['index'], op['params']['value'])
+        else:  # must be 'Extend'
+            target.extend(op['params']['value'])
+    return elements
+
+
+class KeysTest(unittest.TestCase):
+    def steps(self):
+        # (etree, keys, nodeid, new_etree) for a few normal order steps of
+        # random terms
+        rand = random.Random(10)
+        for _ in range(TERMS):
+            etree = as_tree(random_term(rand.randint(2, 40), rand))
+            keys = fresh_keys(etree)
+            for _ in range(STEPS):
+                found = find_redex(etree, 'normal-order')
+                if found is None:
+                    break
+                nodeid = 'R' + found[0]
+                (status, new_etree) = specific_beta_reduction(etree, nodeid)
+                yield etree, keys, nodeid, new_etree
+                etree, keys = new_etree, carry_keys(etree, new_etree, keys, nodeid)
+
+    def test_fresh_keys(self):
+        etree = as_tree('((lambda x (x x)) (lambda y y));')
+        self.assertEqual(fresh_keys(etree), ([[0, 7]], 7))
+
+    def test_carry_keys(self):
+        for etree, keys, nodeid, new_etree in self.steps():
+            with self.subTest(expr=str(etree), nodeid=nodeid):
+                (runs, next_key) = carry_keys(etree, new_etree, keys, nodeid)
+                old = expand(keys[0])
+                new = expand(runs)
+                self.assertEqual(len(new), new_etree.size)
+                self.assertEqual(len(set(new)), len(new))
+                self.assertLess(max(new), next_key)
+                start = preorder_index(etree, nodeid)
+                after = len(old) - start - app.subtree_at(etree, nodeid[1:]).size
+                self.assertEqual(new[:start], old[:start])
+                self.assertEqual(new[len(new) - after:], old[len(old) - after:])
+
+    def test_argument_keeps_keys(self):
+        etree = as_tree('((lambda x (x x)) (lambda y y));')
+        new_etree = specific_beta_reduction(etree, 'R')[1]
+        (runs, next_key) = carry_keys(etree, new_etree, fresh_keys(etree), 'R')
+        # the first copy of the argument takes over its keys, the second is new
+        self.assertEqual(expand(runs), [7, 5, 6, 8, 9])
+
+    def test_elements_patch(self):
+        for etree, keys, nodeid, new_etree in self.steps():
+            with self.subTest(expr=str(etree), nodeid=nodeid):
+                new_keys = carry_keys(etree, new_etree, keys, nodeid)
+                old = window_elements({}, etree, keys)
+                new = window_elements({"focus": nodeid}, new_etree, new_keys)
+                self.assertEqual(apply_patch(old, elements_patch(old, new)), new)
+
+
+if __name__ == '__main__':
+    unittest.main()
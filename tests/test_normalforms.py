@@ -0,0 +1,34 @@
+import unittest
+
+from Lambda import as_tree
+from normalforms import NormalForms
+
+# The normal form cache: a stored normal form is only used when a reduction
+# under the caller's limits would have finished with it.
+
+# 3 ** 3 on Church numerals, whose normal form has 57 nodes
+CUBE = '((lambda f (lambda x (f (f (f x))))) (lambda f (lambda x (f (f (f x))))));'
+
+
+class NormalFormsTest(unittest.TestCase):
+    def test_budget(self):
+        cache = NormalForms()
+        tree = as_tree(CUBE)
+        (normal, steps, halted, hits) = cache.reduce(tree)
+        self.assertEqual((halted, hits), ('done', 0))
+        self.assertEqual(cache.reduce(tree), (normal, steps, 'done', 1))
+        self.assertEqual(cache.reduce(tree, max_size=normal.size - 1)[2], 'size limit')
+        self.assertEqual(cache.reduce(tree, max_steps=steps - 1)[2], 'step limit')
+
+    def test_subterms(self):
+        # a stored subterm counts against the steps of the whole term
+        cache = NormalForms()
+        (normal, steps, halted, hits) = cache.reduce(as_tree(CUBE))
+        outer = as_tree('(lambda y (y ' + CUBE[:-1] + '));')
+        self.assertEqual(cache.reduce(outer)[1:], (steps, 'done', 1))
+        self.assertEqual(cache.reduce(as_tree('(lambda z (z ' + CUBE[:-1] + '));'), max_steps=steps - 1)[1:],
+                         (steps - 1, 'step limit', 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import math
+import unittest
+from fractions import Fraction
+
+import Lambda
+import LambdaGraph
+import LambdaNbE
+from Lambda import as_tree, node, normalize, num_text
+from LambdaLexer import NUMBER_DIGITS, number
+
+# Numbers stay exact up to NUMBER_DIGITS digits; a longer literal is an
+# error and a longer result is nan, and neither may crash a step.
+
+
+def squarings(k):
+    # 10 squared k times, 10^(2^k)
+    return '((lambda f ' + '(f ' * k + '10' + ')' * k + ') (lambda x (* x x)));'
+
+
+class NumberTest(unittest.TestCase):
+    def test_huge_power(self):
+        result = normalize(squarings(13), 'applicative-order')  # 8193 digits
+        self.assertEqual(result['status'], 'OK')
+        self.assertEqual(result['expr_tree_json']['value'], 'nan')
+        result = normalize(squarings(12), 'applicative-order')  # 4097 digits
+        self.assertEqual(result['expr_tree_json']['value'], '1' + '0' * 4096)
+
+    def test_huge_power_engines(self):
+        tree = as_tree(squarings(13))
+        for engine in [LambdaNbE.reduce_tree, LambdaGraph.reduce_tree]:
+            with self.subTest(engine=engine.__module__):
+                (normal, steps, halted) = engine(tree, 1000, 10000)
+                self.assertEqual(halted, 'done')
+                self.assertTrue(math.isnan(normal.value))
+
+    def test_huge_step(self):
+        big = '9' * NUMBER_DIGITS
+        tree = as_tree(f'(* {big} {big});')
+        self.assertTrue(math.isnan(Lambda.eval_math(tree, 'R').value))
+        (folded, count) = Lambda.fold_constants(tree)
+        self.assertTrue(math.isnan(folded.value))
+
+    def test_long_literal(self):
+        self.assertEqual(Lambda.get_initial_tree('9' * NUMBER_DIGITS + ';')['status'], 'OK')
+        for text in ['9' * (NUMBER_DIGITS + 1), '1.' + '3' * NUMBER_DIGITS, '1/0']:
+            with self.subTest(text=text[:20]):
+                result = Lambda.get_initial_tree(text + ';')
+                self.assertEqual(result['status'], 'ERROR')
+                self.assertIn('LEXER ERROR', result['message'])
+            with self.assertRaises(ValueError):
+                number(text)
+
+    def test_num_text_reads_back(self):
+        for value in [Fraction(3, 8), Fraction(-1, 3), Fraction(1, 2 ** 5000), 10 ** (NUMBER_DIGITS - 1)]:
+            with self.subTest(value=num_text(value)[:20]):
+                self.assertEqual(number(num_text(value)), value)
+
+    def test_num_nodes_by_value(self):
+        self.assertIs(node('num', 10 ** 5000), node('num', 10 ** 5000))
+        self.assertIsNot(node('num', 1), node('num', 1.0))
+        self.assertIsNot(node('num', 0.0), node('num', -0.0))
+        self.assertIs(node('num', float('nan')), node('num', float('nan')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+import base64
+import json
+import random
+import unittest
+import zlib
+
+import app
+from Lambda import as_tree, decode_tree, encode_tree, node, parse, WIRE_NODE_BYTES
+from terms import random_term
+
+# The compact form of trees in the stores: every tree reads back as the
+# same tree, compressed or not, and anything a client sends that
+# encode_tree would not have made is refused with a ValueError.
+
+TERMS = 300
+ATOMS = ('x', 'y', '3', '1/3', '2.5')
+
+
+def deep(n):
+    return '(lambda x ' * n + 'x' + ')' * n + ';'
+
+
+class WireTest(unittest.TestCase):
+    def test_round_trip(self):
+        rand = random.Random(25)
+        trees = [as_tree(random_term(rand.randint(1, 60), rand, ATOMS, '+-*/', 0.2)) for _ in range(TERMS)]
+        trees += [as_tree(deep(100000)), node('lambda', '_0', node('name', '_0')),
+                  node('num', float('nan')), node('num', float('-inf'))]
+        for tree in trees:
+            with self.subTest(expr=str(tree)[:80]):
+                self.assertIs(decode_tree(encode_tree(tree)), tree)
+                self.assertIs(decode_tree(encode_tree(tree, True)), tree)
+                data = json.loads(json.dumps(encode_tree(tree)))  # as the browser sends it back
+                self.assertIs(decode_tree(data, tree.size, False), tree)
+
+    def test_size_limit(self):
+        tree = as_tree(deep(100))
+        for compress in [False, True]:
+            with self.assertRaises(ValueError):
+                decode_tree(encode_tree(tree, compress), tree.size - 1)
+
+    def test_compressed_refused(self):
+        with self.assertRaises(ValueError):
+            decode_tree(encode_tree(as_tree('x;'), True), 10, False)
+
+    def test_zlib_bomb(self):
+        # never inflated past WIRE_NODE_BYTES per allowed node
+        text = json.dumps([[0] * 10**6, ['X']])
+        data = {"zlib": base64.b64encode(zlib.compress(text.encode())).decode('ascii')}
+        with self.assertRaises(ValueError):
+            decode_tree(data, 10**6 // WIRE_NODE_BYTES)
+
+    def test_malformed(self):
+        def zipped(text):
+            return {"zlib": base64.b64encode(text).decode('ascii')}
+        cases = [
+            None, [], {}, {"nodes": [0]}, {"nodes": 0, "names": []}, {"nodes": "abc", "names": ["X"]},
+            {"nodes": [], "names": []}, {"nodes": [3], "names": []}, {"nodes": [0, 0], "names": ["X"]},
+            {"nodes": [5], "names": ["X"]}, {"nodes": [-5], "names": ["X"]}, {"nodes": [0.0], "names": ["X"]},
+            {"nodes": [True], "names": ["1"]}, {"nodes": [0], "names": [5]}, {"nodes": [0], "names": ["x y"]},
+            {"nodes": [0], "names": [""]}, {"nodes": [2, 0], "names": [["X"]]},
+            {"nodes": [9, 0, 0], "names": ["X", "^"]}, {"nodes": [1], "names": ["1e5"]},
+            {"nodes": [1], "names": ["1/0"]}, {"nodes": [1], "names": ["9" * 5000]},
+            zipped(b"not zlib"), zipped(zlib.compress(b"[[0],")[:-4]), zipped(zlib.compress(b"{}")),
+            {"zlib": "not base64!"},
+        ]
+        for data in cases:
+            with self.subTest(data=str(data)[:80]):
+                with self.assertRaises(ValueError):
+                    decode_tree(data, 1000)
+
+
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.compress = app.COMPRESS_STORES
+        self.max_size = app.MAX_SIZE
+
+    def tearDown(self):
+        app.COMPRESS_STORES = self.compress
+        app.MAX_SIZE = self.max_size
+
+    def test_submit(self):
+        # the parsed engine tree goes into the stores as it is
+        for compress in [False, True]:
+            app.COMPRESS_STORES = compress
+            for expr in ['((lambda x (x x)) (lambda y y));', deep(50000)]:
+                with self.subTest(compress=compress, expr=expr[:40]):
+                    tree, prevtrees, disabled, error, message = app.submit(expr)
+                    self.assertFalse(error)
+                    etree, keys, history = app.load_state(tree, prevtrees)
+                    self.assertIs(etree, parse(expr))
+                    self.assertEqual(keys, app.fresh_keys(etree))
+                    self.assertEqual(history['log'], [{"action": "start"}])
+
+    def test_submit_error(self):
+        self.assertEqual(app.submit('(lambda x'), (None, None, False, True, app.PARSE_ERROR))
+
+    def test_submit_too_large(self):
+        app.MAX_SIZE = 1000
+        self.assertEqual(app.submit(deep(999))[3], False)
+        self.assertEqual(app.submit(deep(1000)), (None, None, False, True, app.SIZE_ERROR.format(1001, 1000)))
+
+    def test_bad_stores(self):
+        tree, prevtrees, disabled, error, message = app.submit('((lambda x (x x)) (lambda y y));')
+        cases = [
+            dict(tree, tree={"nodes": [3], "names": []}),
+            dict(tree, tree={"nodes": [0] * (app.MAX_SIZE + 1), "names": ["X"]}),
+            dict(tree, keys=[[0, 3]]),
+            dict(tree, keys=[[0, 8], [9, -1]]),
+            dict(tree, keys="0"),
+            dict(tree, keys=[["a", 7]]),
+            dict(tree, keys=[[1.5, 7]]),
+            dict(tree, keys=[[-1, 7]]),
+            dict(tree, keys=[[0, 3], [0, 4]]),
+            dict(tree, keys=[[4, 3], [0, 5]]),
+            dict(tree, keys=[[0, 7, 1]]),
+            dict(tree, nextkey=None),
+            dict(tree, nextkey="7"),
+            dict(tree, nextkey=6),
+            dict(tree, keys=[[0, 3], [10, 4]], nextkey=12),
+            {"status": "OK"},
+        ]
+        for bad in cases:
+            with self.subTest(tree=str(bad)[:80]):
+                with self.assertRaises(ValueError):
+                    app.load_state(bad, prevtrees)
+        with self.assertRaises(ValueError):
+            app.load_state(tree, {"log": [], "checkpoints": []})
+        outputs = app.select_node({'nodeid': 'R', 'type': 'apply', 'beta': 'YES'}, cases[0], prevtrees)
+        self.assertEqual(outputs[:4], (app.no_update,) * 4)
+        self.assertTrue(outputs[4].startswith('The tree in the page could not be read'))
+        elements, text = app.retrieve_data_from_store(cases[1])
+        self.assertIn('larger than', text)
+
+    def test_fold(self):
+        tree, prevtrees = app.submit('((lambda x (x x)) (+ 1 (* 2 3)));')[:2]
+        tree, prevtrees = app.select_node({'nodeid': 'R', 'type': 'apply', 'beta': 'YES'}, tree, prevtrees)[:2]
+        outputs = app.fold_arithmetic(1, tree, prevtrees)
+        self.assertEqual(outputs[3:], ('(7 7)', 'Evaluated 4 operations'))
+        outputs = app.fold_arithmetic(1, *outputs[:2])
+        self.assertEqual(outputs, (app.no_update,) * 4 + ('No arithmetic to evaluate',))
+
+    def test_normalize_normal_form(self):
+        tree, prevtrees = app.submit('(lambda x (x x));')[:2]
+        outputs = app.normalize_tree(1, tree, prevtrees, 'normal-order')
+        self.assertEqual(outputs[:2], (app.no_update, app.no_update))
+        self.assertTrue(outputs[2].startswith('normal-order: 0 steps'))
+
+    def test_expired_session(self):
+        self.assertEqual(app.load_state({"session": "0" * 32}, None), (None, None, None))
+        self.assertEqual(app.retrieve_data_from_store({"session": "0" * 32}), ([], app.EXPIRED))
+
+
+if __name__ == '__main__':
+    unittest.main()